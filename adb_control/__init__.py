@@ -2,12 +2,22 @@ from adb_control.core import (
     AlphanumericButton,
     AndroidScreenMirroring,
     AppManager,
+    CommandCancelled,
+    CommandTimeout,
     ConnectManager,
+    DeviceFleet,
     DeviceInfo,
     DeviceManager,
+    DeviceWatcher,
+    Gesture,
     InputManager,
+    Macro,
     MediaButton,
     MediaManager,
+    SocketTransport,
+    SyncManager,
     SystemButton,
     UIExtractor,
+    deadline,
+    metrics,
 )
@@ -0,0 +1,11 @@
+from adb_control.aio.base import AsyncADBBase
+
+from .app_manager import AsyncAppManager
+from .connect_manager import AsyncConnectManager
+from .device_manager import AsyncDeviceManager
+from .device_watcher import AsyncDeviceWatcher
+from .fleet import AsyncDeviceFleet
+from .input_manager import AsyncInputManager
+from .media_manager import AsyncMediaManager
+from .transport import AsyncSocketTransport
+from .uiautomator_manager import AsyncUIExtractor
@@ -0,0 +1,112 @@
+"""
+The asyncio counterpart of AppManager.
+
+Functions:
+    - install_package: Installs an app package on the device.
+    - uninstall_package: Uninstalls an app package from the device.
+    - list_installed_packages: Lists all installed packages on the device.
+    - installed_package: Checks if a specific package is installed.
+    - launch_app: Launches an app using its package name.
+"""
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.core.app_manager import parse_package_list
+
+
+class AsyncAppManager(AsyncADBBase):
+    def _prepare_command(self, command, package_name=None, device=None):
+        """
+        Helper method to prepare the command with optional device and package_name arguments.
+        """
+        if device:
+            command = f"-s {device} {command}"
+        if package_name:
+            command = f"{command} {package_name}"
+        return command
+
+    async def install_package(self, package_name, device=None, timeout=None):
+        """Install a package on the device."""
+        command = self._prepare_command("install", package_name, device)
+        try:
+            result = await self.run_command(command, timeout=timeout)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode()}
+            return {
+                "status": "success",
+                "message": f"Package {package_name} installed.",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def uninstall_package(self, package_name, device=None, timeout=None):
+        """Uninstall a package from the device."""
+        command = self._prepare_command("uninstall", package_name, device)
+        try:
+            result = await self.run_command(command, timeout=timeout)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode()}
+            return {
+                "status": "success",
+                "message": f"Package {package_name} uninstalled.",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def _package_index(self, device=None, timeout=None) -> dict:
+        """The installed packages as {name: PackageInfo}, like AppManager.package_index."""
+        command = self._prepare_command("shell pm list packages -f -U", device=device)
+        output = await self.run_command(f"{command} --show-versioncode", timeout)
+        stdout = output.stdout.decode("utf-8")
+        if "package:" not in stdout:
+            # Android < 9 rejects --show-versioncode.
+            output = await self.run_command(command, timeout)
+            stdout = output.stdout.decode("utf-8")
+        if output.returncode != 0:
+            raise RuntimeError(output.stderr.decode() or stdout)
+        return parse_package_list(stdout)
+
+    async def list_installed_packages(self, device=None, timeout=None):
+        """List the names of all installed packages on the device."""
+        try:
+            packages = await self._package_index(device, timeout)
+            return {"status": "success", "packages": sorted(packages)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def installed_package(
+        self, device=None, package_name=None, timeout=None
+    ) -> dict:
+        """Check whether packages are installed on the device.
+        package_name: str or list of str
+        "packages" lists the given names that are installed, "info" their PackageInfo.
+        :return: dict
+        """
+        names = [package_name] if isinstance(package_name, str) else package_name
+        try:
+            index = await self._package_index(device, timeout)
+            found = [index[name] for name in names or () if name in index]
+            return {
+                "status": "success",
+                "message": "Installed packages listed.",
+                "packages": [info.name for info in found],
+                "info": {info.name: info for info in found},
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def launch_app(self, package_name, device=None, timeout=None):
+        """
+        Open an app using its package name.
+        """
+        command = self._prepare_command(
+            f"shell monkey -p {package_name} -c android.intent.category.LAUNCHER 1",
+            device=device,
+        )
+        try:
+            await self.run_command(command, timeout=timeout)
+            return {
+                "status": "success",
+                "message": f"App {package_name} opened.",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import signal
+import subprocess
+from typing import Literal
+
+from adb_control.aio.transport import AsyncSocketTransport
+from adb_control.core.commands import CommandCancelled, registry, remaining
+from adb_control.core.metrics import metrics
+from adb_control.core.transport import command_argv
+from adb_control.core.utils.params import ADB_PATH, ENCODING
+
+
+class AsyncADBBase:
+    def __init__(self, adb_path=ADB_PATH, transport=None, timeout=None):
+        """
+        :param adb_path: Path to the ADB executable, used as the fallback path.
+        :param transport: Transport used to reach the adb server without spawning
+            a process. Defaults to an AsyncSocketTransport on localhost:5037; pass
+            False to always run commands through the ADB executable.
+        :param timeout: Default timeout in seconds applied to every command.
+        """
+        self.adb_path = adb_path
+        self.transport = AsyncSocketTransport() if transport is None else transport
+        self.timeout = timeout
+
+    async def run_command(self, command, timeout=None) -> subprocess.CompletedProcess:
+        """
+        Run a raw ADB command.
+
+        Raises asyncio.TimeoutError when the command outlives `timeout` (or the
+        instance default, or the current `deadline`). On timeout or cancellation
+        the underlying connection is closed and any child process is killed and
+        reaped. The command is listed by `commands.in_flight()` while it runs;
+        cancelling it there raises CommandCancelled. With `metrics` enabled the
+        command is recorded like ADBBase's.
+        """
+        if not metrics.enabled:
+            return await self._run_bounded(command, timeout)
+        measurement = metrics.start(command)
+        try:
+            result = await self._run_bounded(command, timeout)
+        except BaseException as e:
+            measurement.finish(error=e)
+            raise
+        measurement.finish(result)
+        return result
+
+    async def _run_bounded(self, command, timeout=None):
+        timeout = remaining(self.timeout if timeout is None else timeout)
+        task, loop = asyncio.current_task(), asyncio.get_running_loop()
+        with registry.track(command, timeout) as entry:
+            entry.attach(lambda: loop.call_soon_threadsafe(task.cancel))
+            try:
+                return await asyncio.wait_for(self._run_command(command), timeout)
+            except asyncio.CancelledError:
+                if not entry.cancelled:
+                    raise
+                task.uncancel()
+                raise CommandCancelled(f"{command!r} was cancelled.") from None
+
+    async def _run_command(self, command) -> subprocess.CompletedProcess:
+        if self.transport:
+            request = self.transport.parse_command(command)
+            if request is not None:
+                try:
+                    return await self.transport.run(command, *request)
+                except ConnectionRefusedError:
+                    pass
+        # Only commands that need the host shell go through it; see ADBBase._spawn.
+        argv = command_argv(command)
+        options = {
+            "stdout": asyncio.subprocess.PIPE,
+            "stderr": asyncio.subprocess.PIPE,
+            "start_new_session": os.name == "posix",
+        }
+        try:
+            if argv is None:
+                process = await asyncio.create_subprocess_shell(
+                    f"{self.adb_path} {command}", **options
+                )
+            else:
+                process = await asyncio.create_subprocess_exec(
+                    self.adb_path, *argv, **options
+                )
+        except FileNotFoundError:
+            message = f"{self.adb_path}: not found\n".encode(ENCODING)
+            return subprocess.CompletedProcess(command, 127, b"", message)
+        except Exception as e:
+            raise Exception(f"Error: {e}")
+        try:
+            stdout, stderr = await process.communicate()
+        except BaseException:
+            if process.returncode is None:
+                try:
+                    if os.name == "posix":
+                        # Kill the whole group: the shell may have forked adb.
+                        os.killpg(process.pid, signal.SIGKILL)
+                    else:
+                        process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+            raise
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+    async def start_adb_server(self) -> subprocess.CompletedProcess:
+        """Start the ADB server."""
+        return await self.run_command("start-server")
+
+    async def kill_server(self) -> subprocess.CompletedProcess:
+        """Kill the ADB server."""
+        return await self.run_command("kill-server")
+
+    async def shell_command(self, command: str) -> subprocess.CompletedProcess:
+        """Run an ADB shell command."""
+        return await self.run_command(f"shell {command}")
+
+    async def transfer_file(
+        self,
+        local_file_path: str,
+        remote_file_path: str,
+        direction: Literal["push", "pull"],
+        device: str = None,
+    ):
+        """
+        Transfer a file between local and remote paths based on the specified direction.
+
+        Args:
+            local_file_path (str): The local file path.
+            remote_file_path (str): The remote file path.
+            direction (Literal["push", "pull"]): The direction of transfer. Must be "push" or "pull".
+            device (str, optional): The device identifier. If not provided, it uses the default device.
+
+        Returns:
+            dict: A dictionary containing the status of the operation ("success" or "error") and a message.
+        """
+        command = f"{direction} {local_file_path if direction == 'push' else remote_file_path} {remote_file_path if direction == 'push' else local_file_path}"
+        if device:
+            command = f"-s {device} {command}"
+        try:
+            result = await self.run_command(command)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode()}
+            return {"status": "success", "message": f"File {direction}ed successfully."}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def remove_file(self, file_path: str) -> subprocess.CompletedProcess:
+        """Remove a file from the device."""
+        return await self.shell_command(f"rm {file_path}")
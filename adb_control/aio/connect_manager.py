@@ -0,0 +1,76 @@
+"""
+The asyncio counterpart of ConnectManager.
+
+Attributes:
+    adb_path (str): Path to the ADB executable (default is "adb").
+"""
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.aio.fleet import AsyncDeviceFleet
+from adb_control.core.connect_manager import split_target
+from adb_control.core.utils.params import DEFAULT_PORT
+
+
+class AsyncConnectManager(AsyncADBBase):
+    def _prepare_command(self, command, device_ip=None, port=DEFAULT_PORT):
+        """Helper method to build the connection command."""
+        if device_ip:
+            device_target = f"{device_ip}:{port}"
+            return f"{command} {device_target}"
+        return command
+
+    async def connect(
+        self, device_ip: str = "", port: int = DEFAULT_PORT, timeout=None
+    ):
+        """
+        Connect to a specific device by its IP address and port.
+        """
+        command = self._prepare_command("connect", device_ip, port)
+        try:
+            result = await self.run_command(command, timeout=timeout)
+            if "connected" in result.stdout.decode().lower():
+                return {
+                    "status": "success",
+                    "message": f"Connected to {device_ip}:{port}",
+                }
+            else:
+                return {
+                    "status": "error",
+                    "message": result.stdout.decode() or result.stderr.decode(),
+                }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def disconnect(self, device_ip: str = "", port: int = DEFAULT_PORT):
+        """
+        Disconnect from a specific device or all devices.
+        If `device_ip` is not provided, it disconnects from all devices.
+        """
+        command = self._prepare_command("disconnect", device_ip, port)
+        try:
+            result = await self.run_command(command)
+            if "disconnected" in result.stdout.decode().lower():
+                return {
+                    "status": "success",
+                    "message": (
+                        "Disconnected from all devices"
+                        if not device_ip
+                        else f"Disconnected from {device_ip}:{port}"
+                    ),
+                }
+            else:
+                return {
+                    "status": "error",
+                    "message": result.stdout.decode() or result.stderr.decode(),
+                }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def connect_many(self, targets, timeout=10.0, max_workers=64) -> dict:
+        """Connect to many "ip[:port]" targets concurrently, see ConnectManager."""
+
+        async def connect(device=None):
+            return await self.connect(*split_target(device), timeout=timeout)
+
+        fleet = AsyncDeviceFleet(devices=targets, max_workers=max_workers)
+        return await fleet.run(connect, timeout=timeout + 1)
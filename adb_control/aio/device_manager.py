@@ -0,0 +1,38 @@
+"""
+The asyncio counterpart of DeviceManager.
+
+Attributes:
+    adb_path (str): Path to the ADB executable (default is "adb").
+"""
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.aio.device_watcher import AsyncDeviceWatcher
+from adb_control.core.utils.params import ENCODING
+
+
+class AsyncDeviceManager(AsyncADBBase):
+    async def list_devices(self) -> dict:
+        """List connected devices."""
+        try:
+            output = await self.run_command("devices")
+            if output.returncode == 0:
+                stdout = output.stdout.decode(ENCODING)
+                lines = stdout.splitlines()
+                devices = [line.split("\t")[0] for line in lines if "\tdevice" in line]
+                return devices
+            else:
+                return {"status": "error", "message": output.stderr.decode(ENCODING)}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def watch(self, on_connect=None, on_disconnect=None, on_change=None):
+        """Start an AsyncDeviceWatcher on the running loop, see DeviceManager.watch."""
+        watcher = AsyncDeviceWatcher(self.transport or None)
+        for kind, callback in (
+            ("connect", on_connect),
+            ("disconnect", on_disconnect),
+            ("change", on_change),
+        ):
+            if callback is not None:
+                watcher.on(kind, callback)
+        return watcher.start()
@@ -0,0 +1,90 @@
+"""
+The asyncio counterpart of DeviceWatcher.
+
+The `host:track-devices-l` stream is read by a task on the running loop, so
+listeners (plain or coroutine functions) run on that loop too.
+"""
+
+import asyncio
+
+from adb_control.aio.transport import AsyncSocketTransport
+from adb_control.core.device_watcher import DeviceRegistry, parse_devices_l
+from adb_control.core.utils.params import ENCODING
+
+
+class AsyncDeviceWatcher(DeviceRegistry):
+    def __init__(self, transport=None, reconnect_delay=1.0):
+        super().__init__()
+        self.transport = transport or AsyncSocketTransport()
+        self.reconnect_delay = reconnect_delay
+        self.connected = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def start(self) -> "AsyncDeviceWatcher":
+        """Start tracking in a task of the running loop."""
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        return self
+
+    def update(self, records: dict) -> list:
+        events = super().update(records)
+        self._changed.set()
+        return events
+
+    async def _run(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self.transport._connect()
+                await self.transport._send_request(
+                    reader, writer, "host:track-devices-l"
+                )
+                while True:
+                    payload = await self.transport._read_length_prefixed(reader)
+                    self.update(parse_devices_l(payload.decode(ENCODING)))
+                    self.connected.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.connected.clear()
+                if writer is not None:
+                    await self.transport._close(writer)
+            self.update({})
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def wait_for(self, serial, state="device", timeout=None) -> bool:
+        """Wait until `serial` is in `state` (None: until it is gone)."""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            if self._in_state(serial, state):
+                return True
+            self._changed.clear()
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def __aenter__(self):
+        self.start()
+        try:
+            await asyncio.wait_for(self.connected.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
@@ -0,0 +1,90 @@
+"""
+The asyncio counterpart of DeviceFleet.
+
+Every device runs as a task on the current event loop, bounded by a global
+semaphore and an optional per-host semaphore. Timed-out operations are
+cancelled, which closes their connections and kills their processes.
+"""
+
+import asyncio
+import time
+
+from adb_control.aio.device_manager import AsyncDeviceManager
+from adb_control.core.fleet import default_host_key
+
+
+class AsyncDeviceFleet:
+    def __init__(
+        self,
+        devices=None,
+        max_workers=64,
+        per_host_limit=None,
+        timeout=None,
+        host_key=default_host_key,
+        device_manager=None,
+    ):
+        self.devices = devices
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.host_key = host_key
+        self.device_manager = device_manager or AsyncDeviceManager()
+
+    async def _resolve_devices(self, devices):
+        devices = devices if devices is not None else self.devices
+        if devices is None:
+            devices = await self.device_manager.list_devices()
+            if isinstance(devices, dict):
+                raise RuntimeError(devices["message"])
+        return list(dict.fromkeys(devices))
+
+    async def run(self, operation, *args, devices=None, timeout=None, **kwargs):
+        """
+        Await `operation(*args, device=serial, **kwargs)` on every device.
+
+        Returns:
+            dict: A map of serial to {"status", "result" or "message", "elapsed"}.
+        """
+        devices = await self._resolve_devices(devices)
+        timeout = self.timeout if timeout is None else timeout
+        workers = asyncio.Semaphore(self.max_workers)
+        hosts = {}
+
+        async def call(serial):
+            host = hosts.setdefault(
+                self.host_key(serial),
+                asyncio.Semaphore(self.per_host_limit or len(devices) or 1),
+            )
+            async with host, workers:
+                start = time.monotonic()
+                try:
+                    result = await asyncio.wait_for(
+                        operation(*args, device=serial, **kwargs), timeout
+                    )
+                except asyncio.TimeoutError:
+                    return {
+                        "status": "error",
+                        "message": f"Timed out after {timeout} seconds.",
+                        "elapsed": time.monotonic() - start,
+                    }
+                except Exception as e:
+                    return {
+                        "status": "error",
+                        "message": str(e),
+                        "elapsed": time.monotonic() - start,
+                    }
+                if isinstance(result, dict) and result.get("status") == "error":
+                    return {
+                        "status": "error",
+                        "message": result.get("message", ""),
+                        "result": result,
+                        "elapsed": time.monotonic() - start,
+                    }
+                return {
+                    "status": "success",
+                    "result": result,
+                    "elapsed": time.monotonic() - start,
+                }
+
+        results = await asyncio.gather(*(call(serial) for serial in devices))
+        return dict(zip(devices, results))
@@ -0,0 +1,148 @@
+"""
+The asyncio counterpart of InputManager.
+
+Besides the single-gesture methods, `batch` sends a whole sequence of input
+commands to one device through a single shell invocation, and `perform` plays
+a Gesture the same way InputManager.perform does.
+
+Attributes:
+    adb_path (str): Path to the ADB executable (default is "adb").
+"""
+
+import asyncio
+import shlex
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.core.gesture import TOUCH_PROBE, Gesture, parse_touch_probe
+from adb_control.core.input_manager import text_commands
+
+
+class AsyncInputManager(AsyncADBBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._touch_devices = {}
+
+    def _prepare_command(self, command, device=None):
+        """
+        Prepare the adb command with device-specific options.
+        """
+        if device:
+            return f"-s {device} {command}"
+        return command
+
+    async def _run_input(self, command, device=None, timeout=None):
+        command = self._prepare_command(f"shell {command}", device)
+        return await self.run_command(command, timeout=timeout)
+
+    async def tap(self, x, y, device=None, timeout=None):
+        """
+        Tap on the screen at the given coordinates.
+        """
+        try:
+            return await self._run_input(f"input tap {x} {y}", device, timeout)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def swipe(self, x1, y1, x2, y2, duration=1000, device=None, timeout=None):
+        """
+        Swipe from (x1, y1) to (x2, y2) over `duration` milliseconds.
+        """
+        try:
+            command = f"input swipe {x1} {y1} {x2} {y2} {duration}"
+            return await self._run_input(command, device, timeout)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def text(self, text, device=None, timeout=None, method="auto"):
+        """
+        Input text on the device, escaped and chunked like InputManager.text.
+        Non-ASCII text needs an explicit method="adbkeyboard" or "clipboard".
+        """
+        try:
+            commands = text_commands(text, method)
+            if not commands:
+                return {"status": "success", "message": "Nothing to type."}
+            script = " && ".join(commands)
+            return await self._run_input(shlex.quote(script), device, timeout)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def keyevent(self, keyevent, device=None, timeout=None):
+        """
+        Send a key event to the device.
+        """
+        try:
+            return await self._run_input(f"input keyevent {keyevent}", device, timeout)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def batch(self, commands, device=None, timeout=None):
+        """
+        Run several input commands (e.g. "input tap 10 20") in one round trip.
+
+        The commands are chained in a single device shell, so the batch costs
+        one connection regardless of its length.
+        """
+        try:
+            script = shlex.quote(" ; ".join(commands))
+            return await self._run_input(script, device, timeout)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def repeat_tap(self, x, y, times=7, delay=5000, device=None):
+        """
+        Tap repeatedly at the given coordinates, waiting `delay` milliseconds between taps.
+        """
+        try:
+            for _ in range(times):
+                await self.tap(x, y, device)
+                await asyncio.sleep(delay / 1000.0)
+            return {
+                "status": "success",
+                "message": f"Tapped {times} times at ({x}, {y})",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def touch_device(self, device=None, refresh=False):
+        """Describe the device's touch screen input node, or None if it has none."""
+        if refresh or device not in self._touch_devices:
+            result = await self._run_input(shlex.quote(TOUCH_PROBE), device)
+            try:
+                touch = parse_touch_probe(result.stdout.decode())
+            except RuntimeError:
+                touch = None
+            self._touch_devices[device] = touch
+        return self._touch_devices[device]
+
+    async def perform(self, gesture: Gesture, device=None, sleep_overhead=1.0):
+        """
+        Play a gesture in a single round trip (see InputManager.perform).
+        """
+        try:
+            touch = await self.touch_device(device)
+            if touch is not None:
+                script = gesture.compile(touch, sleep_overhead)
+                result = await self._run_input(shlex.quote(script), device)
+                if result.returncode == 0:
+                    return {
+                        "status": "success",
+                        "message": f"Gesture played on {touch['path']}.",
+                        "method": "events",
+                    }
+                if gesture.multi_touch:
+                    return {
+                        "status": "error",
+                        "message": f"Cannot write to {touch['path']}.",
+                    }
+            script = shlex.quote("; ".join(gesture.input_commands()))
+            result = await self._run_input(script, device)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode()}
+            return {
+                "status": "success",
+                "message": "Gesture played with input commands.",
+                "method": "input",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
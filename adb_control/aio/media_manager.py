@@ -0,0 +1,116 @@
+"""
+The asyncio counterpart of MediaManager.
+
+Screenshots are streamed over `exec-out` straight into memory, so several
+devices can be captured concurrently from one event loop.
+
+Attributes:
+    adb_path (str): The path to the ADB executable (default is "adb").
+"""
+
+import asyncio
+import uuid
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.core.utils.params import ENCODING
+
+
+class AsyncMediaManager(AsyncADBBase):
+    def _prepare_command(self, command, device=None):
+        """Helper method to prepend device flag if provided."""
+        if device:
+            return f"-s {device} {command}"
+        return command
+
+    async def screenshot_bytes(self, device=None, timeout=None) -> bytes:
+        """Capture a PNG screenshot and return its bytes."""
+        command = self._prepare_command("exec-out screencap -p", device)
+        result = await self.run_command(command, timeout=timeout)
+        if result.returncode != 0:
+            raise RuntimeError(f"ADB command failed: {result.stderr.decode(ENCODING)}")
+        return result.stdout
+
+    async def take_screenshot(self, output_path, device=None, timeout=None):
+        try:
+            data = await self.screenshot_bytes(device, timeout)
+            with open(output_path, "wb") as file:
+                file.write(data)
+            return {
+                "status": "success",
+                "message": f"Screenshot saved to {output_path}",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def take_screenshots(
+        self, output_path, device=None, num_screenshots=7, interval=0.05
+    ):
+        """Capture multiple screenshots and store them locally using exec-out."""
+        try:
+            for i in range(num_screenshots):
+                screenshot_path = f"{output_path}/screenshot_{i + 1}.png"
+                data = await self.screenshot_bytes(device)
+                with open(screenshot_path, "wb") as file:
+                    file.write(data)
+                await asyncio.sleep(interval)
+            return {
+                "status": "success",
+                "message": f"{num_screenshots} screenshots saved to {output_path}",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def record_video(
+        self,
+        output_path,
+        duration=10,
+        device=None,
+        tmp_path=None,
+    ):
+        tmp_path = tmp_path or f"/sdcard/screen_record_{uuid.uuid4().hex}.mp4"
+        command = self._prepare_command(
+            f"shell screenrecord --time-limit {duration} {tmp_path}", device
+        )
+        try:
+            await self.run_command(command)
+            pull_command = self._prepare_command(
+                f"pull {tmp_path} {output_path}", device
+            )
+            await self.run_command(pull_command)
+            await self.run_command(
+                self._prepare_command(f"shell rm {tmp_path}", device)
+            )
+            return {"status": "success", "message": f"Video saved to {output_path}"}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def list_media_files(self, remote_directory="/", device=None):
+        command = self._prepare_command(f"shell ls {remote_directory}", device)
+        try:
+            result = await self.run_command(command)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode(ENCODING)}
+            lines = result.stdout.decode(ENCODING).splitlines()
+            return {"status": "success", "files": lines}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    async def remove_file(self, remote_file_path, folder=False, device=None):
+        """
+        Remove a specific file or folder on the Android device.
+
+        :param remote_file_path: The full path to the file or folder to remove (e.g., /sdcard/essadi.png)
+        :param folder: Whether the path is a folder (True) or a file (False)
+        :param device: The specific device ID to use for the adb command.
+        :return: A dictionary with status and message.
+        """
+        flags = "-rf " if folder else ""
+        command = self._prepare_command(f"shell rm {flags}{remote_file_path}", device)
+        try:
+            await self.run_command(command)
+            return {
+                "status": "success",
+                "message": f"File or folder {remote_file_path} removed.",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
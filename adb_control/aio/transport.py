@@ -0,0 +1,177 @@
+"""
+The asyncio counterpart of SocketTransport.
+
+It speaks the same ADB host protocol over asyncio streams, so a single event
+loop can keep requests to many devices in flight at once.
+"""
+
+import asyncio
+import subprocess
+
+from adb_control.core.transport import (
+    SHELL_CLOSE_STDIN,
+    ADBProtocolError,
+    parse_adb_command,
+    sentinel_command,
+    shell_v2_packets,
+    split_sentinel,
+)
+from adb_control.core.utils.params import ADB_SERVER_HOST, ADB_SERVER_PORT, ENCODING
+
+
+class AsyncSocketTransport:
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT):
+        self.host = host
+        self.port = port
+        # device -> whether it speaks the shell v2 protocol.
+        self._shell_v2 = {}
+
+    async def _connect(self):
+        """Open a new connection to the adb server."""
+        return await asyncio.open_connection(self.host, self.port)
+
+    @staticmethod
+    async def _recv_exactly(reader, size) -> bytes:
+        try:
+            return await reader.readexactly(size)
+        except asyncio.IncompleteReadError:
+            raise ADBProtocolError("Connection closed by adb server.")
+
+    async def _read_length_prefixed(self, reader) -> bytes:
+        length = int(await self._recv_exactly(reader, 4), 16)
+        return await self._recv_exactly(reader, length)
+
+    async def _send_request(self, reader, writer, service: str):
+        """Send a smart socket request and wait for its OKAY/FAIL status."""
+        payload = service.encode(ENCODING)
+        writer.write(b"%04x" % len(payload) + payload)
+        await writer.drain()
+        status = await self._recv_exactly(reader, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            message = (await self._read_length_prefixed(reader)).decode(ENCODING)
+            raise ADBProtocolError(message)
+        raise ADBProtocolError(f"Unexpected adb server status: {status!r}")
+
+    @staticmethod
+    async def _close(writer):
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    async def open_service(self, service: str, device=None):
+        """
+        Open a connection to a device service such as `shell:ls`.
+
+        Returns the (reader, writer) pair positioned after the service's OKAY.
+        The caller owns the connection and must close the writer.
+        """
+        reader, writer = await self._connect()
+        try:
+            await self._send_request(
+                reader,
+                writer,
+                f"host:transport:{device}" if device else "host:transport-any",
+            )
+            await self._send_request(reader, writer, service)
+            return reader, writer
+        except BaseException:
+            await self._close(writer)
+            raise
+
+    async def host_command(self, service: str, reply=True) -> bytes:
+        """Run a host service such as `host:devices` and return its payload."""
+        reader, writer = await self._connect()
+        try:
+            await self._send_request(reader, writer, service)
+            if not reply:
+                return b""
+            return await self._read_length_prefixed(reader)
+        finally:
+            await self._close(writer)
+
+    async def _service_output(self, service: str, device=None) -> bytes:
+        reader, writer = await self.open_service(service, device)
+        try:
+            return await reader.read()
+        finally:
+            await self._close(writer)
+
+    async def shell(self, command: str, device=None) -> bytes:
+        """Run a command through the `shell:` service and return its output."""
+        return await self._service_output(f"shell:{command}", device)
+
+    async def exec_out(self, command: str, device=None) -> bytes:
+        """Run a command through the binary-safe `exec:` service."""
+        return await self._service_output(f"exec:{command}", device)
+
+    async def supports_shell_v2(self, device=None) -> bool:
+        """Whether the device's adbd has the `shell_v2` feature; looked up once."""
+        if device not in self._shell_v2:
+            service = f"host-serial:{device}:features" if device else "host:features"
+            try:
+                features = (await self.host_command(service)).decode(ENCODING)
+            except ADBProtocolError:
+                features = ""
+            self._shell_v2[device] = "shell_v2" in features.split(",")
+        return self._shell_v2[device]
+
+    async def shell_v2(self, command: str, device=None) -> subprocess.CompletedProcess:
+        """Run a command through `shell,v2,raw:`, see SocketTransport.shell_v2."""
+        reader, writer = await self.open_service(f"shell,v2,raw:{command}", device)
+        try:
+            writer.write(SHELL_CLOSE_STDIN)
+            await writer.drain()
+            data = await reader.read()
+        finally:
+            await self._close(writer)
+        result = shell_v2_packets(data)
+        if result is None:
+            raise ADBProtocolError("Connection closed before the command finished.")
+        returncode, stdout, stderr = result
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    async def _run_shell(self, command, device, verb, argument):
+        if await self.supports_shell_v2(device):
+            result = await self.shell_v2(argument, device)
+            result.args = command
+            return result
+        script = sentinel_command(argument)
+        if verb == "shell":
+            output = await self.shell(script, device)
+        else:
+            output = await self.exec_out(script, device)
+        return split_sentinel(command, output)
+
+    def parse_command(self, command: str):
+        """Translate a raw adb command line, see `parse_adb_command`."""
+        return parse_adb_command(command)
+
+    async def run(
+        self, command: str, device, verb, argument
+    ) -> subprocess.CompletedProcess:
+        """Execute a request returned by `parse_command`, see SocketTransport.run."""
+        try:
+            if verb in ("shell", "exec-out"):
+                return await self._run_shell(command, device, verb, argument)
+            if verb == "devices":
+                devices = await self.host_command("host:devices")
+                stdout = b"List of devices attached\n" + devices + b"\n"
+            elif verb == "start-server":
+                await self.host_command("host:version")
+                stdout = b""
+            elif verb == "kill-server":
+                await self.host_command("host:kill", reply=False)
+                stdout = b""
+            elif verb == "connect":
+                stdout = await self.host_command(f"host:connect:{argument}") + b"\n"
+            else:
+                stdout = await self.host_command(f"host:disconnect:{argument}") + b"\n"
+        except ADBProtocolError as e:
+            return subprocess.CompletedProcess(
+                command, 1, b"", f"error: {e}\n".encode(ENCODING)
+            )
+        return subprocess.CompletedProcess(command, 0, stdout, b"")
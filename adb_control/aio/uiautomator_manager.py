@@ -0,0 +1,97 @@
+"""
+The asyncio counterpart of UIExtractor.
+"""
+
+import os
+import tempfile
+
+from adb_control.aio.base import AsyncADBBase
+from adb_control.core.uiautomator_manager import UIExtractor, parse_ui_dump
+
+
+class AsyncUIExtractor(AsyncADBBase):
+    _parse_ui_hierarchy = UIExtractor._parse_ui_hierarchy
+    _match = staticmethod(UIExtractor._match)
+
+    def _prepare_command(self, command, device=None):
+        """Helper method to prepend device flag if provided."""
+        if device:
+            return f"-s {device} {command}"
+        return command
+
+    async def uiautomator(self, device=None, streaming=True) -> dict:
+        """
+        Extract and process UI data from the device in real-time.
+        """
+        try:
+            if streaming:
+                result = await self.run_command(
+                    self._prepare_command("exec-out uiautomator dump /dev/tty", device)
+                )
+                ui_data = parse_ui_dump(result.stdout)
+            else:
+                ui_data = await self._pull_ui_hierarchy(device)
+            return {
+                "status": "success",
+                "data": ui_data,
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to extract UI: {str(e)}",
+            }
+
+    async def _pull_ui_hierarchy(self, device=None) -> dict:
+        fd, local_file = tempfile.mkstemp(suffix=".xml")
+        os.close(fd)
+        try:
+            dump_path = "/sdcard/window_dump.xml"
+            await self.run_command(
+                self._prepare_command(f"shell uiautomator dump {dump_path}", device)
+            )
+            result = await self.transfer_file(
+                direction="pull",
+                remote_file_path=dump_path,
+                local_file_path=local_file,
+                device=device,
+            )
+            if result["status"] == "error":
+                raise Exception(result["message"])
+            await self.run_command(
+                self._prepare_command(f"shell rm {dump_path}", device)
+            )
+            return self._parse_ui_hierarchy(local_file)
+        finally:
+            os.remove(local_file)
+
+    async def find_element(self, element_id: str, device=None) -> dict:
+        """
+        Find an element by resource-id or text, or by a selector prefixed with
+        "xpath:"; see UIExtractor.find_element.
+
+        :param element_id: The resource-id, text or prefixed selector to filter by.
+        :return: The matched element or an error message.
+        """
+        try:
+            ui_data = await self.uiautomator(device)
+            if ui_data["status"] == "error":
+                return ui_data
+
+            node = self._match(ui_data["data"]["tree"], element_id)
+            if node is None:
+                return {
+                    "status": "error",
+                    "message": "Element not found.",
+                }
+
+            return {
+                "status": "success",
+                "element": node.to_dict(),
+                "node": node,
+            }
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to find element: {str(e)}",
+            }
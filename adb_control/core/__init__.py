@@ -1,11 +1,26 @@
 from adb_control.core.base import ADBBase
+from adb_control.core.commands import (
+    CommandCancelled,
+    CommandTimeout,
+    cancel,
+    deadline,
+    in_flight,
+)
+from adb_control.core.metrics import logging_hook, metrics
+from adb_control.core.transport import ADBProtocolError, SocketTransport
 
 from .app_manager import AppManager
-from .connect_manager import ConnectManager
+from .connect_manager import ConnectionSupervisor, ConnectManager
 from .device_manager import DeviceManager
+from .device_watcher import DeviceWatcher
+from .fleet import DeviceFleet
+from .gesture import Gesture
 from .input_manager import InputManager
+from .macro import Macro
 from .media_manger import MediaManager
+from .remote_index import RemoteIndex
 from .stream_manager import AndroidScreenMirroring
+from .sync_manager import SyncManager
 from .utils.device_info import DeviceInfo
 from .utils.key_event import AlphanumericButton, MediaButton, SystemButton
 from .utils.params import DEFAULT_PORT, ENCODING
@@ -4,18 +4,79 @@ applications on Android devices using ADB (Android Debug Bridge). It allows for
 installing, uninstalling, listing installed packages, and launching apps on a
 connected Android device.
 
+Installs are incremental: the APK's SHA-256 is compared with the hash of the
+installed copy on the device (cached per device until `pm path` changes), and
+no-op installs are skipped. APKs are streamed straight into a package
+installer session over the adb connection, which also covers split APKs.
+
+Package lookups go through a per-device index built from a single
+`pm list packages -f -U --show-versioncode` call and kept for `inventory_ttl`
+seconds (our own installs and uninstalls invalidate it).
+
 Functions:
-    - install_package: Installs an app package on the device.
+    - install_package: Installs an app package (or split APKs) on the device.
+    - install_packages: Installs several packages, checking them in one round trip
+      and committing them together in one multi-package session.
     - uninstall_package: Uninstalls an app package from the device.
+    - package_index: Returns the cached package inventory of a device.
     - list_installed_packages: Lists all installed packages on the device.
-    - installed_package: Checks if a specific package is installed.
+    - installed_package: Checks if specific packages are installed.
     - launch_app: Launches an app using its package name.
 """
 
+import os
+import re
+import shlex
+import threading
+import time
+from typing import NamedTuple, Optional
+
 from adb_control.core.base import ADBBase
+from adb_control.core.utils.apk import file_digest, read_manifest
+from adb_control.core.utils.params import ENCODING
+
+_SESSION_ID = re.compile(r"\[(\d+)\]")
+
+
+class PackageInfo(NamedTuple):
+    name: str
+    path: Optional[str] = None
+    version_code: Optional[int] = None
+    uid: Optional[int] = None
+
+
+def parse_package_list(output: str) -> dict:
+    """Parse `pm list packages [-f] [-U] [--show-versioncode]` into {name: PackageInfo}."""
+    packages = {}
+    for line in output.splitlines():
+        if not line.startswith("package:"):
+            continue
+        head, *fields = line[len("package:") :].strip().split(" ")
+        path, _, name = head.rpartition("=")
+        info = {"path": path or None}
+        for field in fields:
+            key, _, value = field.partition(":")
+            if key == "versionCode" and value.isdigit():
+                info["version_code"] = int(value)
+            elif key == "uid" and value.isdigit():
+                info["uid"] = int(value)
+        packages[name] = PackageInfo(name, **info)
+    return packages
 
 
 class AppManager(ADBBase):
+    def __init__(self, *args, inventory_ttl=60.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.inventory_ttl = inventory_ttl
+        # device -> (fetched at, {name: PackageInfo})
+        self._inventory = {}
+        self._inventory_locks = {}
+        # (device, package) -> (installed paths, {path: sha256}) seen on the device.
+        self._remote_digests = {}
+        # APK sha256 -> manifest info, so each build is parsed once.
+        self._manifests = {}
+        self._cache_lock = threading.Lock()
+
     def _prepare_command(self, command, package_name=None, device=None):
         """
         Helper method to prepare the command with optional device and package_name arguments.
@@ -26,22 +87,257 @@ class AppManager(ADBBase):
             command = f"{command} {package_name}"
         return command
 
-    def install_package(self, package_name, device=None):
-        """Install a package on the device."""
-        command = self._prepare_command("install", package_name, device)
+    def _shell(self, script, device=None):
+        """Run a device shell script, quoted so it reaches the device untouched."""
+        command = self._prepare_command(f"shell {shlex.quote(script)}", device=device)
+        return self.run_command(command)
+
+    def _apk_info(self, apk_paths) -> dict:
+        """Return the package, version code and file digests of an APK (and its splits)."""
+        digests = {path: file_digest(path) for path in apk_paths}
+        base = digests[apk_paths[0]]
+        with self._cache_lock:
+            manifest = self._manifests.get(base)
+        if manifest is None:
+            manifest = read_manifest(apk_paths[0])
+            with self._cache_lock:
+                self._manifests[base] = manifest
+        return {**manifest, "digests": frozenset(digests.values())}
+
+    def installed_digests(self, packages, device=None) -> dict:
+        """
+        Return the SHA-256 digests of the installed APKs of several packages.
+
+        One `pm path` call covers every package; the installed files are only
+        hashed on the device when their paths changed since the last check.
+
+        :return: A map of package name to a frozenset of digests (empty if not installed).
+        """
+        script = "; ".join(
+            f"echo '#{package}'; pm path {package}" for package in packages
+        )
+        output = self._shell(script, device).stdout.decode(ENCODING)
+        paths, current = {package: [] for package in packages}, None
+        for line in output.splitlines():
+            if line.startswith("#"):
+                current = line[1:].strip()
+            elif line.startswith("package:") and current in paths:
+                paths[current].append(line[len("package:") :].strip())
+
+        digests, to_hash = {}, []
+        with self._cache_lock:
+            for package, remote_paths in paths.items():
+                cached = self._remote_digests.get((device, package))
+                if cached and cached[0] == tuple(remote_paths):
+                    digests[package] = frozenset(cached[1].values())
+                elif remote_paths:
+                    to_hash.extend(remote_paths)
+                else:
+                    digests[package] = frozenset()
+        if to_hash:
+            script = "sha256sum " + " ".join(shlex.quote(path) for path in to_hash)
+            hashed = {}
+            for line in (
+                self._shell(script, device).stdout.decode(ENCODING).splitlines()
+            ):
+                digest, _, path = line.partition("  ")
+                hashed[path.strip()] = digest.strip()
+            with self._cache_lock:
+                for package, remote_paths in paths.items():
+                    if package in digests:
+                        continue
+                    found = {path: hashed.get(path) for path in remote_paths}
+                    self._remote_digests[(device, package)] = (
+                        tuple(remote_paths),
+                        found,
+                    )
+                    digests[package] = frozenset(found.values())
+        return digests
+
+    def _forget(self, package, device=None):
+        with self._cache_lock:
+            self._remote_digests.pop((device, package), None)
+            self._inventory.pop(device, None)
+
+    def _create_session(self, device=None, flags="-r") -> str:
+        """Create a package installer session and return its id."""
+        result = self._shell(f"cmd package install-create {flags}", device)
+        output = result.stdout.decode(ENCODING)
+        match = _SESSION_ID.search(output)
+        if not match:
+            raise RuntimeError(output.strip() or result.stderr.decode(ENCODING))
+        return match.group(1)
+
+    def _write_session(self, session, apk_paths, device=None):
+        """Stream APKs into an installer session over the adb connection."""
+        for index, path in enumerate(apk_paths):
+            size = os.path.getsize(path)
+            name = f"{index}_{os.path.basename(path)}"
+            write = f"cmd package install-write -S {size} {session} {name} -"
+            command = self._prepare_command(f"exec-out {write}", device=device)
+            with self._bounded(command):
+                sock = self.transport.open_service(f"exec:{write}", device)
+                with sock, open(path, "rb") as file:
+                    sock.sendfile(file)
+                    output = self.transport._recv_all(sock).decode(ENCODING)
+            if "Success" not in output:
+                raise RuntimeError(output.strip())
+
+    def _session_command(self, command, device=None):
+        """Run an installer session command, raising unless it reports Success."""
+        output = self._shell(command, device).stdout.decode(ENCODING)
+        if "Success" not in output:
+            raise RuntimeError(output.strip())
+
+    def _session_install(self, apk_paths, device=None):
+        """Stream APKs into a package installer session over the adb connection."""
+        session = self._create_session(device)
         try:
-            result = self.run_command(command)
+            self._write_session(session, apk_paths, device)
+        except BaseException:
+            self._shell(f"cmd package install-abandon {session}", device)
+            raise
+        self._session_command(f"cmd package install-commit {session}", device)
+
+    def _multi_package_install(self, builds, device=None) -> bool:
+        """
+        Install several packages in one multi-package session: each package is
+        streamed into a child session, and the parent commits them all at
+        once, atomically.
+
+        Returns False, having installed nothing, when the device predates
+        multi-package sessions (Android 10).
+        """
+        try:
+            parent = self._create_session(device, "--multi-package -r")
+        except RuntimeError:
+            return False
+        children = []
+        try:
+            for apk_paths in builds.values():
+                children.append(self._create_session(device))
+                self._write_session(children[-1], apk_paths, device)
+            self._session_command(
+                f"cmd package install-add-session {parent} {' '.join(children)}",
+                device,
+            )
+        except BaseException:
+            for session in (parent, *children):
+                self._shell(f"cmd package install-abandon {session}", device)
+            raise
+        self._session_command(f"cmd package install-commit {parent}", device)
+        return True
+
+    def _install(self, apk_paths, device=None, streaming=False):
+        if self.transport:
+            try:
+                return self._session_install(apk_paths, device)
+            except ConnectionRefusedError:
+                pass
+        verb = "install" if len(apk_paths) == 1 else "install-multiple"
+        flags = "-r --streaming" if streaming else "-r"
+        command = self._prepare_command(f"{verb} {flags}", " ".join(apk_paths), device)
+        result = self.run_command(command)
+        output = (result.stdout + result.stderr).decode(ENCODING)
+        if result.returncode != 0 or "Success" not in output:
+            raise RuntimeError(output.strip())
+
+    def install_package(self, package_name, device=None, streaming=False, force=False):
+        """
+        Install a package on the device, unless the exact same build is installed.
+
+        Args:
+            package_name (str | list): Path of the APK, or of the base and split APKs.
+            device (str, optional): The device identifier.
+            streaming (bool, optional): Use `--streaming` when falling back to `adb install`.
+            force (bool, optional): Install even if the device already has this build.
+
+        Returns:
+            dict: "status", "message" and "skipped" (True when nothing had to be installed).
+        """
+        apk_paths = [package_name] if isinstance(package_name, str) else package_name
+        try:
+            info = self._apk_info(apk_paths)
+            package = info["package"]
+            if not force:
+                installed = self.installed_digests([package], device)[package]
+                if installed and installed == info["digests"]:
+                    return {
+                        "status": "success",
+                        "message": f"Package {package} is already up to date.",
+                        "skipped": True,
+                    }
+            self._forget(package, device)
+            self._install(apk_paths, device, streaming)
             return {
                 "status": "success",
                 "message": f"Package {package_name} installed.",
+                "skipped": False,
             }
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def install_packages(self, apks, device=None, streaming=False, force=False):
+        """
+        Install several packages, checking all of them in a single round trip.
+
+        The packages that need installing are committed together in one
+        multi-package session, so either all of them are installed or none
+        is. Devices older than Android 10, and the ADB executable fallback,
+        install them one session at a time instead.
+
+        Args:
+            apks (list): APK paths; an item may itself be a list of base and split APKs.
+            streaming (bool, optional): Use `--streaming` when falling back to
+                `adb install`; installer sessions over the adb server always stream.
+
+        Returns:
+            dict: "status", "installed" and "skipped" package names, and per-package "errors".
+        """
+        report = {"installed": [], "skipped": [], "errors": {}}
+        try:
+            builds, digests = {}, {}
+            for apk in apks:
+                apk_paths = [apk] if isinstance(apk, str) else list(apk)
+                info = self._apk_info(apk_paths)
+                builds[info["package"]] = apk_paths
+                digests[info["package"]] = info["digests"]
+            installed = {} if force else self.installed_digests(list(builds), device)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+        pending = {}
+        for package, apk_paths in builds.items():
+            if installed.get(package) == digests[package]:
+                report["skipped"].append(package)
+                continue
+            self._forget(package, device)
+            pending[package] = apk_paths
+
+        if self.transport and len(pending) > 1:
+            try:
+                if self._multi_package_install(pending, device):
+                    report["installed"] += list(pending)
+                    pending = {}
+            except ConnectionRefusedError:
+                pass
+            except Exception as e:
+                report["errors"] = dict.fromkeys(pending, str(e))
+                pending = {}
+        for package, apk_paths in pending.items():
+            try:
+                self._install(apk_paths, device, streaming)
+                report["installed"].append(package)
+            except Exception as e:
+                report["errors"][package] = str(e)
+        report["status"] = "error" if report["errors"] else "success"
+        return report
+
     def uninstall_package(self, package_name, device=None):
         """Uninstall a package from the device."""
         command = self._prepare_command("uninstall", package_name, device)
         try:
+            self._forget(package_name, device)
             result = self.run_command(command)
             return {
                 "status": "success",
@@ -50,39 +346,62 @@ class AppManager(ADBBase):
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def list_installed_packages(self, device=None):
-        """List all installed packages on the device."""
-        command = self._prepare_command("shell pm list packages", device=device)
+    def package_index(self, device=None, refresh=False) -> dict:
+        """
+        Return the installed packages of a device as {name: PackageInfo}.
+
+        The index is fetched with one `pm list packages` call and reused for
+        `inventory_ttl` seconds; concurrent callers share a single fetch.
+        """
+        with self._cache_lock:
+            lock = self._inventory_locks.setdefault(device, threading.Lock())
+        with lock:
+            with self._cache_lock:
+                cached = self._inventory.get(device)
+            if (
+                not refresh
+                and cached
+                and time.monotonic() - cached[0] < self.inventory_ttl
+            ):
+                return cached[1]
+            fetched = time.monotonic()
+            output = self._shell("pm list packages -f -U --show-versioncode", device)
+            stdout = output.stdout.decode(ENCODING)
+            if "package:" not in stdout:
+                # Android < 9 rejects --show-versioncode.
+                output = self._shell("pm list packages -f -U", device)
+                stdout = output.stdout.decode(ENCODING)
+            if output.returncode != 0:
+                raise RuntimeError(output.stderr.decode(ENCODING) or stdout)
+            packages = parse_package_list(stdout)
+            with self._cache_lock:
+                self._inventory[device] = (fetched, packages)
+            return packages
+
+    def list_installed_packages(self, device=None, refresh=False):
+        """List the names of all installed packages on the device."""
         try:
-            output = self.run_command(command)
-            if output.returncode == 0:
-                stdout = output.stdout.decode("utf-8")
-                lines = stdout.splitlines()
-                packages = [line for line in lines]
-            return {"status": "success", "packages": packages}
+            packages = self.package_index(device, refresh)
+            return {"status": "success", "packages": sorted(packages)}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
     def installed_package(self, device=None, package_name=None) -> dict:
-        """List all installed packages on the device.
-        package_name: str
-        function will return only the package_name
+        """Check whether packages are installed on the device.
+        package_name: str or list of str
+        "packages" lists the given names that are installed, "info" their PackageInfo.
         :return: dict
         """
+        names = [package_name] if isinstance(package_name, str) else package_name
         try:
-            output = self.list_installed_packages(device)
-            if output["status"] == "success":
-                return {
-                    "status": "success",
-                    "message": "Installed packages listed.",
-                    "packages": [
-                        package
-                        for package in output["packages"]
-                        if package == package_name
-                    ],
-                }
-            else:
-                return {"status": "error", "message": output["message"]}
+            index = self.package_index(device)
+            found = [index[name] for name in names or () if name in index]
+            return {
+                "status": "success",
+                "message": "Installed packages listed.",
+                "packages": [info.name for info in found],
+                "info": {info.name: info for info in found},
+            }
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -1,37 +1,314 @@
+import contextlib
+import functools
+import io
+import os
+import posixpath
+import shlex
+import signal
+import socket
 import subprocess
 from typing import Literal
-from adb_control.core.utils.params import ADB_PATH
+from adb_control.core.commands import (
+    CommandCancelled,
+    CommandTimeout,
+    deadline,
+    registry,
+    remaining,
+)
+from adb_control.core.metrics import metrics
+from adb_control.core.remote_index import expand_glob, has_magic, shell_glob
+from adb_control.core.sync import SyncConnection
+from adb_control.core.transport import SocketTransport, command_argv
+from adb_control.core.utils.params import ADB_PATH, ENCODING
+
+# Bytes of quoted paths per `rm`: well below the device's ARG_MAX (128 KiB on
+# older releases) and the command line limit of adb.exe on Windows.
+REMOVE_BATCH_BYTES = 24 * 1024
+# `rm` scripts written at once onto the shell session.
+REMOVE_PIPELINE = 16
+
+
+def removal_batches(paths, max_bytes=REMOVE_BATCH_BYTES) -> list:
+    """Split paths into lists whose quoted length stays under `max_bytes`."""
+    batches, batch, size = [], [], 0
+    for path in paths:
+        length = len(shlex.quote(path).encode(ENCODING)) + 1
+        if batch and size + length > max_bytes:
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(path)
+        size += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def removal_script(paths, recursive=False) -> str:
+    """
+    A shell script removing `paths` with one `rm`, which prints "?<path>" for
+    each path that did not exist and "!<path>" for each one left behind.
+    """
+    quoted = " ".join(shlex.quote(path) for path in paths)
+    return (
+        f"set -- {quoted}; "
+        'for p; do [ -e "$p" ] || [ -L "$p" ] || echo "?$p"; done; '
+        f'rm {"-rf" if recursive else "-f"} -- "$@"; '
+        'for p; do if [ -e "$p" ] || [ -L "$p" ]; then echo "!$p"; fi; done'
+    )
+
+
+def _removal_results(paths, output) -> dict:
+    missing, left, reasons = set(), set(), {}
+    for line in output.splitlines():
+        if line.startswith("?"):
+            missing.add(line[1:])
+        elif line.startswith("!"):
+            left.add(line[1:])
+        elif line.startswith("rm: "):
+            path, _, reason = line[4:].rpartition(": ")
+            reasons[path] = reason
+    return {
+        path: (
+            "missing"
+            if path in missing
+            else reasons.get(path, "not removed")
+            if path in left
+            else "removed"
+        )
+        for path in paths
+    }
+
+
+def _kill(process):
+    """Kill a child process and, on POSIX, its group: the shell may have forked adb."""
+    if process.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+    except ProcessLookupError:
+        pass
+
+
+class CommandStream(io.RawIOBase):
+    """
+    A readable stream over an adb server socket or an ADB process pipe.
+
+    Closing it shuts the connection down (or kills the process), which also
+    wakes up a reader blocked in another thread.
+    """
+
+    def __init__(self, sock=None, process=None, measurement=None):
+        self._sock = sock
+        self._process = process
+        self._measurement = measurement
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._sock is not None:
+            size = self._sock.recv_into(buffer)
+        else:
+            size = self._process.stdout.raw.readinto(buffer)
+        if self._measurement is not None and size:
+            self._measurement.add_bytes(size)
+        return size
+
+    def close(self):
+        if self.closed:
+            return
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+        else:
+            _kill(self._process)
+            self._process.wait()
+            self._process.stdout.close()
+        if self._measurement is not None:
+            self._measurement.finish()
+        super().close()
 
 
 class ADBBase:
-    def __init__(self, adb_path=ADB_PATH):
+    def __init__(self, adb_path=ADB_PATH, transport=None, timeout=None):
+        """
+        :param adb_path: Path to the ADB executable, used as the fallback path.
+        :param transport: Transport used to reach the adb server without spawning
+            a process. Defaults to a SocketTransport on localhost:5037; pass False
+            to always run commands through the ADB executable.
+        :param timeout: Default timeout in seconds applied to every command.
+        """
         self.adb_path = adb_path
+        self.transport = SocketTransport() if transport is None else transport
+        self.timeout = timeout
+
+    def run_command(self, command, timeout=None) -> subprocess.CompletedProcess:
+        """
+        Run a raw ADB command.
+
+        Commands the transport understands (shell, exec-out, devices, connect...)
+        are sent straight to the adb server; everything else, or every command
+        when the server is unreachable, goes through the ADB executable.
 
-    def run_command(self, command) -> subprocess.CompletedProcess:
-        """Run a raw ADB command."""
+        The command is bounded by `timeout` (or the instance default) and by the
+        current `deadline`. When time runs out its connection is closed or its
+        process group killed and reaped, and CommandTimeout is raised. While it
+        runs it is listed by `commands.in_flight()`; cancelling it there raises
+        CommandCancelled.
+
+        When `metrics` is enabled, the command's latency, output size and
+        outcome are recorded.
+        """
+        if not metrics.enabled:
+            return self._run_bounded(command, timeout)
+        measurement = metrics.start(command)
         try:
-            process = subprocess.run(
-                f"{self.adb_path} {command}",
-                shell=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            return process
+            result = self._run_bounded(command, timeout)
+        except BaseException as e:
+            measurement.finish(error=e)
+            raise
+        measurement.finish(result)
+        return result
+
+    def _run_bounded(self, command, timeout=None) -> subprocess.CompletedProcess:
+        with self._bounded(command, timeout) as entry:
+            return self._run_command(command, entry)
+
+    @contextlib.contextmanager
+    def _bounded(self, command, timeout=None):
+        """
+        Run the block as `command`: listed by `in_flight()`, bounded by
+        `timeout` (or the instance default) and the current deadline, and
+        raising CommandTimeout or CommandCancelled like `run_command`.
+
+        For work that does not go through `run_command`, such as shell
+        sessions and sync connections.
+        """
+        timeout = remaining(self.timeout if timeout is None else timeout)
+        with registry.track(command, timeout) as entry:
+            try:
+                if timeout is None:
+                    yield entry
+                else:
+                    with deadline(timeout):
+                        yield entry
+            except CommandTimeout:
+                raise
+            except Exception as e:
+                if entry.cancelled:
+                    raise CommandCancelled(f"{command!r} was cancelled.") from e
+                if isinstance(e, (TimeoutError, subprocess.TimeoutExpired)):
+                    raise CommandTimeout(
+                        f"{command!r} timed out after {timeout} seconds."
+                    ) from e
+                raise
+            if entry.cancelled:
+                raise CommandCancelled(f"{command!r} was cancelled.")
+
+    def _spawn(self, command, **kwargs) -> subprocess.Popen:
+        """
+        Start the adb executable with stdout piped. The host shell is only
+        involved for commands that need it (pipes, redirections...); others
+        run from an argument list, whatever quoting the host shell uses.
+        """
+        argv = command_argv(command)
+        if argv is None:
+            args, kwargs["shell"] = f"{self.adb_path} {command}", True
+        else:
+            args = [self.adb_path, *argv]
+        return subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            start_new_session=os.name == "posix",
+            **kwargs,
+        )
+
+    def _run_command(self, command, entry) -> subprocess.CompletedProcess:
+        if self.transport:
+            request = self.transport.parse_command(command)
+            if request is not None:
+                try:
+                    return self.transport.run(command, *request)
+                except ConnectionRefusedError:
+                    pass
+        try:
+            process = self._spawn(command, stderr=subprocess.PIPE)
+        except FileNotFoundError:
+            # Answer like a shell would, as before the argv path existed.
+            message = f"{self.adb_path}: not found\n".encode(ENCODING)
+            return subprocess.CompletedProcess(command, 127, b"", message)
         except Exception as e:
             raise Exception(f"Error: {e}")
+        kill = functools.partial(_kill, process)
+        entry.attach(kill)
+        try:
+            stdout, stderr = process.communicate(timeout=remaining())
+        except BaseException:
+            _kill(process)
+            process.communicate()
+            raise
+        finally:
+            entry.detach(kill)
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
 
     def open_command(self, command):
-        """Run a raw ADB command."""
+        """
+        Start a raw ADB command and return its process, with stdout piped.
+
+        The process is listed by `commands.in_flight()` until it exits;
+        cancelling it kills its process group.
+        """
         try:
-            process = subprocess.Popen(
-                f"{self.adb_path} {command}",
-                shell=True,
-                stdout=subprocess.PIPE,
-            )
-            print(self.adb_path, command)
-            return process
+            process = self._spawn(command)
         except Exception as e:
             raise Exception(f"Error: {e}")
+        entry = registry.add(command, done=lambda: process.poll() is not None)
+        entry.attach(functools.partial(_kill, process))
+        return process
+
+    def open_stream(self, command) -> "CommandStream":
+        """
+        Run a raw ADB command and return a binary stream of its stdout.
+
+        `shell` and `exec-out` commands are streamed straight from the adb server
+        socket when possible; other commands read from an ADB process pipe.
+        Closing the stream ends the command, even from another thread. With
+        `metrics` enabled, the stream is recorded when it is closed.
+        """
+        measurement = metrics.start(command) if metrics.enabled else None
+        try:
+            return self._open_stream(command, measurement)
+        except BaseException as e:
+            if measurement is not None:
+                measurement.finish(error=e)
+            raise
+
+    def _open_stream(self, command, measurement) -> "CommandStream":
+        if self.transport:
+            request = self.transport.parse_command(command)
+            if request is not None and request[1] in ("shell", "exec-out"):
+                device, verb, argument = request
+                service = f"{'shell' if verb == 'shell' else 'exec'}:{argument}"
+                try:
+                    sock = self.transport.open_service(service, device)
+                except ConnectionRefusedError:
+                    pass
+                else:
+                    # The stream outlives any deadline it was opened under.
+                    sock.settimeout(self.transport.timeout)
+                    stream = CommandStream(sock=sock, measurement=measurement)
+                    entry = registry.add(command, done=lambda: stream.closed)
+                    entry.attach(stream.close)
+                    return stream
+        return CommandStream(
+            process=self.open_command(command), measurement=measurement
+        )
 
     def start_adb_server(self) -> subprocess.CompletedProcess:
         """Start the ADB server."""
@@ -67,13 +344,191 @@ class ADBBase:
         """
         command = f"{direction} {local_file_path if direction == 'push' else remote_file_path} {remote_file_path if direction == 'push' else local_file_path}"
         if device:
-            return f"-s {device} {command}"
+            command = f"-s {device} {command}"
+        if self.transport:
+            try:
+                with self._bounded(command):
+                    transferred = self._sync_transfer(
+                        local_file_path, remote_file_path, direction, device
+                    )
+                if transferred:
+                    return {
+                        "status": "success",
+                        "message": f"File {direction}ed successfully.",
+                    }
+            except ConnectionRefusedError:
+                pass
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
         try:
-            self.run_command(command)
+            result = self.run_command(command)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode(ENCODING)}
             return {"status": "success", "message": f"File {direction}ed successfully."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def _sync_transfer(self, local_file_path, remote_file_path, direction, device=None):
+        """
+        Transfer one file over the sync protocol, like `adb push`/`adb pull`.
+
+        Returns False for directories, which are left to the ADB executable.
+        """
+        if direction == "push" and os.path.isdir(local_file_path):
+            return False
+        with SyncConnection(self.transport, device) as connection:
+            remote = connection.stat(remote_file_path)
+            if direction == "pull" and remote.is_dir:
+                return False
+            if direction == "push":
+                if remote.is_dir:
+                    name = os.path.basename(local_file_path)
+                    remote_file_path = posixpath.join(remote_file_path, name)
+                connection.send(local_file_path, remote_file_path)
+            else:
+                if not remote.exists:
+                    raise FileNotFoundError(f"{remote_file_path} does not exist.")
+                if os.path.isdir(local_file_path):
+                    name = posixpath.basename(remote_file_path)
+                    local_file_path = os.path.join(local_file_path, name)
+                connection.recv(remote_file_path, local_file_path, mtime=remote.mtime)
+        return True
+
     def remove_file(self, file_path: str) -> subprocess.CompletedProcess:
         """Remove a file from the device."""
         return self.shell_command(f"rm {file_path}")
+
+    def remove_files(
+        self,
+        paths,
+        device=None,
+        devices=None,
+        recursive=False,
+        max_batch_bytes=REMOVE_BATCH_BYTES,
+    ) -> dict:
+        """
+        Remove many remote files with as few `rm` runs as possible.
+
+        Glob patterns are expanded on the host over the sync protocol (by the
+        device shell without a socket transport), and the paths are packed
+        into `rm` command lines of at most `max_batch_bytes`, pipelined onto
+        the device's shell session.
+
+        Args:
+            paths (str | list): Remote paths or glob patterns, e.g. "/sdcard/Pictures/*.png".
+            device (str, optional): The device identifier.
+            devices (list, optional): Several devices to clean up concurrently.
+            recursive (bool, optional): Also remove directories and their content.
+            max_batch_bytes (int, optional): Length of the quoted paths of one `rm`.
+
+        Returns:
+            dict: "status", "message", the "removed", "missing" and "failed" counts,
+                and "results", a map of every path (patterns expanded) to "removed",
+                "missing" or the reason it could not be removed. With `devices`, a
+                map of serial to such results.
+        """
+        if devices is not None:
+            # Imported here: the fleet depends on the managers built on this class.
+            from adb_control.core.fleet import DeviceFleet
+
+            return DeviceFleet(devices=devices).run(
+                self.remove_files,
+                paths,
+                recursive=recursive,
+                max_batch_bytes=max_batch_bytes,
+            )
+        if isinstance(paths, str):
+            paths = [paths]
+        try:
+            results, targets = self._expand_removals(paths, device)
+            batches = removal_batches(targets, max_batch_bytes)
+            scripts = [removal_script(batch, recursive) for batch in batches]
+            outputs = []
+            for start in range(0, len(scripts), REMOVE_PIPELINE):
+                outputs += self._run_scripts(
+                    scripts[start : start + REMOVE_PIPELINE], device
+                )
+            for batch, output in zip(batches, outputs):
+                text = (output.stdout + (output.stderr or b"")).decode(
+                    ENCODING, "replace"
+                )
+                results.update(_removal_results(batch, text))
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        counts = {"removed": 0, "missing": 0, "failed": 0}
+        failures = []
+        for path, outcome in results.items():
+            if outcome in ("removed", "missing"):
+                counts[outcome] += 1
+            else:
+                counts["failed"] += 1
+                failures.append(f"{path}: {outcome}")
+        message = "{removed} removed, {missing} missing, {failed} failed.".format(
+            **counts
+        )
+        if failures:
+            message += f" First failure: {failures[0]}"
+        return {
+            "status": "error" if failures else "success",
+            "message": message,
+            **counts,
+            "results": results,
+        }
+
+    def _expand_removals(self, paths, device):
+        """Expand glob patterns; returns (results so far, paths to remove)."""
+        results, targets = {}, []
+        patterns = [path for path in paths if has_magic(path)]
+        expanded = None
+        if patterns and self.transport:
+            prefix = f"-s {device} " if device else ""
+            try:
+                with self._bounded(f"{prefix}ls {' '.join(patterns)}"):
+                    with SyncConnection(self.transport, device) as connection:
+                        expanded = {
+                            pattern: expand_glob(connection, pattern)
+                            for pattern in patterns
+                        }
+            except ConnectionRefusedError:
+                pass
+        if patterns and expanded is None:
+            expanded = self._shell_globs(patterns, device)
+        for path in paths:
+            if not has_magic(path):
+                targets.append(path)
+            elif not expanded[path]:
+                results[path] = "missing"
+            else:
+                targets.extend(expanded[path])
+        return results, list(dict.fromkeys(targets))
+
+    def _shell_globs(self, patterns, device=None) -> dict:
+        """Expand glob patterns with the device shell, in one `adb shell`."""
+        script = "; ".join(
+            f"for p in {shell_glob(pattern)}; do "
+            f'if [ -e "$p" ] || [ -L "$p" ]; then echo "{index}:$p"; fi; done'
+            for index, pattern in enumerate(patterns)
+        )
+        prefix = f"-s {device} " if device else ""
+        result = self.run_command(f"{prefix}shell {shlex.quote(script)}")
+        expanded = {pattern: [] for pattern in patterns}
+        for line in result.stdout.decode(ENCODING, "replace").splitlines():
+            index, separator, path = line.partition(":")
+            if separator and index.isdigit() and int(index) < len(patterns):
+                expanded[patterns[int(index)]].append(path)
+        return {pattern: sorted(paths) for pattern, paths in expanded.items()}
+
+    def _run_scripts(self, scripts, device=None) -> list:
+        """Run shell scripts on the device's session, or one `adb shell` each."""
+        prefix = f"-s {device} " if device else ""
+        if self.transport:
+            try:
+                with self._bounded(f"{prefix}shell {'; '.join(scripts)}"):
+                    session = self.transport.shell_session(device)
+                    return session.run_many(scripts, label="shell rm")
+            except ConnectionRefusedError:
+                pass
+        return [
+            self.run_command(f"{prefix}shell {shlex.quote(script)}")
+            for script in scripts
+        ]
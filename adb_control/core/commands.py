@@ -0,0 +1,206 @@
+"""
+Deadlines, cancellation and the registry of in-flight ADB commands.
+
+A deadline bounds every command run inside it, however deep in the manager
+methods, without threading a timeout through each call:
+
+    with deadline(30):
+        app_manager.install_package("app.apk", device=serial)
+
+Nested deadlines can only shorten the outer one, and `run_command(...,
+timeout=...)` is bounded by the current deadline too. The deadline lives in
+a context variable, so it follows asyncio tasks; DeviceFleet carries it into
+its worker threads.
+
+Every command started by ADBBase is listed in `registry` while it runs, with
+the sockets and processes it uses. `in_flight()` shows them and `cancel()`
+closes those sockets and kills those processes. The interrupted command
+raises CommandCancelled, and a command that outlives its deadline raises
+CommandTimeout.
+"""
+
+import contextlib
+import contextvars
+import itertools
+import re
+import threading
+import time
+
+_deadline = contextvars.ContextVar("adb_control_deadline", default=None)
+_current = contextvars.ContextVar("adb_control_command", default=None)
+_SERIAL = re.compile(r"^\s*-s\s+(\S+)")
+
+
+class CommandTimeout(TimeoutError):
+    """Raised when a command outlives its timeout or the current deadline."""
+
+
+class CommandCancelled(Exception):
+    """Raised by a command interrupted through `cancel`."""
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """Bound every command run inside the block to `seconds` from now."""
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None:
+        expires = min(expires, outer)
+    token = _deadline.set(expires)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining(timeout=None):
+    """
+    Seconds left for a command with its own `timeout` under the current
+    deadline, or None when neither bounds it.
+
+    Raises CommandTimeout when the deadline has already passed.
+    """
+    expires = _deadline.get()
+    if expires is None:
+        return timeout
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise CommandTimeout("Deadline exceeded.")
+    return left if timeout is None else min(timeout, left)
+
+
+class InFlightCommand:
+    """A command being run, with the resources `cancel` has to release."""
+
+    def __init__(self, command_id, command, timeout=None, done=None):
+        self.id = command_id
+        self.command = command
+        match = _SERIAL.match(command)
+        self.device = match.group(1) if match else None
+        self.started = time.monotonic()
+        self.timeout = timeout
+        self.cancelled = False
+        self._done = done
+        self._closers = []
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def attach(self, closer):
+        """Register a callable releasing a socket or process of the command."""
+        with self._lock:
+            cancelled = self.cancelled
+            if not cancelled:
+                self._closers.append(closer)
+        if cancelled:
+            closer()
+
+    def detach(self, closer):
+        with self._lock:
+            if closer in self._closers:
+                self._closers.remove(closer)
+
+    def done(self) -> bool:
+        return self._done is not None and self._done()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            closers, self._closers = self._closers, []
+        for closer in closers:
+            try:
+                closer()
+            except OSError:
+                pass
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "device": self.device,
+            "elapsed": self.elapsed,
+            "timeout": self.timeout,
+            "cancelled": self.cancelled,
+        }
+
+    def __repr__(self):
+        return f"<InFlightCommand {self.id} {self.command!r} {self.elapsed:.1f}s>"
+
+
+class CommandRegistry:
+    def __init__(self):
+        self._commands = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add(self, command, timeout=None, done=None) -> InFlightCommand:
+        """
+        Register a command. Commands with a `done` callable (streams and
+        processes handed to the caller) are dropped once it returns True.
+        """
+        self._prune()
+        entry = InFlightCommand(next(self._ids), command, timeout, done)
+        with self._lock:
+            self._commands[entry.id] = entry
+        return entry
+
+    def _prune(self) -> list:
+        """Drop finished streams and processes (polling reaps the processes)."""
+        with self._lock:
+            entries = list(self._commands.values())
+        for entry in entries:
+            if entry.done():
+                self.remove(entry)
+        return [entry for entry in entries if entry.id in self._commands]
+
+    def remove(self, entry):
+        with self._lock:
+            self._commands.pop(entry.id, None)
+
+    @contextlib.contextmanager
+    def track(self, command, timeout=None):
+        """Register a command for the duration of the block."""
+        entry = self.add(command, timeout)
+        token = _current.set(entry)
+        try:
+            yield entry
+        finally:
+            _current.reset(token)
+            self.remove(entry)
+
+    def list(self, device=None) -> list:
+        return [entry for entry in self._prune() if device in (None, entry.device)]
+
+    def cancel(self, command_id=None, device=None) -> int:
+        """
+        Cancel one command by id, or every command of `device`, or every
+        command when neither is given. Returns the number cancelled.
+        """
+        entries = [
+            entry
+            for entry in self.list(device)
+            if command_id is None or entry.id == command_id
+        ]
+        for entry in entries:
+            entry.cancel()
+        return len(entries)
+
+
+registry = CommandRegistry()
+
+
+def current_command():
+    """The InFlightCommand being run by the current thread or task, if any."""
+    return _current.get()
+
+
+def in_flight(device=None) -> list:
+    """The commands running right now, as dicts (see InFlightCommand.to_dict)."""
+    return [entry.to_dict() for entry in registry.list(device)]
+
+
+def cancel(command_id=None, device=None) -> int:
+    """Cancel running commands, see CommandRegistry.cancel."""
+    return registry.cancel(command_id, device)
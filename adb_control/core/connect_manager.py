@@ -5,29 +5,51 @@ This class provides methods to connect and disconnect from devices using their I
 It builds and executes the necessary ADB commands to establish and close connections.
 Inherits from ADBBase to leverage existing ADB command functionality.
 
+`connect_many` connects a list of targets in parallel, each with its own
+timeout, and `supervise` starts a ConnectionSupervisor that keeps them
+connected: it sends a cheap keepalive to every connected target and
+reconnects dropped ones with exponential backoff and jitter.
+
 Attributes:
     adb_path (str): Path to the ADB executable (default is "adb").
 """
 
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from adb_control.core.base import ADBBase
-from adb_control.core.utils.params import DEFAULT_PORT
+from adb_control.core.fleet import DeviceFleet
+from adb_control.core.utils.params import DEFAULT_PORT, ENCODING
+
+logger = logging.getLogger(__name__)
+
+
+def split_target(target: str, port: int = DEFAULT_PORT):
+    """Split "ip[:port]" into (ip, port)."""
+    host, separator, target_port = target.rpartition(":")
+    if separator and target_port.isdigit():
+        return host, int(target_port)
+    return target, port
 
 
 class ConnectManager(ADBBase):
-    def _prepare_command(self, command, device_ip, port):
+    def _prepare_command(self, command, device_ip=None, port=DEFAULT_PORT):
         """Helper method to build the connection command."""
         if device_ip:
             device_target = f"{device_ip}:{port}"
             return f"{command} {device_target}"
         return command
 
-    def connect(self, device_ip: str = "", port: int = DEFAULT_PORT):
+    def connect(self, device_ip: str = "", port: int = DEFAULT_PORT, timeout=None):
         """
         Connect to a specific device by its IP address and port.
         """
         command = self._prepare_command("connect", device_ip, port)
         try:
-            result = self.run_command(command)
+            result = self.run_command(command, timeout)
 
             # Check the stdout or stderr for success or failure
             if "connected" in result.stdout.decode().lower():
@@ -40,23 +62,23 @@ class ConnectManager(ADBBase):
                     "status": "error",
                     "message": result.stdout.decode() or result.stderr.decode(),
                 }
+        except TimeoutError:
+            return {
+                "status": "error",
+                "message": f"Timed out connecting to {device_ip}:{port}",
+            }
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def disconnect(self, device_ip: str = "", port: int = DEFAULT_PORT):
+    def disconnect(self, device_ip: str = "", port: int = DEFAULT_PORT, timeout=None):
         """
         Disconnect from a specific device or all devices.
         If `device_ip` is not provided, it disconnects from all devices.
         """
-        # Prepare the command based on whether a device IP is provided
-        command = (
-            self._prepare_command("disconnect")
-            if not device_ip
-            else self._prepare_command("disconnect", device_ip, port)
-        )
+        command = self._prepare_command("disconnect", device_ip, port)
 
         try:
-            result = self.run_command(command)
+            result = self.run_command(command, timeout)
 
             # Check stdout for success or failure messages
             if "disconnected" in result.stdout.decode().lower():
@@ -74,5 +96,261 @@ class ConnectManager(ADBBase):
                     "status": "error",
                     "message": result.stdout.decode() or result.stderr.decode(),
                 }
+        except TimeoutError:
+            return {
+                "status": "error",
+                "message": f"Timed out disconnecting from {device_ip}:{port}",
+            }
         except Exception as e:
             return {"status": "error", "message": str(e)}
+
+    def connect_many(self, targets, timeout=10.0, max_workers=16) -> dict:
+        """
+        Connect to many "ip[:port]" targets in parallel.
+
+        A target that does not answer within `timeout` seconds is reported as
+        an error without holding up the others.
+
+        Returns:
+            dict: The DeviceFleet result map of target to {"status", "result"
+                or "message", "elapsed"}.
+        """
+        # The fleet timeout is a backstop for an adb executable that hangs.
+        fleet = DeviceFleet(
+            devices=targets, max_workers=max_workers, timeout=timeout + 1
+        )
+        return fleet.run(
+            lambda device: self.connect(*split_target(device), timeout=timeout)
+        )
+
+    def keepalive(self, target, timeout=5.0) -> float:
+        """
+        Run a no-op shell command on a connected target.
+
+        Returns:
+            float: The round trip in seconds. Raises RuntimeError when the
+                device does not answer in time or is not usable.
+        """
+        start = time.monotonic()
+        try:
+            result = self.run_command(f"-s {target} shell true", timeout)
+        except TimeoutError:
+            raise RuntimeError(f"Keepalive timed out after {timeout} seconds.")
+        if result.returncode != 0:
+            message = result.stderr.decode(ENCODING).strip()
+            raise RuntimeError(message or f"{target} is not reachable.")
+        return time.monotonic() - start
+
+    def supervise(self, targets, **kwargs) -> "ConnectionSupervisor":
+        """Start a ConnectionSupervisor for `targets`, see its parameters."""
+        return ConnectionSupervisor(self, targets, **kwargs).start()
+
+
+class ConnectionSupervisor:
+    """
+    Keep a set of network devices connected.
+
+    Every `interval` seconds, connected targets get a keepalive and targets
+    that are down and due are (re)connected, all in parallel. After a failure
+    the next attempt waits `backoff * 2 ** (failures - 1)` seconds, capped at
+    `max_backoff` and randomly shortened by up to `jitter` of itself, so a
+    rack of devices dropping together does not reconnect in lockstep.
+
+        supervisor = ConnectManager().supervise(["10.0.0.11:5555", "10.0.0.12"])
+        ...
+        supervisor.metrics()["10.0.0.11:5555"]["state"]
+        supervisor.stop()
+    """
+
+    def __init__(
+        self,
+        manager,
+        targets,
+        interval=5.0,
+        connect_timeout=10.0,
+        keepalive_timeout=5.0,
+        backoff=1.0,
+        max_backoff=60.0,
+        jitter=0.5,
+        max_workers=16,
+        on_change=None,
+    ):
+        """
+        :param manager: The ConnectManager used to connect and probe.
+        :param targets: "ip[:port]" targets; the port defaults to DEFAULT_PORT.
+        :param on_change: Called as on_change(target, state) when a target
+            goes "connected" or "down".
+        """
+        self.manager = manager
+        self.interval = interval
+        self.connect_timeout = connect_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.on_change = on_change
+        self._health = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.max_workers = max_workers
+        self._thread = None
+        for target in targets:
+            self.add(target)
+
+    def add(self, target):
+        host, port = split_target(target)
+        with self._lock:
+            self._health.setdefault(
+                f"{host}:{port}",
+                {
+                    "state": "down",
+                    "attempts": 0,
+                    "connects": 0,
+                    "failures": 0,
+                    "consecutive_failures": 0,
+                    "drops": 0,
+                    "keepalives": 0,
+                    "latency": None,
+                    "last_error": None,
+                    "connected_since": None,
+                    "next_attempt": 0.0,
+                },
+            )
+
+    def remove(self, target):
+        host, port = split_target(target)
+        with self._lock:
+            self._health.pop(f"{host}:{port}", None)
+
+    def _delay(self, failures) -> float:
+        delay = min(self.max_backoff, self.backoff * 2 ** (failures - 1))
+        return delay * (1 - self.jitter * random.random())
+
+    def _set_state(self, target, health, state):
+        if health["state"] == state:
+            return
+        health["state"] = state
+        health["connected_since"] = time.monotonic() if state == "connected" else None
+        if self.on_change is not None:
+            try:
+                self.on_change(target, state)
+            except Exception:
+                logger.exception("on_change failed for %s (%s).", target, state)
+
+    def _connect(self, target):
+        host, port = split_target(target)
+        # Any error is a failed attempt: the worker must always update the health.
+        try:
+            result = self.manager.connect(host, port, timeout=self.connect_timeout)
+            if result["status"] == "success":
+                # `connect` succeeds before the device has authorized the host.
+                result["latency"] = self.manager.keepalive(
+                    target, self.keepalive_timeout
+                )
+        except Exception as e:
+            result = {"status": "error", "message": str(e) or repr(e)}
+        with self._lock:
+            health = self._health.get(target)
+            if health is None:
+                return result
+            health["attempts"] += 1
+            if result["status"] == "success":
+                health["connects"] += 1
+                health["consecutive_failures"] = 0
+                health["latency"] = result["latency"]
+                self._set_state(target, health, "connected")
+            else:
+                self._failed(target, health, result["message"])
+        return result
+
+    def _keepalive(self, target):
+        try:
+            latency = self.manager.keepalive(target, self.keepalive_timeout)
+        except Exception as e:
+            latency, error = None, str(e) or repr(e)
+        with self._lock:
+            health = self._health.get(target)
+            if health is None:
+                return
+            if latency is not None:
+                health["keepalives"] += 1
+                health["latency"] = latency
+                return
+            health["drops"] += 1
+            self._failed(target, health, error)
+            # Try again right away; the backoff applies from the next failure.
+            health["next_attempt"] = 0.0
+        # adb keeps dead network transports around as "offline".
+        try:
+            self.manager.disconnect(*split_target(target), timeout=self.connect_timeout)
+        except Exception:
+            pass
+
+    def _failed(self, target, health, message):
+        health["failures"] += 1
+        health["consecutive_failures"] += 1
+        health["last_error"] = message.strip()
+        health["latency"] = None
+        health["next_attempt"] = time.monotonic() + self._delay(
+            health["consecutive_failures"]
+        )
+        self._set_state(target, health, "down")
+
+    def check(self):
+        """Run one round of keepalives and due reconnections and wait for it."""
+        now = time.monotonic()
+        with self._lock:
+            targets = list(self._health.items())
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            for target, health in targets:
+                if health["state"] == "connected":
+                    executor.submit(self._keepalive, target)
+                elif health["next_attempt"] <= now:
+                    executor.submit(self._connect, target)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.check()
+            self._stopping.wait(self.interval)
+
+    def start(self) -> "ConnectionSupervisor":
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def connected(self) -> list:
+        with self._lock:
+            return [t for t, h in self._health.items() if h["state"] == "connected"]
+
+    def metrics(self) -> dict:
+        """
+        Connection health of every target: state, attempts, connects,
+        failures, consecutive_failures, drops, keepalives, latency (last
+        keepalive round trip in seconds), last_error, uptime and retry_in
+        (seconds until the next attempt of a target that is down).
+        """
+        now = time.monotonic()
+        with self._lock:
+            metrics = {}
+            for target, health in self._health.items():
+                entry = dict(health)
+                since = entry.pop("connected_since")
+                next_attempt = entry.pop("next_attempt")
+                entry["uptime"] = now - since if since is not None else 0.0
+                entry["retry_in"] = (
+                    max(0.0, next_attempt - now) if entry["state"] == "down" else None
+                )
+                metrics[target] = entry
+            return metrics
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
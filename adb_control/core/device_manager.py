@@ -3,6 +3,8 @@ A class to manage Android devices connected via ADB.
 
 This class provides functionality to list all connected devices.
 It interacts with ADB to retrieve the list of devices and their statuses.
+`device_records` returns every device with its state and details, and `watch`
+starts a DeviceWatcher that is told about changes instead of polling.
 Inherits from ADBBase to leverage the common ADB command execution functionality.
 
 Attributes:
@@ -10,6 +12,7 @@ Attributes:
 """
 
 from adb_control.core.base import ADBBase
+from adb_control.core.device_watcher import DeviceWatcher, parse_devices_l
 from adb_control.core.utils.params import ADB_PATH, ENCODING
 
 
@@ -27,3 +30,41 @@ class DeviceManager(ADBBase):
                 return {"status": "error", "message": output.stderr.decode(ENCODING)}
         except Exception as e:
             return {"status": "error", "message": str(e)}
+
+    def device_records(self) -> dict:
+        """
+        List every device known to the adb server, whatever its state.
+
+        Returns:
+            dict: A map of serial to DeviceRecord (state, transport id, model, USB path...).
+        """
+        try:
+            if self.transport:
+                try:
+                    payload = self.transport.host_command("host:devices-l")
+                    return parse_devices_l(payload.decode(ENCODING))
+                except ConnectionRefusedError:
+                    pass
+            output = self.run_command("devices -l")
+            if output.returncode != 0:
+                return {"status": "error", "message": output.stderr.decode(ENCODING)}
+            return parse_devices_l(output.stdout.decode(ENCODING))
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def watch(self, on_connect=None, on_disconnect=None, on_change=None):
+        """
+        Start a DeviceWatcher on this manager's adb server.
+
+        The callbacks receive a DeviceEvent; more listeners can be added with
+        `watcher.on(kind, callback)`. Call `watcher.stop()` when done.
+        """
+        watcher = DeviceWatcher(self.transport or None)
+        for kind, callback in (
+            ("connect", on_connect),
+            ("disconnect", on_disconnect),
+            ("change", on_change),
+        ):
+            if callback is not None:
+                watcher.on(kind, callback)
+        return watcher.start()
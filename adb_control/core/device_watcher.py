@@ -0,0 +1,228 @@
+"""
+Event-driven tracking of the devices known to the adb server.
+
+DeviceWatcher keeps a `host:track-devices-l` connection open. The adb server
+pushes the full device list whenever anything changes, and the watcher diffs
+it against its registry and emits events:
+
+    connect     a serial appeared
+    disconnect  a serial went away
+    change      a known serial changed state (e.g. offline -> device) or details
+
+Listeners receive a DeviceEvent. They may be plain functions, called on the
+watcher thread, or coroutine functions, scheduled on an event loop (the one
+running when the listener was added, or the `loop` passed to `on`). The
+watcher reconnects by itself if the adb server restarts.
+
+Example:
+    with DeviceWatcher() as watcher:
+        watcher.on("connect", lambda event: print("new device", event.serial))
+        watcher.wait_for("emulator-5554", timeout=60)
+"""
+
+import asyncio
+import logging
+import socket
+import threading
+from typing import NamedTuple, Optional
+
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.params import ENCODING
+
+logger = logging.getLogger(__name__)
+
+EVENTS = ("connect", "disconnect", "change")
+
+
+class DeviceRecord(NamedTuple):
+    serial: str
+    state: str
+    transport_id: Optional[int] = None
+    model: Optional[str] = None
+    product: Optional[str] = None
+    device: Optional[str] = None
+    usb: Optional[str] = None
+
+
+class DeviceEvent(NamedTuple):
+    kind: str
+    serial: str
+    record: Optional[DeviceRecord]
+    previous: Optional[DeviceRecord]
+
+
+def parse_devices_l(payload: str) -> dict:
+    """Parse a `devices -l` listing into {serial: DeviceRecord}."""
+    records = {}
+    for line in payload.splitlines():
+        fields = line.split()
+        if len(fields) < 2 or line.startswith(("List of devices", "*")):
+            continue
+        serial, state, details = fields[0], fields[1], {}
+        if state == "no":
+            # "no permissions (...)" spans several words.
+            state = "no permissions"
+        for field in fields[2:]:
+            key, separator, value = field.partition(":")
+            if separator and key in DeviceRecord._fields:
+                details[key] = value
+        if "transport_id" in details and details["transport_id"].isdigit():
+            details["transport_id"] = int(details["transport_id"])
+        records[serial] = DeviceRecord(serial, state, **details)
+    return records
+
+
+class DeviceRegistry:
+    """The device registry and listener dispatch shared by the watchers."""
+
+    def __init__(self):
+        self.devices = {}
+        self._listeners = []
+        self._condition = threading.Condition()
+
+    def on(self, kind, callback, loop=None):
+        """
+        Call `callback(event)` for events of `kind` ("connect", "disconnect",
+        "change" or "*" for all). Returns the callback, so it can be removed.
+        """
+        if kind != "*" and kind not in EVENTS:
+            raise ValueError(f"Unknown device event {kind!r}.")
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        self._listeners.append((kind, callback, loop))
+        return callback
+
+    def remove_listener(self, callback):
+        self._listeners = [entry for entry in self._listeners if entry[1] != callback]
+
+    def online(self) -> list:
+        """Serials currently in the `device` state."""
+        with self._condition:
+            return [s for s, r in self.devices.items() if r.state == "device"]
+
+    def _in_state(self, serial, state) -> bool:
+        record = self.devices.get(serial)
+        if state is None:
+            return record is None
+        return record is not None and record.state == state
+
+    def wait_for(self, serial, state="device", timeout=None) -> bool:
+        """
+        Block until `serial` is in `state` (None: until it is gone); return
+        False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._in_state(serial, state), timeout
+            )
+
+    def update(self, records: dict) -> list:
+        """Replace the registry with `records` and emit the resulting events."""
+        with self._condition:
+            previous, self.devices = self.devices, dict(records)
+            self._condition.notify_all()
+        events = [
+            DeviceEvent("disconnect", serial, None, record)
+            for serial, record in previous.items()
+            if serial not in records
+        ]
+        for serial, record in records.items():
+            if serial not in previous:
+                events.append(DeviceEvent("connect", serial, record, None))
+            elif previous[serial] != record:
+                events.append(DeviceEvent("change", serial, record, previous[serial]))
+        for event in events:
+            self._emit(event)
+        return events
+
+    def _emit(self, event):
+        for kind, callback, loop in list(self._listeners):
+            if kind not in ("*", event.kind):
+                continue
+            try:
+                result = callback(event)
+                if asyncio.iscoroutine(result):
+                    self._schedule(result, loop)
+            except Exception:
+                # A failing listener must not stop the watcher or other listeners.
+                logger.exception("Device listener %r failed on %s.", callback, event)
+
+    @staticmethod
+    def _schedule(coroutine, loop):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and (loop is None or loop is running):
+            running.create_task(coroutine)
+        elif loop is not None:
+            asyncio.run_coroutine_threadsafe(coroutine, loop)
+        else:
+            asyncio.run(coroutine)
+
+
+class DeviceWatcher(DeviceRegistry):
+    def __init__(self, transport=None, reconnect_delay=1.0):
+        super().__init__()
+        self.transport = transport or SocketTransport()
+        self.reconnect_delay = reconnect_delay
+        self.connected = threading.Event()
+        self._stopping = threading.Event()
+        self._sock = None
+        self._thread = None
+
+    def start(self) -> "DeviceWatcher":
+        """Start tracking on a background thread."""
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self._sock = self.transport._connect()
+                self._sock.settimeout(None)
+                self.transport._send_request(self._sock, "host:track-devices-l")
+                while not self._stopping.is_set():
+                    payload = self.transport._read_length_prefixed(self._sock)
+                    self.update(parse_devices_l(payload.decode(ENCODING)))
+                    self.connected.set()
+            except Exception:
+                # Closing the socket is how `stop` ends the loop.
+                if not self._stopping.is_set():
+                    logger.exception(
+                        "Device tracking failed; reconnecting in %ss.",
+                        self.reconnect_delay,
+                    )
+            finally:
+                self.connected.clear()
+                if self._sock is not None:
+                    self._sock.close()
+            if self._stopping.is_set():
+                break
+            # The server is gone: every device is, as far as we can tell.
+            self.update({})
+            self._stopping.wait(self.reconnect_delay)
+
+    def stop(self):
+        self._stopping.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        self.connected.wait(5)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,200 @@
+"""
+A class to fan one operation out across many devices concurrently.
+
+DeviceFleet runs any manager method (or callable accepting `device=`) on every
+serial of the fleet using a bounded worker pool. Devices are grouped by host
+(the IP of network serials, or the USB hub they are plugged into, from
+`devices -l`) and each group can be capped separately, so a single USB hub is
+not flooded while network devices keep flowing.
+
+Results are aggregated into a per-serial map; a failure or timeout on one
+device never affects the others. Each device runs under a `deadline` of the
+fleet timeout, so the commands of a device that times out are killed rather
+than left running.
+
+Example:
+    fleet = DeviceFleet(max_workers=32, per_host_limit=4, timeout=120)
+    results = fleet.run(app_manager.install_package, "app.apk")
+"""
+
+import contextlib
+import contextvars
+import queue
+import threading
+import time
+from collections import deque
+
+from adb_control.core.commands import deadline
+from adb_control.core.device_manager import DeviceManager
+
+
+def default_host_key(serial: str, record=None) -> str:
+    """
+    Group network devices by IP and USB devices by the hub they are plugged
+    into: the `usb:` port path of their DeviceRecord without its last port
+    ("1-1.2" and "1-1.3" share hub "usb:1-1"). Without a USB path, every
+    other device falls under "usb".
+    """
+    host, _, port = serial.rpartition(":")
+    if host and port.isdigit():
+        return host
+    if record is not None and record.usb:
+        hub, separator, _ = record.usb.rpartition(".")
+        if not separator:
+            hub = record.usb.partition("-")[0]
+        return f"usb:{hub}"
+    return "usb"
+
+
+class DeviceFleet:
+    def __init__(
+        self,
+        devices=None,
+        max_workers=16,
+        per_host_limit=None,
+        timeout=None,
+        host_key=None,
+        device_manager=None,
+    ):
+        """
+        :param devices: Serials to target. Defaults to DeviceManager.list_devices()
+            at each run.
+        :param max_workers: Maximum number of devices processed at the same time.
+        :param per_host_limit: Maximum number of concurrent devices per host group.
+        :param timeout: Per-device timeout in seconds.
+        :param host_key: Callable mapping a serial to its host group. Defaults to
+            `default_host_key`, fed with the `devices -l` records when
+            `per_host_limit` is set.
+        :param device_manager: DeviceManager used to discover devices.
+        """
+        self.devices = devices
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.host_key = host_key
+        self.device_manager = device_manager or DeviceManager()
+
+    def _resolve_devices(self, devices):
+        devices = devices if devices is not None else self.devices
+        if devices is None:
+            devices = self.device_manager.list_devices()
+            if isinstance(devices, dict):
+                raise RuntimeError(devices["message"])
+        return list(dict.fromkeys(devices))
+
+    def _host_keys(self, devices) -> dict:
+        """Map each serial to its host group."""
+        if self.host_key is not None:
+            return {serial: self.host_key(serial) for serial in devices}
+        records = {}
+        if self.per_host_limit:
+            records = self.device_manager.device_records()
+            if "status" in records:
+                records = {}
+        return {
+            serial: default_host_key(serial, records.get(serial)) for serial in devices
+        }
+
+    @staticmethod
+    def _call(operation, serial, args, kwargs, timeout=None):
+        start = time.monotonic()
+        try:
+            with deadline(timeout) if timeout is not None else contextlib.nullcontext():
+                result = operation(*args, device=serial, **kwargs)
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e),
+                "elapsed": time.monotonic() - start,
+            }
+        if isinstance(result, dict) and result.get("status") == "error":
+            return {
+                "status": "error",
+                "message": result.get("message", ""),
+                "result": result,
+                "elapsed": time.monotonic() - start,
+            }
+        return {
+            "status": "success",
+            "result": result,
+            "elapsed": time.monotonic() - start,
+        }
+
+    def run(self, operation, *args, devices=None, timeout=None, **kwargs) -> dict:
+        """
+        Run `operation(*args, device=serial, **kwargs)` on every device.
+
+        Args:
+            operation (callable): A manager method or any callable accepting `device=`.
+            devices (list, optional): Serials to target instead of the fleet's devices.
+            timeout (float, optional): Per-device timeout overriding the fleet default.
+
+        Returns:
+            dict: A map of serial to {"status", "result" or "message", "elapsed"}.
+                Devices that exceed the timeout are reported as errors right away,
+                but their worker keeps its slot until it returns, which the
+                deadline on its commands makes prompt, so a host's limit holds.
+        """
+        devices = self._resolve_devices(devices)
+        timeout = self.timeout if timeout is None else timeout
+        results = {}
+        finished = queue.SimpleQueue()
+
+        pending = {}
+        for serial, group in self._host_keys(devices).items():
+            pending.setdefault(group, deque()).append(serial)
+        active = dict.fromkeys(pending, 0)
+        running = {}
+
+        def worker(serial, context):
+            result = context.run(self._call, operation, serial, args, kwargs, timeout)
+            finished.put((serial, result))
+
+        def schedule():
+            for group, serials in pending.items():
+                while serials and len(running) < self.max_workers:
+                    if self.per_host_limit and active[group] >= self.per_host_limit:
+                        break
+                    serial = serials.popleft()
+                    running[serial] = (group, time.monotonic())
+                    active[group] += 1
+                    # Workers see the caller's context, e.g. an enclosing deadline.
+                    context = contextvars.copy_context()
+                    threading.Thread(
+                        target=worker, args=(serial, context), daemon=True
+                    ).start()
+
+        def release(serial, result):
+            group, _ = running.pop(serial)
+            active[group] -= 1
+            results.setdefault(serial, result)
+
+        schedule()
+        while len(results) < len(devices):
+            # Timed-out workers still hold their slot, but are not waited on.
+            waiting = [
+                started
+                for serial, (_, started) in running.items()
+                if serial not in results
+            ]
+            wait_for = None
+            if timeout is not None and waiting:
+                wait_for = max(0, min(waiting) + timeout - time.monotonic())
+            try:
+                serial, result = finished.get(timeout=wait_for)
+                release(serial, result)
+            except queue.Empty:
+                pass
+            now = time.monotonic()
+            for serial, (_, started) in running.items():
+                if serial in results or timeout is None:
+                    continue
+                if now - started >= timeout:
+                    results[serial] = {
+                        "status": "error",
+                        "message": f"Timed out after {timeout} seconds.",
+                        "elapsed": now - started,
+                    }
+            schedule()
+
+        return {serial: results[serial] for serial in devices}
@@ -0,0 +1,295 @@
+"""
+Gesture scripts for Android touch screens.
+
+A Gesture is a timeline of strokes (one finger each) built from taps,
+long presses, drags, paths and pinches; strokes that overlap in time are
+played as multi-touch. The timeline is sampled every `frame_interval`
+milliseconds and compiled into raw multi-touch (protocol B) input events for
+the touch screen's /dev/input/eventN node. The events are written by a single
+device-side shell script, so the whole gesture costs one round trip and its
+timing is kept by the device rather than by the host.
+
+Without a writable touch device, single-finger gestures fall back to
+`input tap` / `input swipe` commands.
+"""
+
+import math
+import re
+import struct
+
+EV_SYN = 0x00
+EV_KEY = 0x01
+EV_ABS = 0x03
+SYN_REPORT = 0x00
+BTN_TOUCH = 0x14A
+ABS_MT_SLOT = 0x2F
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+
+# One round trip to find the touch screen, the display size and the ABI.
+TOUCH_PROBE = "getevent -pl; echo @@; wm size; echo @@; getprop ro.product.cpu.abi"
+
+_DEVICE = re.compile(r"add device \d+: (\S+)")
+_AXIS = re.compile(r"(ABS_MT_\w+)\s*:.*\bmax (\d+)")
+_NAME = re.compile(r'^\s*name:\s*"(.*)"')
+_SIZE = re.compile(r"(\d+)x(\d+)")
+
+
+def parse_touch_probe(output: str) -> dict:
+    """
+    Parse the output of TOUCH_PROBE into the touch device description.
+
+    :return: "path", "max_x", "max_y", "slots", "width", "height",
+        "event_size" (24 bytes on 64-bit userspace, 16 otherwise) and
+        "nodes", the name of every input device node by path.
+    """
+    events, size, abi = (output.split("@@") + ["", ""])[:3]
+    touch, current, nodes = None, None, {}
+    for line in events.splitlines():
+        match = _DEVICE.search(line)
+        if match:
+            current = {"path": match.group(1), "axes": {}}
+            continue
+        match = _NAME.search(line)
+        if match and current is not None:
+            nodes[current["path"]] = match.group(1)
+            continue
+        match = _AXIS.search(line)
+        if match and current is not None:
+            current["axes"][match.group(1)] = int(match.group(2))
+            if touch is None and "ABS_MT_POSITION_X" in current["axes"]:
+                touch = current
+    if touch is None:
+        raise RuntimeError("No multi-touch input device found.")
+    # `wm size` prints the physical size, then any override.
+    sizes = _SIZE.findall(size)
+    if not sizes:
+        raise RuntimeError("Could not read the display size.")
+    width, height = (int(value) for value in sizes[-1])
+    axes = touch["axes"]
+    return {
+        "path": touch["path"],
+        "max_x": axes["ABS_MT_POSITION_X"],
+        "max_y": axes.get("ABS_MT_POSITION_Y", height - 1),
+        "slots": axes.get("ABS_MT_SLOT", 9) + 1,
+        "width": width,
+        "height": height,
+        "event_size": 24 if "64" in abi else 16,
+        "nodes": nodes,
+    }
+
+
+class Gesture:
+    """
+    Build a touch gesture. Steps run one after another unless given `at`
+    (milliseconds from the start), which lets strokes overlap:
+
+        gesture = Gesture().tap(100, 200).wait(50).drag(100, 800, 100, 200, 250)
+        two_fingers = Gesture().drag(300, 900, 300, 300, 400, at=0).drag(
+            700, 900, 700, 300, 400, at=0
+        )
+    """
+
+    def __init__(self, frame_interval=8):
+        self.frame_interval = frame_interval
+        self.strokes = []
+        self.cursor = 0
+
+    def _stroke(self, points, at=None):
+        """Add a stroke of (time in ms from its start, x, y) samples."""
+        start = self.cursor if at is None else at
+        self.strokes.append([(start + t, round(x), round(y)) for t, x, y in points])
+        self.cursor = max(self.cursor, start + points[-1][0])
+        return self
+
+    def wait(self, duration):
+        self.cursor += duration
+        return self
+
+    def tap(self, x, y, duration=40, at=None):
+        return self._stroke([(0, x, y), (max(duration, 1), x, y)], at)
+
+    def long_press(self, x, y, duration=800, at=None):
+        return self.tap(x, y, duration, at)
+
+    def drag(self, x1, y1, x2, y2, duration=300, at=None):
+        return self.path([(x1, y1), (x2, y2)], duration, at)
+
+    def path(self, points, duration=300, at=None):
+        """
+        Move one finger through `points` at constant speed over `duration` ms;
+        a single point is pressed for `duration`.
+        """
+        points = list(points)
+        if not points:
+            raise ValueError("A path needs at least one point.")
+        if len(points) == 1:
+            return self.tap(*points[0], duration, at)
+        lengths = [math.dist(a, b) for a, b in zip(points, points[1:])]
+        total = sum(lengths) or 1.0
+        steps = max(1, round(duration / self.frame_interval))
+        samples = []
+        for step in range(steps + 1):
+            distance, segment = total * step / steps, 0
+            while segment < len(lengths) - 1 and distance > lengths[segment]:
+                distance -= lengths[segment]
+                segment += 1
+            (xa, ya), (xb, yb) = points[segment], points[segment + 1]
+            ratio = distance / lengths[segment] if lengths[segment] else 1.0
+            t = duration * step / steps
+            samples.append((t, xa + (xb - xa) * ratio, ya + (yb - ya) * ratio))
+        return self._stroke(samples, at)
+
+    def pinch(
+        self, cx, cy, start_distance, end_distance, duration=400, angle=0, at=None
+    ):
+        """Two fingers moving symmetrically around (cx, cy); angle in degrees."""
+        start = self.cursor if at is None else at
+        dx, dy = math.cos(math.radians(angle)) / 2, math.sin(math.radians(angle)) / 2
+        for sign in (-1, 1):
+            self.path(
+                [
+                    (cx + sign * dx * start_distance, cy + sign * dy * start_distance),
+                    (cx + sign * dx * end_distance, cy + sign * dy * end_distance),
+                ],
+                duration,
+                at=start,
+            )
+        return self
+
+    @property
+    def multi_touch(self) -> bool:
+        busy_until = -math.inf
+        for start, end in sorted((s[0][0], s[-1][0]) for s in self.strokes):
+            if start < busy_until:
+                return True
+            busy_until = max(busy_until, end)
+        return False
+
+    def frames(self) -> list:
+        """
+        Return the timeline as [(time, [(stroke, kind, x, y), ...]), ...] where
+        kind is "down", "move" or "up".
+        """
+        timeline = {}
+        for index, stroke in enumerate(self.strokes):
+            last = len(stroke) - 1
+            for position, (t, x, y) in enumerate(stroke):
+                kind = "down" if position == 0 else "up" if position == last else "move"
+                timeline.setdefault(round(t), []).append((index, kind, x, y))
+        # Lifts go first so a finger can land in the same frame another leaves.
+        return [
+            (t, sorted(timeline[t], key=lambda event: event[1] != "up"))
+            for t in sorted(timeline)
+        ]
+
+    def input_commands(self) -> list:
+        """Single-finger fallback as `input tap` / `input swipe` commands."""
+        if self.multi_touch:
+            raise RuntimeError("Multi-touch gestures need a writable touch device.")
+        commands, clock = [], 0
+        for stroke in sorted(self.strokes, key=lambda stroke: stroke[0][0]):
+            (start, x1, y1), (end, x2, y2) = stroke[0], stroke[-1]
+            if start > clock:
+                commands.append(f"sleep {(start - clock) / 1000:.3f}")
+            if len(stroke) == 2 and (x1, y1) == (x2, y2) and end - start < 100:
+                commands.append(f"input tap {x1} {y1}")
+            else:
+                commands.append(f"input swipe {x1} {y1} {x2} {y2} {round(end - start)}")
+            clock = end
+        return commands
+
+    def compile(self, touch: dict, sleep_overhead=1.0) -> str:
+        """
+        Compile the gesture into a device shell script writing raw input events.
+
+        :param touch: The touch device description from `parse_touch_probe`.
+        :param sleep_overhead: Milliseconds each `sleep` call costs on the
+            device, taken off the requested delays.
+        """
+        scale_x = (touch["max_x"] + 1) / touch["width"]
+        scale_y = (touch["max_y"] + 1) / touch["height"]
+        slots, free = {}, list(range(touch["slots"]))
+        active, current_slot, tracking_id = 0, None, 0
+        positions = {}
+        frames = []
+        for t, events in self.frames():
+            frame = []
+
+            def emit(kind, code, value):
+                frame.append((touch["path"], kind, code, value))
+
+            for stroke, kind, x, y in events:
+                if kind == "down":
+                    if not free:
+                        raise RuntimeError("The gesture uses more fingers than slots.")
+                    slots[stroke] = free.pop(0)
+                slot = slots[stroke]
+                if slot != current_slot:
+                    emit(EV_ABS, ABS_MT_SLOT, slot)
+                    current_slot = slot
+                position = (
+                    min(round(x * scale_x), touch["max_x"]),
+                    min(round(y * scale_y), touch["max_y"]),
+                )
+                if kind == "up":
+                    # Report the last point before lifting, or the stroke ends short.
+                    if positions.pop(stroke) != position:
+                        emit(EV_ABS, ABS_MT_POSITION_X, position[0])
+                        emit(EV_ABS, ABS_MT_POSITION_Y, position[1])
+                        emit(EV_SYN, SYN_REPORT, 0)
+                    emit(EV_ABS, ABS_MT_TRACKING_ID, -1)
+                    free.insert(0, slots.pop(stroke))
+                    active -= 1
+                    if active == 0:
+                        emit(EV_KEY, BTN_TOUCH, 0)
+                    continue
+                if kind == "down":
+                    emit(EV_ABS, ABS_MT_TRACKING_ID, tracking_id)
+                    tracking_id += 1
+                    active += 1
+                    if active == 1:
+                        emit(EV_KEY, BTN_TOUCH, 1)
+                emit(EV_ABS, ABS_MT_POSITION_X, position[0])
+                emit(EV_ABS, ABS_MT_POSITION_Y, position[1])
+                positions[stroke] = position
+            emit(EV_SYN, SYN_REPORT, 0)
+            frames.append((t, frame))
+        return event_scripts(frames, touch["event_size"], sleep_overhead)[0]
+
+
+def event_scripts(frames, event_size, sleep_overhead=1.0, frames_per_script=None):
+    """
+    Turn timed input event frames into device shell scripts that play them.
+
+    :param frames: [(time in ms, [(device node, type, code, value), ...]), ...]
+    :param event_size: Size of `struct input_event` on the device (16 or 24).
+    :param frames_per_script: Split long recordings into several scripts,
+        which run back to back on a shell session; None keeps one script.
+    :return: A list of scripts. Each opens the event nodes it writes to once
+        and sleeps between frames on the device.
+    """
+    layout = "<qqHHi" if event_size == 24 else "<iiHHi"
+    size = frames_per_script or max(1, len(frames))
+    scripts, clock = [], 0
+    for start in range(0, len(frames), size):
+        parts, descriptors = [], {}
+        for t, events in frames[start : start + size]:
+            delay = t - clock - sleep_overhead
+            if t > clock and delay > 0:
+                parts.append(f"sleep {delay / 1000:.3f}")
+            clock = t
+            packed = {}
+            for path, kind, code, value in events:
+                descriptor = descriptors.setdefault(path, 3 + len(descriptors))
+                packed.setdefault(descriptor, []).append(
+                    struct.pack(layout, 0, 0, kind, code, value)
+                )
+            for descriptor, data in packed.items():
+                # mksh's builtin `print` writes octal escapes without forking.
+                escaped = "".join(f"\\0{b:o}" for b in b"".join(data))
+                parts.append(f"print -nu{descriptor} '{escaped}'")
+        redirections = " ".join(f"{fd}>{path}" for path, fd in descriptors.items())
+        scripts.append("{ " + "; ".join(parts) + "; } " + redirections)
+    return scripts
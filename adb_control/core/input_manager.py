@@ -5,15 +5,225 @@ This class provides methods to simulate touch gestures and key events on Android
 It supports tapping, swiping, entering text, sending key events, and performing repeated taps.
 Inherits from ADBBase to leverage common ADB command functionality.
 
+When a socket transport is available, input commands run on the device's persistent
+shell session instead of opening a new shell each time, and `batch` pipelines a whole
+sequence of input commands in a single round trip.
+
+`perform` plays a Gesture (taps, drags, long presses, pinches, multi-finger paths)
+by writing raw multi-touch events to the touch screen from one device-side script,
+so event timing is kept on the device.
+
+Text is escaped for the device shell and for `input text`, split into large chunks,
+and typed together with any key events in one shell call (`fill`). Text that
+`input text` cannot type (non-ASCII) goes through the ADBKeyboard IME broadcast,
+or through the clipboard followed by a paste key event; `am broadcast` succeeds
+even when nothing receives it, so the IME or the Clipper app is checked first.
+
+`macro_recorder` captures an operator's input from `getevent`, and `replay_macro`
+plays a recorded Macro back on one or many devices (see macro.py).
+
 Attributes:
     adb_path (str): Path to the ADB executable (default is "adb").
 """
 
-import time
+import base64
+import shlex
+import threading
+from enum import Enum
 from adb_control.core.base import ADBBase
+from adb_control.core.fleet import DeviceFleet
+from adb_control.core.gesture import TOUCH_PROBE, Gesture, parse_touch_probe
+from adb_control.core.macro import Macro, MacroRecorder, macro_scripts
+from adb_control.core.transport import SESSION_TIMEOUT
+
+KEYCODE_TAB = 61
+KEYCODE_ENTER = 66
+KEYCODE_PASTE = 279
+_CONTROL_KEYS = {"\n": KEYCODE_ENTER, "\t": KEYCODE_TAB}
+ADBKEYBOARD_IME = "com.android.adbkeyboard/.AdbIME"
+CLIPPER_PACKAGE = "ca.zgrs.clipper"
+# The receiver each broadcast method needs: (check command, expected output, error).
+_RECEIVERS = {
+    "adbkeyboard": (
+        "settings get secure default_input_method",
+        ADBKEYBOARD_IME,
+        "The ADBKeyboard IME is not the current input method.",
+    ),
+    "clipboard": (
+        f"pm path {CLIPPER_PACKAGE}",
+        "package:",
+        "The Clipper app (ca.zgrs.clipper) is not installed.",
+    ),
+}
+
+
+def _typable(text: str) -> bool:
+    return all(32 <= ord(char) < 127 or char in _CONTROL_KEYS for char in text)
+
+
+def _input_pieces(line: str) -> list:
+    """
+    Split a line so no piece contains a literal "%s".
+
+    `input text` turns every "%s" into a space and has no escape for it, so
+    the "%" and the "s" are typed by two separate calls.
+    """
+    pieces = line.split("%s")
+    return [
+        ("s" if index else "") + piece + ("%" if index < len(pieces) - 1 else "")
+        for index, piece in enumerate(pieces)
+    ]
+
+
+def text_commands(text: str, method="auto", chunk_size=1000, fallback=None) -> list:
+    """
+    Translate text into device shell commands that type it.
+
+    :param method: "input" (`input text`, ASCII only), "adbkeyboard" (the
+        ADB_INPUT_B64 broadcast of the ADBKeyboard IME), "clipboard" (the
+        clipper.set broadcast, then a paste key event) or "auto" (`input text`
+        when possible, otherwise `fallback`).
+    :param chunk_size: Characters per command; every `input text` call starts
+        a new process on the device, so fewer, larger chunks are faster.
+    :param fallback: Method for text `input text` cannot type in "auto" mode;
+        without one such text raises ValueError.
+    """
+    if method == "auto":
+        if _typable(text):
+            method = "input"
+        elif fallback is None:
+            raise ValueError(
+                "`input text` can only type ASCII text; "
+                "use method='adbkeyboard' or method='clipboard'."
+            )
+        else:
+            method = fallback
+    chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+    if method == "adbkeyboard":
+        return [
+            "am broadcast -a ADB_INPUT_B64 --es msg "
+            + base64.b64encode(chunk.encode("utf-8")).decode("ascii")
+            for chunk in chunks
+        ]
+    if method == "clipboard":
+        return [f"am broadcast -a clipper.set -e text {shlex.quote(text)}"] + [
+            f"input keyevent {KEYCODE_PASTE}"
+        ]
+    if method != "input":
+        raise ValueError(f"Unknown text input method {method!r}.")
+    if not _typable(text):
+        raise ValueError("`input text` can only type ASCII text.")
+    commands, keys = [], []
+    for line in _split_control_keys(text):
+        if isinstance(line, int):
+            keys.append(str(line))
+            continue
+        if keys:
+            commands.append("input keyevent " + " ".join(keys))
+            keys = []
+        for piece in _input_pieces(line):
+            for i in range(0, len(piece), chunk_size):
+                # `input text` reads %s as a space; the device shell needs quoting.
+                chunk = piece[i : i + chunk_size].replace(" ", "%s")
+                commands.append(f"input text {shlex.quote(chunk)}")
+    if keys:
+        commands.append("input keyevent " + " ".join(keys))
+    return commands
+
+
+def _split_control_keys(text):
+    """Yield runs of plain text and the key codes of newlines and tabs."""
+    start = 0
+    for index, char in enumerate(text):
+        if char in _CONTROL_KEYS:
+            if index > start:
+                yield text[start:index]
+            yield _CONTROL_KEYS[char]
+            start = index + 1
+    if start < len(text):
+        yield text[start:]
+
+
+def fill_commands(items, method="auto", chunk_size=1000, fallback=None) -> list:
+    """
+    Translate a sequence of texts and key codes into device shell commands.
+
+    Consecutive key events are merged into one `input keyevent` call.
+    """
+    commands = []
+    for item in items:
+        if isinstance(item, Enum):
+            item = item.value
+        if isinstance(item, int):
+            item_commands = [f"input keyevent {item}"]
+        else:
+            item_commands = text_commands(item, method, chunk_size, fallback)
+        for command in item_commands:
+            previous = commands[-1] if commands else ""
+            if command.startswith("input keyevent ") and previous.startswith(
+                "input keyevent "
+            ):
+                commands[-1] = previous + command[len("input keyevent") :]
+            else:
+                commands.append(command)
+    return commands
+
+
+class InputBatch:
+    """
+    Collects input commands for one device and runs them in a single round trip.
+
+    Usable as a context manager, in which case the batch runs on exit:
+
+        with input_manager.batch(device="emulator-5554") as batch:
+            batch.tap(100, 200).keyevent(66)
+    """
+
+    def __init__(self, manager, device=None):
+        self.manager = manager
+        self.device = device
+        self.commands = []
+        self.results = None
+
+    def tap(self, x, y):
+        self.commands.append(f"input tap {x} {y}")
+        return self
+
+    def swipe(self, x1, y1, x2, y2, duration=1000):
+        self.commands.append(f"input swipe {x1} {y1} {x2} {y2} {duration}")
+        return self
+
+    def text(self, text, method="auto"):
+        self.commands.extend(text_commands(text, method))
+        return self
+
+    def keyevent(self, keyevent):
+        self.commands.append(f"input keyevent {keyevent}")
+        return self
+
+    def execute(self) -> list:
+        """Run the queued commands and return one CompletedProcess per command."""
+        commands, self.commands = self.commands, []
+        self.results = self.manager._run_shell_commands(commands, self.device)
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.execute()
 
 
 class InputManager(ADBBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # device -> touch device description, or None when there is none.
+        self._touch_devices = {}
+        self._touch_lock = threading.Lock()
+        # (device, method) pairs whose broadcast receiver was found.
+        self._receivers = set()
+
     def _prepare_command(self, command, device=None):
         """
         Prepare the adb command with device-specific options.
@@ -22,14 +232,68 @@ class InputManager(ADBBase):
             return f"-s {device} {command}"
         return command
 
+    def _run_shell_commands(self, commands, device=None, timeout=None) -> list:
+        """
+        Run shell commands on the device's persistent session, pipelined.
+
+        Falls back to one `adb shell` per command when no transport is available
+        or the adb server cannot be reached.
+
+        Like `run_command`, the commands are bounded by `timeout` (or the
+        instance default) and the current deadline, and are listed by
+        `in_flight()` while they run.
+
+        :param timeout: Seconds to wait for output, for scripts known to run long.
+        """
+        if self.transport:
+            command = self._prepare_command(f"shell {'; '.join(commands)}", device)
+            try:
+                with self._bounded(command, timeout):
+                    session = self.transport.shell_session(device)
+                    return session.run_many(commands, timeout)
+            except ConnectionRefusedError:
+                pass
+        return [
+            self.run_command(
+                self._prepare_command(f"shell {shlex.quote(command)}", device)
+            )
+            for command in commands
+        ]
+
+    def _run_input(self, command, device=None, timeout=None):
+        return self._run_shell_commands([command], device, timeout)[0]
+
+    def _check_receiver(self, method, device=None):
+        """Raise RuntimeError unless the receiver of a broadcast text method is present."""
+        if (device, method) in self._receivers:
+            return
+        command, expected, error = _RECEIVERS[method]
+        output = self._run_input(command, device).stdout.decode(errors="replace")
+        if expected not in output:
+            raise RuntimeError(error)
+        self._receivers.add((device, method))
+
+    def batch(self, device=None) -> InputBatch:
+        """
+        Start a batch of input commands for a device.
+
+        Queued commands are written to the device's shell session at once, so a
+        burst of taps costs a single round trip instead of one per tap.
+
+        Args:
+            device (str, optional): The device identifier. If not provided, the command will run on the default device.
+
+        Returns:
+            InputBatch: The batch, to be filled and executed (or used as a context manager).
+        """
+        return InputBatch(self, device)
+
     def tap(self, x, y, device=None):
         """
         Tap on the screen at the given coordinates.
         """
         try:
-            command = f"shell input tap {x} {y}"
-            command = self._prepare_command(command, device)
-            return self.run_command(command)
+            return self._run_input(f"input tap {x} {y}", device)
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -52,29 +316,60 @@ class InputManager(ADBBase):
             dict: A dictionary containing the status of the operation ("success" or "error") and a message.
         """
         try:
-            command = f"shell input swipe {x1} {y1} {x2} {y2} {duration}"
-            command = self._prepare_command(command, device)
-            return self.run_command(command)
+            command = f"input swipe {x1} {y1} {x2} {y2} {duration}"
+            return self._run_input(command, device)
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def text(self, text, device=None):
+    def text(self, text, device=None, method="auto", chunk_size=1000):
         """
         Input text on the device.
 
-        Simulates typing the specified text on the device.
+        Simulates typing the specified text on the device. The text is escaped, sent in
+        large chunks and typed in a single shell call; newlines and tabs become Enter and
+        Tab key events.
 
         Args:
             text (str): The text to input.
             device (str, optional): The device identifier. If not provided, the command will run on the default device.
+            method (str, optional): "auto", "input", "adbkeyboard" or "clipboard" (see `text_commands`).
+                "auto" types non-ASCII text with ADBKeyboard, when it is the current IME.
+            chunk_size (int, optional): Characters typed per `input text` call.
+
+        Returns:
+            dict: A dictionary containing the status of the operation ("success" or "error") and a message.
+        """
+        return self.fill([text], device, method, chunk_size)
+
+    def fill(self, items, device=None, method="auto", chunk_size=1000):
+        """
+        Type a sequence of texts and key events in one shell call.
+
+        Args:
+            items (list): Strings to type and key codes (int or key enum) to press, e.g.
+                ["user@example.com", SystemButton.KEYCODE_ENTER, "password", 66].
+            device (str, optional): The device identifier. If not provided, the command will run on the default device.
 
         Returns:
             dict: A dictionary containing the status of the operation ("success" or "error") and a message.
         """
         try:
-            command = f"shell input text {text}"
-            command = self._prepare_command(command, device)
-            return self.run_command(command)
+            fallback = None
+            texts = [item for item in items if isinstance(item, str)]
+            if method == "auto" and not all(_typable(text) for text in texts):
+                fallback = "adbkeyboard"
+            for needed in {method, fallback} & set(_RECEIVERS):
+                self._check_receiver(needed, device)
+            commands = fill_commands(items, method, chunk_size, fallback)
+            if not commands:
+                return {"status": "success", "message": "Nothing to type."}
+            result = self._run_input(" && ".join(commands), device)
+            if result.returncode != 0:
+                return {
+                    "status": "error",
+                    "message": (result.stdout + result.stderr).decode().strip(),
+                }
+            return {"status": "success", "message": "Text entered."}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -92,9 +387,7 @@ class InputManager(ADBBase):
             dict: A dictionary containing the status of the operation ("success" or "error") and a message.
         """
         try:
-            command = f"shell input keyevent {keyevent}"
-            command = self._prepare_command(command, device)
-            return self.run_command(command)
+            return self._run_input(f"input keyevent {keyevent}", device)
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -103,6 +396,7 @@ class InputManager(ADBBase):
         Tap repeatedly at the given coordinates.
 
         Simulates multiple tap gestures at the same coordinates with a delay between each tap.
+        The taps and delays run on the device in a single round trip.
 
         Args:
             x (int): The x-coordinate of the screen where the tap should occur.
@@ -114,13 +408,130 @@ class InputManager(ADBBase):
         Returns:
             dict: A dictionary containing the status of the operation ("success" or "error") and a message.
         """
+        if times < 1:
+            return {"status": "success", "message": "Nothing to tap."}
         try:
-            for _ in range(times):
-                self.tap(x, y, device)
-                time.sleep(delay / 1000.0)
+            pause = f"; sleep {delay / 1000.0:.3f}; "
+            script = pause.join([f"input tap {x} {y}"] * times)
+            timeout = SESSION_TIMEOUT + times * delay / 1000.0
+            result = self._run_input(script, device, timeout)
+            if result.returncode != 0:
                 return {
-                    "status": "success",
-                    "message": f"Tapped {times} times at ({x}, {y})",
+                    "status": "error",
+                    "message": (result.stdout + result.stderr).decode(),
                 }
+            return {
+                "status": "success",
+                "message": f"Tapped {times} times at ({x}, {y})",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def touch_device(self, device=None, refresh=False):
+        """
+        Describe the device's touch screen input node (see `parse_touch_probe`).
+
+        The description is looked up once per device; None means there is no
+        multi-touch input device.
+        """
+        with self._touch_lock:
+            if not refresh and device in self._touch_devices:
+                return self._touch_devices[device]
+        result = self._run_input(TOUCH_PROBE, device)
+        try:
+            touch = parse_touch_probe(result.stdout.decode())
+        except RuntimeError:
+            touch = None
+        with self._touch_lock:
+            self._touch_devices[device] = touch
+        return touch
+
+    def perform(self, gesture: Gesture, device=None, sleep_overhead=1.0):
+        """
+        Play a gesture in a single round trip.
+
+        Args:
+            gesture (Gesture): The gesture to play.
+            device (str, optional): The device identifier. If not provided, the command will run on the default device.
+            sleep_overhead (float, optional): Milliseconds a device-side `sleep` costs,
+                taken off each delay between input frames.
+
+        Returns:
+            dict: "status", "message" and "method": "events" when raw events were written
+                to the touch screen, "input" for the `input` command fallback.
+        """
+        try:
+            touch = self.touch_device(device)
+            if touch is not None:
+                script = gesture.compile(touch, sleep_overhead)
+                result = self._run_input(script, device)
+                if result.returncode == 0:
+                    return {
+                        "status": "success",
+                        "message": f"Gesture played on {touch['path']}.",
+                        "method": "events",
+                    }
+                if gesture.multi_touch:
+                    return {
+                        "status": "error",
+                        "message": result.stdout.decode().strip()
+                        or f"Cannot write to {touch['path']}.",
+                    }
+            result = self._run_input("; ".join(gesture.input_commands()), device)
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stdout.decode().strip()}
+            return {
+                "status": "success",
+                "message": "Gesture played with input commands.",
+                "method": "input",
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    def macro_recorder(self, device=None) -> MacroRecorder:
+        """
+        Create a recorder for the input events of a device; call `start()` and
+        later `stop()` to get the Macro, or `record(seconds)`.
+        """
+        return MacroRecorder(self, device)
+
+    def replay_macro(
+        self, macro: Macro, device=None, devices=None, speed=1.0, sleep_overhead=1.0
+    ):
+        """
+        Replay a recorded macro with its original timing.
+
+        Touch coordinates are rescaled from the recording device's touch screen to
+        the target's. The replay is sent as a few pipelined scripts on the device's
+        shell session, and the device keeps the time between events.
+
+        Args:
+            macro (Macro): The macro, e.g. from `Macro.load(path)`.
+            device (str, optional): The device identifier. If not provided, the command will run on the default device.
+            devices (list, optional): Several devices to replay on concurrently.
+            speed (float, optional): Playback speed factor.
+
+        Returns:
+            dict: A dictionary containing the status of the operation ("success" or "error") and a message.
+                With `devices`, a map of serial to such results.
+        """
+        if devices is not None:
+            return DeviceFleet(devices=devices).run(
+                self.replay_macro, macro, speed=speed, sleep_overhead=sleep_overhead
+            )
+        try:
+            touch = self.touch_device(device)
+            if touch is None:
+                return {"status": "error", "message": "No touch screen found."}
+            scripts = macro_scripts(macro, touch, speed, sleep_overhead)
+            timeout = SESSION_TIMEOUT + macro.duration / speed
+            for result in self._run_shell_commands(scripts, device, timeout):
+                if result.returncode != 0:
+                    output = result.stdout + result.stderr
+                    return {"status": "error", "message": output.decode().strip()}
+            return {
+                "status": "success",
+                "message": f"Replayed {len(macro.events)} events.",
+            }
         except Exception as e:
             return {"status": "error", "message": str(e)}
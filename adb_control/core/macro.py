@@ -0,0 +1,238 @@
+"""
+Record input from a device and replay it on others.
+
+MacroRecorder streams `getevent -t` from a device and keeps every input event
+with its kernel timestamp. A Macro is stored as NDJSON: a header line with the
+recording device's touch screen and display size, then one compact
+`[time, node, type, code, value]` array per event.
+
+Replaying groups the events into SYN_REPORT frames, rescales touch
+coordinates from the recording touch screen to the target's, moves the events
+of other input devices (keys, sensors) to the target's node of the same name
+or drops them when it has none, and plays the
+frames with `event_scripts` (see gesture.py), so the timing between frames is
+kept by the target device. Replays on several devices run concurrently.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from typing import NamedTuple
+
+from adb_control.core.gesture import (
+    ABS_MT_POSITION_X,
+    ABS_MT_POSITION_Y,
+    EV_ABS,
+    EV_SYN,
+    SYN_REPORT,
+    event_scripts,
+)
+
+ABS_X = 0x00
+ABS_Y = 0x01
+
+logger = logging.getLogger(__name__)
+
+_EVENT_LINE = re.compile(
+    r"\[\s*(\d+\.\d+)\]\s+(/dev/input/event\d+):\s+(\S+)\s+(\S+)\s+(\S+)"
+)
+# Labels printed by `getevent -l`, for recordings made with -lt.
+_LABELS = {
+    "EV_SYN": 0x00,
+    "EV_KEY": 0x01,
+    "EV_REL": 0x02,
+    "EV_ABS": 0x03,
+    "EV_MSC": 0x04,
+    "SYN_REPORT": 0x00,
+    "SYN_MT_REPORT": 0x02,
+    "BTN_TOUCH": 0x14A,
+    "BTN_TOOL_FINGER": 0x145,
+    "ABS_X": 0x00,
+    "ABS_Y": 0x01,
+    "ABS_PRESSURE": 0x18,
+    "ABS_MT_SLOT": 0x2F,
+    "ABS_MT_TOUCH_MAJOR": 0x30,
+    "ABS_MT_TOUCH_MINOR": 0x31,
+    "ABS_MT_WIDTH_MAJOR": 0x32,
+    "ABS_MT_ORIENTATION": 0x34,
+    "ABS_MT_POSITION_X": 0x35,
+    "ABS_MT_POSITION_Y": 0x36,
+    "ABS_MT_TRACKING_ID": 0x39,
+    "ABS_MT_PRESSURE": 0x3A,
+    "KEY_VOLUMEDOWN": 114,
+    "KEY_VOLUMEUP": 115,
+    "KEY_POWER": 116,
+    "KEY_BACK": 158,
+    "KEY_HOMEPAGE": 172,
+    "KEY_APPSELECT": 580,
+    "DOWN": 1,
+    "UP": 0,
+}
+
+
+class MacroEvent(NamedTuple):
+    time: float
+    path: str
+    type: int
+    code: int
+    value: int
+
+
+def _number(token: str) -> int:
+    if token in _LABELS:
+        return _LABELS[token]
+    return int(token, 16)
+
+
+def parse_getevent_line(line: str):
+    """Parse one `getevent -t` (or `-lt`) line into a MacroEvent, or None."""
+    match = _EVENT_LINE.search(line)
+    if not match:
+        return None
+    timestamp, path, kind, code, value = match.groups()
+    try:
+        value = _number(value)
+    except ValueError:
+        return None
+    if value >= 1 << 31:
+        value -= 1 << 32
+    try:
+        return MacroEvent(float(timestamp), path, _number(kind), _number(code), value)
+    except ValueError:
+        return None
+
+
+class Macro:
+    def __init__(self, events=(), header=None):
+        self.events = list(events)
+        self.header = dict(header or {})
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1].time - self.events[0].time if self.events else 0.0
+
+    def save(self, file_path: str):
+        with open(file_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"version": 1, **self.header}) + "\n")
+            start = self.events[0].time if self.events else 0.0
+            for event in self.events:
+                offset = round(event.time - start, 6)
+                row = [offset, event.path, event.type, event.code, event.value]
+                file.write(json.dumps(row, separators=(",", ":")) + "\n")
+
+    @classmethod
+    def load(cls, file_path: str) -> "Macro":
+        with open(file_path, encoding="utf-8") as file:
+            header = json.loads(file.readline())
+            header.pop("version", None)
+            events = [MacroEvent(*json.loads(line)) for line in file if line.strip()]
+        return cls(events, header)
+
+    def frames(self, touch=None, speed=1.0) -> list:
+        """
+        Group the events into timed frames for `event_scripts`.
+
+        :param touch: The target's touch screen (see `parse_touch_probe`);
+            events of the recorded touch screen are redirected to it and their
+            coordinates rescaled. Events of other nodes go to the target's
+            node with the same name; those without one are dropped with a
+            warning.
+        :param speed: Playback speed factor.
+        """
+        source = self.header.get("touch") or {}
+        scale, paths = {}, {}
+        if touch and source:
+            x = (touch["max_x"] + 1) / (source["max_x"] + 1)
+            y = (touch["max_y"] + 1) / (source["max_y"] + 1)
+            scale = {ABS_MT_POSITION_X: x, ABS_X: x, ABS_MT_POSITION_Y: y, ABS_Y: y}
+            targets = {name: path for path, name in touch.get("nodes", {}).items()}
+            for path, name in source.get("nodes", {}).items():
+                if name in targets:
+                    paths[path] = targets[name]
+            paths[source["path"]] = touch["path"]
+        frames, frame, dropped = [], [], set()
+        start = self.events[0].time if self.events else 0.0
+        for event in self.events:
+            path, value = event.path, event.value
+            if paths:
+                if path not in paths:
+                    dropped.add(path)
+                    continue
+                if path == source["path"] and event.type == EV_ABS:
+                    value = round(value * scale.get(event.code, 1))
+                path = paths[path]
+            frame.append((path, event.type, event.code, value))
+            if event.type == EV_SYN and event.code == SYN_REPORT:
+                frames.append(((event.time - start) * 1000 / speed, frame))
+                frame = []
+        if frame:
+            frames.append(((self.events[-1].time - start) * 1000 / speed, frame))
+        if dropped:
+            logger.warning(
+                "Dropped the events of %s: the target has no input device of that name.",
+                ", ".join(sorted(dropped)),
+            )
+        return frames
+
+
+class MacroRecorder:
+    """
+    Record the input events of a device until `stop` is called:
+
+        recorder = input_manager.macro_recorder(device="emulator-5554").start()
+        ...  # operate the device
+        input_manager.replay_macro(recorder.stop(), devices=[...])
+    """
+
+    def __init__(self, manager, device=None):
+        self.manager = manager
+        self.device = device
+        self.events = []
+        self.error = None
+        self._stream = None
+        self._thread = None
+
+    def start(self) -> "MacroRecorder":
+        touch = self.manager.touch_device(self.device)
+        self.header = {"device": self.device, "touch": touch}
+        command = self.manager._prepare_command("shell getevent -t", self.device)
+        self._stream = self.manager.open_stream(command)
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+        return self
+
+    def _read(self):
+        pending = b""
+        try:
+            while True:
+                chunk = self._stream.read(65536)
+                if not chunk:
+                    break
+                *lines, pending = (pending + chunk).split(b"\n")
+                for line in lines:
+                    event = parse_getevent_line(line.decode("utf-8", "replace"))
+                    if event is not None:
+                        self.events.append(event)
+        except (OSError, ValueError) as e:
+            if not self._stream.closed:
+                self.error = e
+
+    def stop(self) -> Macro:
+        if self._stream is not None:
+            self._stream.close()
+            self._thread.join()
+        return Macro(self.events, self.header)
+
+    def record(self, duration: float) -> Macro:
+        """Record for `duration` seconds and return the macro."""
+        self.start()
+        time.sleep(duration)
+        return self.stop()
+
+
+def macro_scripts(macro, touch, speed=1.0, sleep_overhead=1.0, frames_per_script=200):
+    """Compile a macro into the device scripts replaying it on `touch`'s device."""
+    frames = macro.frames(touch, speed)
+    return event_scripts(frames, touch["event_size"], sleep_overhead, frames_per_script)
@@ -5,17 +5,107 @@
     listing media files, and removing files or folders on Android devices. It uses ADB commands
     to interact with the device and perform these operations.
 
+    Screenshots can also be streamed: raw `screencap` output is pulled over `exec-out`
+    straight into memory and yielded as frames, with PNG encoding and file writes moved
+    to a background thread. `watch_screen` reports the regions that changed between
+    consecutive frames, `take_screenshots(dedupe=True)` skips frames identical to the
+    previous one, and `locate_on_screen` finds a template image on screen (see
+    utils/frame_diff.py).
+
+    Videos can be streamed too: `start_recording` reads `screenrecord --output-format=h264`
+    straight to the host into rolling segment files, with no temporary file on the device
+    and no time limit (screenrecord is restarted every 3 minutes without a gap), and
+    `record_many` records several devices at once.
+
+    `walk_files` lists remote trees recursively over the sync protocol, with sizes and
+    mtimes, optionally through a per-device index so repeated scans only list the
+    directories that changed (see remote_index.py). Without a transport they are
+    listed with `find` on the device.
+
     Attributes:
         adb_path (str): The path to the ADB executable (default is "adb").
 """
 
+import os
+import queue
+import shlex
+import threading
 import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from adb_control.core.base import ADBBase
+from adb_control.core.remote_index import RemoteIndex, find_script, parse_find, walk
+from adb_control.core.stream_manager import H264Stream, SegmentedRecorder
+from adb_control.core.sync import SyncConnection
+from adb_control.core.utils.frame_diff import FrameDiffer, locate
+from adb_control.core.utils.image import Frame, encode_png, parse_screencap
 from adb_control.core.utils.params import ENCODING
 
 
+class FrameWriter:
+    """
+    Encodes and writes frames to disk on a background thread.
+
+    The queue is bounded so a slow disk applies back-pressure to the capture
+    loop instead of growing memory without limit.
+    """
+
+    def __init__(self, output_path, encoding="png", max_pending=16):
+        if encoding not in ("png", "raw"):
+            raise ValueError("encoding must be 'png' or 'raw'.")
+        self.output_path = output_path
+        self.encoding = encoding
+        self.written = []
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            frame, name = item
+            if self.error is not None:
+                continue
+            try:
+                path = os.path.join(self.output_path, f"{name}.{self.encoding}")
+                data = encode_png(frame) if self.encoding == "png" else frame.data
+                with open(path, "wb") as file:
+                    file.write(data)
+                self.written.append(path)
+            except Exception as e:
+                self.error = e
+
+    def write(self, frame: Frame, name: str):
+        """Queue a frame to be written as `<output_path>/<name>.<encoding>`."""
+        if self.error is not None:
+            raise self.error
+        self._queue.put((frame, name))
+
+    def close(self) -> list:
+        """Wait for pending frames and return the written paths."""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.written
+
+
 class MediaManager(ADBBase):
+    def __init__(self, *args, index_dir=None, **kwargs):
+        """
+        :param index_dir: Directory where the remote indexes used by
+            `walk_files(incremental=True)` are saved between runs.
+        """
+        super().__init__(*args, **kwargs)
+        self.index_dir = index_dir
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
     def _prepare_command(self, command, device=None):
         """Helper method to prepend device flag if provided."""
         if device:
@@ -25,15 +115,22 @@ class MediaManager(ADBBase):
     def take_screenshot(
         self, output_path, device=None, tmp_path="/sdcard/screenshot.png"
     ):
-        command = self._prepare_command(f"shell screencap -p {tmp_path}", device)
+        """
+        Capture a PNG screenshot and save it locally.
+
+        The image is streamed over `exec-out`, so nothing is written on the device;
+        `tmp_path` is kept for backward compatibility and no longer used.
+        """
+        command = self._prepare_command("exec-out screencap -p", device)
 
         try:
-            self.run_command(command)
-            pull_command = self._prepare_command(
-                f"pull {tmp_path} {output_path}", device
-            )
-            self.run_command(pull_command)
-            self.run_command(self._prepare_command(f"shell rm {tmp_path}", device))
+            result = self.run_command(command)
+            if result.returncode != 0:
+                raise RuntimeError(
+                    f"ADB command failed: {result.stderr.decode(ENCODING)}"
+                )
+            with open(output_path, "wb") as file:
+                file.write(result.stdout)
             return {
                 "status": "success",
                 "message": f"Screenshot saved to {output_path}",
@@ -41,29 +138,136 @@ class MediaManager(ADBBase):
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def capture_frame(self, device=None) -> Frame:
+        """
+        Capture one raw frame (no PNG encoding on the device) into memory.
+
+        :param device: The specific device ID to use for the adb command.
+        :return: A Frame whose pixel data is a memoryview over the received bytes.
+        """
+        timestamp = time.time()
+        result = self.run_command(self._prepare_command("exec-out screencap", device))
+        if result.returncode != 0:
+            raise RuntimeError(f"ADB command failed: {result.stderr.decode(ENCODING)}")
+        return parse_screencap(result.stdout, timestamp)
+
+    def stream_screenshots(self, device=None, count=None, interval=0, prefetch=2):
+        """
+        Yield raw frames continuously.
+
+        Up to `prefetch` captures are kept in flight so the next frame is already
+        being transferred while the caller processes the current one.
+
+        :param device: The specific device ID to use for the adb command.
+        :param count: Number of frames to yield, or None for an endless stream.
+        :param interval: Minimum delay in seconds between the start of two captures.
+        :param prefetch: Number of concurrent captures.
+        :return: A generator of Frame objects, in capture order.
+        """
+        in_flight = deque()
+        submitted = 0
+        next_start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            try:
+                while True:
+                    more = count is None or submitted < count
+                    while more and len(in_flight) < prefetch:
+                        if time.monotonic() < next_start:
+                            break
+                        in_flight.append(executor.submit(self.capture_frame, device))
+                        submitted += 1
+                        next_start = max(next_start + interval, time.monotonic())
+                        more = count is None or submitted < count
+                    if not in_flight:
+                        if not more:
+                            return
+                        time.sleep(max(0, next_start - time.monotonic()))
+                        continue
+                    yield in_flight.popleft().result()
+            finally:
+                for future in in_flight:
+                    future.cancel()
+
+    def watch_screen(
+        self, device=None, count=None, interval=0, tile=64, tolerance=0, ignore=()
+    ):
+        """
+        Yield a FrameChange for every changed frame of a screenshot stream.
+
+        Frames identical to the previous one (within `tolerance`, outside the
+        `ignore` boxes) are dropped; the first frame is always yielded.
+
+        :param count: Number of frames to capture, or None for an endless stream.
+        :param tile: Tile size in pixels of the change detection.
+        :param tolerance: See FrameDiffer; above 0 it needs numpy.
+        :param ignore: (x1, y1, x2, y2) boxes to ignore, e.g. the status bar clock.
+        :return: A generator of FrameChange(frame, duplicate, regions, changed_ratio).
+        """
+        differ = FrameDiffer(tile=tile, tolerance=tolerance, ignore=ignore)
+        for frame in self.stream_screenshots(device, count=count, interval=interval):
+            change = differ.update(frame)
+            if not change.duplicate:
+                yield change
+
     def take_screenshots(
-        self, output_path, device=None, num_screenshots=7, interval=0.05
+        self,
+        output_path,
+        device=None,
+        num_screenshots=7,
+        interval=0.05,
+        encoding="png",
+        dedupe=False,
     ):
-        """Capture multiple screenshots and store them locally using exec-out."""
-        try:
-            for i in range(num_screenshots):
-                screenshot_path = f"{output_path}/screenshot_{i + 1}.png"
+        """
+        Capture multiple screenshots and store them locally.
+
+        Frames are streamed raw and encoded/written on a background thread.
 
-                command = self._prepare_command(
-                    f"exec-out screencap -p > {screenshot_path}", device
+        :param encoding: "png" to write PNG files or "raw" to write bare pixel data.
+        :param dedupe: Skip frames identical to the previous one before they are
+            encoded or written.
+        """
+        try:
+            writer = FrameWriter(output_path, encoding=encoding)
+            differ = FrameDiffer() if dedupe else None
+            written = 0
+            try:
+                frames = self.stream_screenshots(
+                    device, count=num_screenshots, interval=interval
                 )
+                for i, frame in enumerate(frames):
+                    if differ is not None and differ.update(frame).duplicate:
+                        continue
+                    writer.write(frame, f"screenshot_{i + 1}")
+                    written += 1
+            finally:
+                writer.close()
+            message = f"{written} screenshots saved to {output_path}"
+            if written < num_screenshots:
+                message += f" ({num_screenshots - written} duplicates skipped)"
+            return {"status": "success", "message": message}
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
 
-                result = self.run_command(command)
-                if result.returncode != 0:
-                    raise RuntimeError(
-                        f"ADB command failed: {result.stderr.decode(ENCODING)}"
-                    )
+    def locate_on_screen(self, template, device=None, threshold=0.9, region=None):
+        """
+        Capture the screen and find `template` on it (needs numpy).
 
-                print(f"Screenshot saved to {screenshot_path}")
-                time.sleep(interval)
+        :param template: A Frame (e.g. a crop of an earlier capture) or an array.
+        :param threshold: Minimum normalized correlation, 1.0 being a perfect match.
+        :param region: Only search this (x1, y1, x2, y2) box of the screen.
+        :return: A dictionary with status and, when found, the match bounds,
+            center and score.
+        """
+        try:
+            match = locate(self.capture_frame(device), template, threshold, region)
+            if match is None:
+                return {"status": "error", "message": "Template not found on screen."}
             return {
                 "status": "success",
-                "message": f"{num_screenshots} screenshots saved to {output_path}",
+                "bounds": match.bounds,
+                "center": match.center,
+                "score": match.score,
             }
         except Exception as e:
             return {"status": "error", "message": str(e)}
@@ -73,8 +277,49 @@ class MediaManager(ADBBase):
         output_path,
         duration=10,
         device=None,
-        tmp_path="/sdcard/screen_record.mp4",
+        tmp_path=None,
+        segment_duration=None,
+        **kwargs,
     ):
+        """
+        Record the screen for `duration` seconds.
+
+        Without `segment_duration`, screenrecord writes an MP4 to `tmp_path` on
+        the device (a unique name by default), which is then pulled to
+        `output_path` and removed. With it, the video is streamed into
+        `output_path` as segments instead, see `start_recording` and its
+        `kwargs`; if recording fails midway, the result is an error that still
+        lists the segments saved so far.
+        """
+        if segment_duration is not None:
+            try:
+                recorder = self.start_recording(
+                    output_path,
+                    device=device,
+                    segment_duration=segment_duration,
+                    duration=duration,
+                    **kwargs,
+                )
+                segments = recorder.wait()
+                if recorder.error is not None:
+                    if not segments:
+                        raise recorder.error
+                    # The segments recorded before the failure are kept.
+                    return {
+                        "status": "error",
+                        "message": f"Recording stopped early: {recorder.error}; "
+                        f"{len(segments)} segments saved to {output_path}",
+                        "segments": segments,
+                    }
+                return {
+                    "status": "success",
+                    "message": f"{len(segments)} segments saved to {output_path}",
+                    "segments": segments,
+                }
+            except Exception as e:
+                return {"status": "error", "message": str(e)}
+
+        tmp_path = tmp_path or f"/sdcard/screen_record_{uuid.uuid4().hex}.mp4"
         command = self._prepare_command(
             f"shell screenrecord --time-limit {duration} {tmp_path}", device
         )
@@ -89,17 +334,175 @@ class MediaManager(ADBBase):
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def list_media_files(self, remote_directory="/", device=None):
-        command = self._prepare_command(f"shell ls {remote_directory}", device)
+    def start_recording(
+        self,
+        output_path,
+        device=None,
+        segment_duration=60.0,
+        duration=None,
+        size=None,
+        bit_rate=None,
+        **kwargs,
+    ) -> SegmentedRecorder:
+        """
+        Start streaming the screen into rolling H.264 segment files.
+
+        :param output_path: Directory of the segments (segment_00001.h264, ...).
+        :param segment_duration: Approximate length of a segment in seconds;
+            segments are cut on keyframes.
+        :param duration: Stop after this many seconds, or None to record until
+            the recorder's `stop()`.
+        :param size: "WIDTHxHEIGHT" to scale the video, as screenrecord's --size.
+        :param bit_rate: Bit rate in bits per second, as screenrecord's --bit-rate.
+        :param kwargs: max_segments, prefix, on_segment or maxsize, see
+            SegmentedRecorder.
+        :return: The started SegmentedRecorder.
+        """
+        options = ""
+        if size:
+            options += f" --size {size}"
+        if bit_rate:
+            options += f" --bit-rate={bit_rate}"
+
+        def command(time_limit):
+            return self._prepare_command(
+                f"exec-out screenrecord --output-format=h264{options} "
+                f"--time-limit {time_limit} -",
+                device,
+            )
+
+        stream = H264Stream(self, command)
+        return SegmentedRecorder(
+            stream, output_path, segment_duration, duration, **kwargs
+        ).start()
+
+    def record_many(self, output_path, devices, duration=60, **kwargs) -> dict:
+        """
+        Record several devices at once, each into `<output_path>/<serial>`.
+
+        Every recording streams on its own threads, so the devices are
+        recorded in parallel with memory bounded per device.
+
+        :param kwargs: See `start_recording`.
+        :return: A map of serial to {"status", "segments" or "message"}.
+        """
+        recorders = {}
+        for serial in devices:
+            try:
+                recorders[serial] = self.start_recording(
+                    os.path.join(output_path, serial),
+                    device=serial,
+                    duration=duration,
+                    **kwargs,
+                )
+            except Exception as e:
+                recorders[serial] = e
+        results = {}
+        for serial, recorder in recorders.items():
+            if isinstance(recorder, Exception):
+                results[serial] = {"status": "error", "message": str(recorder)}
+                continue
+            segments = recorder.wait()
+            if recorder.error is not None and not segments:
+                results[serial] = {"status": "error", "message": str(recorder.error)}
+            else:
+                results[serial] = {"status": "success", "segments": segments}
+        return results
+
+    def list_media_files(
+        self, remote_directory="/", device=None, recursive=False, **filters
+    ):
+        """
+        List a remote directory.
+
+        By default this returns the names printed by `ls`. With `recursive=True`
+        the whole tree is listed over the sync protocol instead, and "files"
+        holds a dict (path, mode, size, mtime) per file; see `walk_files` for
+        the `filters`.
+        """
         try:
+            if recursive:
+                files = self.walk_files(remote_directory, device, **filters)
+                return {"status": "success", "files": [f._asdict() for f in files]}
+            command = self._prepare_command(f"shell ls {remote_directory}", device)
             result = self.run_command(command)
-            if result.returncode == 0:
-                stdout = result.stdout.decode(ENCODING)
-                lines = stdout.splitlines()
+            if result.returncode != 0:
+                return {"status": "error", "message": result.stderr.decode(ENCODING)}
+            lines = result.stdout.decode(ENCODING).splitlines()
             return {"status": "success", "files": lines}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    def walk_files(
+        self, remote_directory="/sdcard", device=None, incremental=False, **filters
+    ):
+        """
+        Yield a RemoteFile (path, mode, size, mtime) for every file under a
+        remote directory, listed over the sync protocol.
+
+        Without a transport, or when the adb server refuses the connection,
+        the tree is listed with one `find` on the device instead; the index
+        is not used then.
+
+        :param incremental: Reuse the device's RemoteIndex, so only directories
+            that changed since the previous scan are listed again.
+        :param filters: pattern, extensions, newer_than, older_than, exclude,
+            include_dirs, max_depth (and refresh when incremental); see
+            remote_index.walk and make_filter.
+        """
+        if self.transport:
+            command = self._prepare_command(f"walk {remote_directory}", device)
+            try:
+                with self._bounded(command):
+                    connection = SyncConnection(self.transport, device)
+                    with connection:
+                        if not incremental:
+                            yield from walk(connection, remote_directory, **filters)
+                            return
+                        index = self.remote_index(device)
+                        yield from index.scan(connection, remote_directory, **filters)
+            except ConnectionRefusedError:
+                # Only opening the connection can be refused.
+                pass
+            else:
+                if index.path is not None:
+                    index.save()
+                return
+        filters.pop("refresh", None)
+        yield from self._find_files(remote_directory, device, **filters)
+
+    def _find_files(self, remote_directory, device=None, max_depth=None, **filters):
+        """List a remote tree with the device's `find`, see remote_index.find_script."""
+        script = find_script(remote_directory, max_depth)
+        result = self.run_command(
+            self._prepare_command(f"shell {shlex.quote(script)}", device)
+        )
+        output = result.stdout.decode(ENCODING, "replace")
+        if result.returncode != 0 and not output.strip():
+            message = result.stderr.decode(ENCODING, "replace").strip()
+            if "No such file" in message:
+                raise FileNotFoundError(
+                    f"{remote_directory} does not exist on the device."
+                )
+            raise RuntimeError(message or f"find exited with {result.returncode}.")
+        yield from parse_find(output, remote_directory, **filters)
+
+    def remote_index(self, device=None) -> RemoteIndex:
+        """
+        The RemoteIndex of a device, kept for the lifetime of the manager and
+        persisted in `index_dir` when one was given.
+        """
+        with self._index_lock:
+            index = self._indexes.get(device)
+            if index is None:
+                path = None
+                if self.index_dir is not None:
+                    os.makedirs(self.index_dir, exist_ok=True)
+                    name = f"{device or 'default'}.json".replace(":", "_")
+                    path = os.path.join(self.index_dir, name)
+                index = self._indexes[device] = RemoteIndex(device, path)
+            return index
+
     def remove_file(self, remote_file_path, folder=False, device=None):
         """
         Remove a specific file or folder on the Android device.
@@ -109,19 +512,10 @@ class MediaManager(ADBBase):
         :param device: The specific device ID to use for the adb command.
         :return: A dictionary with status and message.
         """
-        try:
-            if folder:
-                remove_command = self._prepare_command(
-                    f"shell rm -rf {remote_file_path}", device
-                )
-            else:
-                remove_command = self._prepare_command(
-                    f"shell rm {remote_file_path}", device
-                )
-            self.run_command(remove_command)
-            return {
-                "status": "success",
-                "message": f"File or folder {remote_file_path} removed.",
-            }
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        result = self.remove_files([remote_file_path], device=device, recursive=folder)
+        if result["status"] == "error":
+            return {"status": "error", "message": result["message"]}
+        return {
+            "status": "success",
+            "message": f"File or folder {remote_file_path} removed.",
+        }
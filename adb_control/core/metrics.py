@@ -0,0 +1,321 @@
+"""
+Latency, traffic and error metrics for ADB commands.
+
+Every command run through ADBBase / AsyncADBBase (and every batch pipelined
+onto a ShellSession, stream read through a CommandStream and request made on
+a SyncConnection) is recorded under a (command, device) series. The command
+label is the adb verb, plus the program for `shell` and `exec-out` (e.g.
+"shell input", "exec-out screencap") or the request for sync (e.g. "sync
+list"), so the number of series stays bounded. Each series keeps:
+
+    count, errors            commands run and commands that failed
+    in_flight                commands running right now
+    bytes_in, bytes_out      output received and command bytes sent
+    latency                  a histogram of durations in seconds
+
+Recording is off by default and costs one attribute check per command until
+`metrics.enable()` is called. Exporters:
+
+    metrics.snapshot()       a dict with quantile estimates per series
+    metrics.prometheus()     the Prometheus text exposition format
+    metrics.add_hook(fn)     fn(event) for every finished command, e.g.
+                             metrics.add_hook(logging_hook())
+"""
+
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+
+def command_label(command: str):
+    """Split a raw adb command line into its (label, device)."""
+    tokens = command.split()
+    device = None
+    if len(tokens) >= 2 and tokens[0] == "-s":
+        device, tokens = tokens[1], tokens[2:]
+    if not tokens:
+        return "", device
+    verb = tokens[0]
+    if verb in ("shell", "exec-out") and len(tokens) > 1:
+        program = tokens[1].strip("'\"{ ").rsplit("/", 1)[-1]
+        return f"{verb} {program}", device
+    return verb, device
+
+
+class Histogram:
+    """A fixed-bucket histogram, cumulative on export like Prometheus'."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class _Series:
+    __slots__ = ("count", "errors", "in_flight", "bytes_in", "bytes_out", "latency")
+
+    def __init__(self, buckets):
+        self.count = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram(buckets)
+
+
+class Measurement:
+    """One command being measured; `finish` records it."""
+
+    __slots__ = (
+        "metrics",
+        "command",
+        "label",
+        "device",
+        "started",
+        "bytes_in",
+        "bytes_out",
+    )
+
+    def __init__(self, metrics, command, label, device):
+        self.metrics = metrics
+        self.command = command
+        self.label = label
+        self.device = device
+        self.started = time.perf_counter()
+        self.bytes_in = 0
+        self.bytes_out = len(command)
+
+    def add_bytes(self, size):
+        self.bytes_in += size
+
+    def add_sent(self, size):
+        """Count bytes sent besides the command itself, e.g. a pushed file."""
+        self.bytes_out += size
+
+    def finish(self, result=None, error=None):
+        """
+        Record the command. `result` is its CompletedProcess (a non-zero return
+        code counts as an error), or a list of them for a pipelined batch.
+        """
+        failed = error is not None
+        for completed in result if isinstance(result, list) else [result]:
+            if completed is not None:
+                self.bytes_in += len(completed.stdout or b"") + len(
+                    completed.stderr or b""
+                )
+                failed = failed or completed.returncode != 0
+        self.metrics._record(self, time.perf_counter() - self.started, failed, error)
+
+
+class Metrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=False):
+        self.buckets = buckets
+        self.enabled = enabled
+        self._series = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Clear the recorded series, keeping the count of running commands."""
+        with self._lock:
+            running = {k: v.in_flight for k, v in self._series.items() if v.in_flight}
+            self._series.clear()
+            for key, in_flight in running.items():
+                self._get(*key).in_flight = in_flight
+
+    def add_hook(self, hook):
+        """Call `hook(event)` with a dict describing every finished command."""
+        self._hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self._hooks.remove(hook)
+
+    def _get(self, label, device) -> _Series:
+        series = self._series.get((label, device))
+        if series is None:
+            series = self._series[(label, device)] = _Series(self.buckets)
+        return series
+
+    def start(self, command, label=None, device=None) -> Measurement:
+        """Start measuring a command; the label defaults to `command_label`."""
+        if label is None:
+            label, parsed = command_label(command)
+            device = device or parsed
+        with self._lock:
+            self._get(label, device).in_flight += 1
+        return Measurement(self, command, label, device)
+
+    def _record(self, measurement, elapsed, failed, error):
+        bytes_out = measurement.bytes_out
+        with self._lock:
+            series = self._get(measurement.label, measurement.device)
+            series.in_flight -= 1
+            series.count += 1
+            series.errors += failed
+            series.bytes_in += measurement.bytes_in
+            series.bytes_out += bytes_out
+            series.latency.observe(elapsed)
+        if not self._hooks:
+            return
+        event = {
+            "command": measurement.command,
+            "label": measurement.label,
+            "device": measurement.device,
+            "elapsed": elapsed,
+            "status": "error" if failed else "success",
+            "error": None if error is None else str(error),
+            "bytes_in": measurement.bytes_in,
+            "bytes_out": bytes_out,
+        }
+        for hook in list(self._hooks):
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("Metrics hook %r failed.", hook)
+
+    def snapshot(self) -> dict:
+        """
+        Return {(label, device): {...}} with count, errors, error_rate,
+        in_flight, bytes_in, bytes_out and latency (sum, mean, p50, p90, p99).
+        """
+        with self._lock:
+            snapshot = {}
+            for key, series in self._series.items():
+                latency = series.latency
+                snapshot[key] = {
+                    "count": series.count,
+                    "errors": series.errors,
+                    "error_rate": series.errors / series.count if series.count else 0.0,
+                    "in_flight": series.in_flight,
+                    "bytes_in": series.bytes_in,
+                    "bytes_out": series.bytes_out,
+                    "latency": {
+                        "sum": latency.sum,
+                        "mean": latency.sum / latency.count if latency.count else None,
+                        "p50": latency.quantile(0.5),
+                        "p90": latency.quantile(0.9),
+                        "p99": latency.quantile(0.99),
+                    },
+                }
+            return snapshot
+
+    def prometheus(self, prefix="adb_control") -> str:
+        """Render the metrics in the Prometheus text exposition format."""
+        families = {
+            "commands_total": ("counter", "ADB commands run."),
+            "command_errors_total": ("counter", "ADB commands that failed."),
+            "commands_in_flight": ("gauge", "ADB commands running."),
+            "received_bytes_total": ("counter", "Bytes of command output."),
+            "sent_bytes_total": ("counter", "Bytes of commands sent."),
+        }
+        with self._lock:
+            items = sorted(self._series.items(), key=lambda item: str(item[0]))
+            rows = {name: [] for name in families}
+            histogram = []
+            for (label, device), series in items:
+                labels = f'command="{_escape(label)}",device="{_escape(device or "")}"'
+                rows["commands_total"].append((labels, series.count))
+                rows["command_errors_total"].append((labels, series.errors))
+                rows["commands_in_flight"].append((labels, series.in_flight))
+                rows["received_bytes_total"].append((labels, series.bytes_in))
+                rows["sent_bytes_total"].append((labels, series.bytes_out))
+                cumulative = 0
+                for bound, count in zip(
+                    list(self.buckets) + ["+Inf"], series.latency.counts
+                ):
+                    cumulative += count
+                    histogram.append(f'_bucket{{{labels},le="{bound}"}} {cumulative}')
+                histogram.append(f"_sum{{{labels}}} {series.latency.sum}")
+                histogram.append(f"_count{{{labels}}} {series.latency.count}")
+        lines = []
+        for name, (kind, description) in families.items():
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            lines.extend(
+                f"{prefix}_{name}{{{key}}} {value}" for key, value in rows[name]
+            )
+        name = f"{prefix}_command_duration_seconds"
+        lines.append(f"# HELP {name} Duration of ADB commands.")
+        lines.append(f"# TYPE {name} histogram")
+        lines.extend(name + line for line in histogram)
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def logging_hook(logger=None, level=logging.DEBUG, slow=None):
+    """
+    Return a hook logging each command as a structured record: the event
+    dict is passed as `extra={"adb": event}`.
+
+    :param slow: Only log commands slower than this many seconds, and errors.
+    """
+    logger = logger or logging.getLogger("adb_control.commands")
+
+    def hook(event):
+        if slow is not None and event["elapsed"] < slow and event["status"] != "error":
+            return
+        logger.log(
+            logging.WARNING if event["status"] == "error" else level,
+            "%s %s on %s in %.3fs",
+            event["label"],
+            event["status"],
+            event["device"] or "default device",
+            event["elapsed"],
+            extra={"adb": event},
+        )
+
+    return hook
+
+
+metrics = Metrics()
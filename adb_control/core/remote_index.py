@@ -0,0 +1,386 @@
+"""
+Recursive listings of remote directories over the ADB sync protocol.
+
+`walk` lists a remote tree with one sync LIST per directory, which returns
+the mode, size and mtime of every entry, so there is no `ls` to parse and no
+per-file round trip. Entries are filtered on the host by glob, extension and
+mtime. LIST cannot filter on the device, but `exclude` prunes whole
+directories so they are never listed.
+
+RemoteIndex keeps the listings of a device between scans. A directory's
+mtime changes when an entry is added to, removed from or renamed in it, so
+a directory whose mtime is unchanged is answered from the index. The mtimes
+of such directories' subdirectories are checked with pipelined STATs, one
+round trip per level of the tree, and only the directories that changed are
+listed again. A file rewritten in place under the same name does not change
+its directory's mtime; scan with `refresh=True` to list everything again.
+
+`expand_glob` resolves a remote glob pattern the same way, listing only the
+directories its wildcard parts need; `shell_glob` quotes one for the device
+shell to expand instead, when there is no sync connection.
+
+Without a sync connection, `find_script` lists a tree with the device's
+`find` and `stat`, and `parse_find` filters its output as `walk` would.
+"""
+
+import datetime
+import fnmatch
+import json
+import os
+import posixpath
+import re
+import shlex
+import stat
+import threading
+from typing import NamedTuple
+
+from adb_control.core.sync import RemoteEntry
+
+_MAGIC = re.compile(r"[*?[]")
+
+
+class RemoteFile(NamedTuple):
+    path: str
+    mode: int
+    size: int
+    mtime: int
+
+    @property
+    def name(self) -> str:
+        return posixpath.basename(self.path)
+
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return value
+
+
+def make_filter(pattern=None, extensions=None, newer_than=None, older_than=None):
+    """
+    Build a predicate on (relative path, entry) from the walk filters.
+
+    :param pattern: Glob matched against the name, or against the path
+        relative to the walked directory when it contains a "/".
+    :param extensions: File extensions to keep, e.g. ("jpg", ".mp4"); case-insensitive.
+    :param newer_than: Keep entries modified at or after this time (epoch
+        seconds or a datetime).
+    :param older_than: Keep entries modified before this time.
+    """
+    if extensions is not None:
+        extensions = tuple(
+            "." + extension.lower().lstrip(".") for extension in extensions
+        )
+    newer_than, older_than = _timestamp(newer_than), _timestamp(older_than)
+
+    def matches(relative, entry) -> bool:
+        if pattern is not None:
+            target = relative if "/" in pattern else entry.name
+            if not fnmatch.fnmatchcase(target, pattern):
+                return False
+        if extensions is not None and not entry.name.lower().endswith(extensions):
+            return False
+        if newer_than is not None and entry.mtime < newer_than:
+            return False
+        if older_than is not None and entry.mtime >= older_than:
+            return False
+        return True
+
+    return matches
+
+
+def find_script(root, max_depth=None) -> str:
+    """
+    A device shell command listing `root` without the sync protocol: `find`
+    and `stat`, printing the raw mode (hex), size, mtime and path of every
+    entry, one per line.
+    """
+    depth = "" if max_depth is None else f" -maxdepth {max_depth + 1}"
+    return f"find {shlex.quote(root)}{depth} -exec stat -c '%f %s %Y %n' {{}} +"
+
+
+def parse_find(output, root, exclude=(), include_dirs=False, **filters):
+    """
+    Yield a RemoteFile for every entry of a `find_script` listing that `walk`
+    would yield, in path order. Lines that are not entries (e.g. `find`
+    errors on unreadable directories) are skipped.
+    """
+    matches = make_filter(**filters)
+    top = root.rstrip("/")
+    for line in sorted(output.splitlines()):
+        fields = line.split(" ", 3)
+        try:
+            mode, size, mtime = int(fields[0], 16), int(fields[1]), int(fields[2])
+            path = fields[3]
+        except (ValueError, IndexError):
+            continue
+        entry = RemoteEntry(posixpath.basename(path), mode, size, mtime)
+        if path.rstrip("/") == top:
+            # `root` itself, listed only when it is a file.
+            if not entry.is_dir and matches(entry.name, entry):
+                yield RemoteFile(path, mode, size, mtime)
+            continue
+        relative = _relative(root, path)
+        parts = relative.split("/")
+        if any(
+            _excluded("/".join(parts[:depth]), parts[depth - 1], exclude)
+            for depth in range(1, len(parts))
+        ):
+            continue
+        if entry.is_dir and (
+            not include_dirs or _excluded(relative, entry.name, exclude)
+        ):
+            continue
+        if matches(relative, entry):
+            yield RemoteFile(path, mode, size, mtime)
+
+
+def has_magic(path) -> bool:
+    """Whether a path contains glob wildcards."""
+    return _MAGIC.search(path) is not None
+
+
+def shell_glob(pattern) -> str:
+    """
+    Quote a glob pattern for the device shell, leaving its wildcards (and
+    `[...]` sets) bare so that the shell expands them.
+    """
+    parts = re.split(r"(\*|\?|\[[^]]+\])", pattern)
+    return "".join(
+        part if index % 2 else shlex.quote(part) if part else ""
+        for index, part in enumerate(parts)
+    )
+
+
+def expand_glob(connection, pattern) -> list:
+    """
+    The remote paths matching a glob, sorted. Any "/"-separated part may use
+    `*`, `?` or `[...]`; as in the shell, wildcards do not match names
+    starting with "." unless the part itself does. Relative patterns are
+    taken from "/".
+    """
+    parts = [part for part in pattern.split("/") if part]
+    candidates = ["/"]
+    for index, part in enumerate(parts):
+        if not has_magic(part):
+            candidates = [posixpath.join(path, part) for path in candidates]
+            continue
+        last = index == len(parts) - 1
+        matched = []
+        for directory in candidates:
+            for entry in sorted(connection.list(directory)):
+                if entry.name.startswith(".") and not part.startswith("."):
+                    continue
+                if (last or entry.is_dir) and fnmatch.fnmatchcase(entry.name, part):
+                    matched.append(posixpath.join(directory, entry.name))
+        candidates = matched
+    if parts and not has_magic(parts[-1]):
+        stats = connection.stat_many(candidates)
+        candidates = [path for path, info in zip(candidates, stats) if info.exists]
+    return sorted(candidates)
+
+
+def _excluded(relative, name, exclude) -> bool:
+    return any(
+        fnmatch.fnmatchcase(relative if "/" in glob else name, glob) for glob in exclude
+    )
+
+
+def _relative(root, path) -> str:
+    return path[len(root.rstrip("/")) + 1 :]
+
+
+def walk(
+    connection,
+    root,
+    exclude=(),
+    include_dirs=False,
+    max_depth=None,
+    **filters,
+):
+    """
+    Yield a RemoteFile for every file under `root`, depth first.
+
+    :param connection: An open SyncConnection; it must not be used by anything
+        else until the walk is finished.
+    :param exclude: Globs of directories not to descend into (names, or
+        relative paths when they contain a "/").
+    :param include_dirs: Also yield the directories that pass the filters.
+    :param max_depth: Do not descend more than this many levels below `root`.
+    :param filters: pattern, extensions, newer_than, older_than; see make_filter.
+    """
+    info = connection.stat(root)
+    if not info.exists:
+        raise FileNotFoundError(f"{root} does not exist on the device.")
+    matches = make_filter(**filters)
+    if not info.is_dir:
+        name = posixpath.basename(root)
+        if matches(name, RemoteEntry(name, *info)):
+            yield RemoteFile(root, *info)
+        return
+    directories = [(root, 0)]
+    while directories:
+        directory, depth = directories.pop()
+        # Read the whole listing first, so the caller runs between requests.
+        entries = sorted(connection.list(directory))
+        subdirectories = []
+        for entry in entries:
+            path = posixpath.join(directory, entry.name)
+            relative = _relative(root, path)
+            if entry.is_dir:
+                if _excluded(relative, entry.name, exclude):
+                    continue
+                if max_depth is None or depth < max_depth:
+                    subdirectories.append((path, depth + 1))
+                if not include_dirs:
+                    continue
+            if matches(relative, entry):
+                yield RemoteFile(path, entry.mode, entry.size, entry.mtime)
+        directories.extend(reversed(subdirectories))
+
+
+class RemoteIndex:
+    """
+    The remote directory listings of one device, reused between scans.
+
+        index = RemoteIndex("emulator-5554", path="emulator-5554.json")
+        with SyncConnection(transport, "emulator-5554") as connection:
+            photos = list(index.scan(connection, "/sdcard/DCIM", extensions=["jpg"]))
+        index.save()
+
+    After a scan, `listed` counts the directories that had to be listed and
+    `reused` the ones answered from the index.
+    """
+
+    def __init__(self, device=None, path=None):
+        """
+        :param device: Serial of the device the index describes.
+        :param path: JSON file the index is loaded from, if it exists, and saved to.
+        """
+        self.device = device
+        self.path = path
+        # directory -> (mtime, [(name, mode, size, mtime), ...])
+        self.directories = {}
+        self.listed = 0
+        self.reused = 0
+        # Scans of one index run one at a time, whichever thread starts them.
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def _entries(self, connection, directory, mtime, refresh):
+        cached = self.directories.get(directory)
+        if not refresh and cached is not None and cached[0] == mtime:
+            self.reused += 1
+            return [RemoteEntry(*entry) for entry in cached[1]], False
+        entries = sorted(connection.list(directory))
+        self.directories[directory] = (mtime, [tuple(entry) for entry in entries])
+        self.listed += 1
+        return entries, True
+
+    def scan(
+        self,
+        connection,
+        root,
+        exclude=(),
+        include_dirs=False,
+        max_depth=None,
+        refresh=False,
+        **filters,
+    ):
+        """
+        Yield a RemoteFile for every file under `root`, like `walk`, listing
+        only the directories that changed since the last scan. The order is
+        breadth first.
+
+        :param refresh: List every directory again, ignoring the index.
+        """
+        with self._lock:
+            yield from self._scan(
+                connection, root, exclude, include_dirs, max_depth, refresh, **filters
+            )
+
+    def _scan(
+        self, connection, root, exclude, include_dirs, max_depth, refresh, **filters
+    ):
+        self.listed = self.reused = 0
+        info = connection.stat(root)
+        if not info.exists:
+            self.forget(root)
+            raise FileNotFoundError(f"{root} does not exist on the device.")
+        if not info.is_dir:
+            yield from walk(connection, root, **filters)
+            return
+        matches = make_filter(**filters)
+        seen = set()
+        level = [(root, info.mtime)]
+        depth = 0
+        while level:
+            fresh, unknown = [], []
+            for directory, mtime in level:
+                seen.add(directory)
+                entries, listed = self._entries(connection, directory, mtime, refresh)
+                for entry in entries:
+                    path = posixpath.join(directory, entry.name)
+                    relative = _relative(root, path)
+                    if entry.is_dir:
+                        if _excluded(relative, entry.name, exclude):
+                            continue
+                        if max_depth is None or depth < max_depth:
+                            # A listing from the index has stale subdirectory mtimes.
+                            if listed:
+                                fresh.append((path, entry.mtime))
+                            else:
+                                unknown.append(path)
+                        if not include_dirs:
+                            continue
+                    if matches(relative, entry):
+                        yield RemoteFile(path, entry.mode, entry.size, entry.mtime)
+            stats = connection.stat_many(unknown)
+            level = fresh + [
+                (path, info.mtime) for path, info in zip(unknown, stats) if info.is_dir
+            ]
+            depth += 1
+        # Forget the directories that are gone (or were not reached this time).
+        prefix = root.rstrip("/") + "/"
+        for directory in list(self.directories):
+            if directory.startswith(prefix) and directory not in seen:
+                del self.directories[directory]
+
+    def forget(self, root):
+        """Drop `root` and everything below it from the index."""
+        prefix = root.rstrip("/") + "/"
+        for directory in list(self.directories):
+            if directory == root or directory.startswith(prefix):
+                del self.directories[directory]
+
+    def save(self, path=None):
+        """Write the index as JSON to `path` (default: the index's own path)."""
+        path = path or self.path
+        with self._lock:
+            directories = dict(self.directories)
+        data = {
+            "device": self.device,
+            "directories": {
+                directory: [mtime, entries]
+                for directory, (mtime, entries) in directories.items()
+            },
+        }
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        with open(path) as file:
+            data = json.load(file)
+        self.device = data.get("device", self.device)
+        self.directories = {
+            directory: (mtime, [tuple(entry) for entry in entries])
+            for directory, (mtime, entries) in data["directories"].items()
+        }
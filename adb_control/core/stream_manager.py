@@ -1,6 +1,442 @@
+"""
+Screen mirroring for Android devices.
+
+`start_mirroring` pipes `screenrecord` into an ffmpeg window. `h264_stream`
+instead reads the raw H.264 elementary stream in-process: it is split into
+NAL units and access units and shared with any number of subscribers
+(recorder, live viewer, analyzer) through bounded per-consumer queues.
+SegmentedRecorder is such a subscriber: it writes the stream to rolling
+files, each starting on a keyframe.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
 from adb_control.core.base import ADBBase
+from adb_control.core.utils.h264 import (
+    CONFIG_TYPES,
+    NAL_SPS,
+    START_CODE_4,
+    AccessUnit,
+    AccessUnitAssembler,
+    NALUnitParser,
+    nal_type,
+)
 from adb_control.core.utils.params import ADB_PATH
 
+logger = logging.getLogger(__name__)
+
+
+def stream_config(unit: AccessUnit) -> bytes:
+    """The SPS/PPS NAL units of an access unit, in Annex-B form."""
+    return b"".join(
+        START_CODE_4 + nal
+        for nal in unit.data.split(START_CODE_4)[1:]
+        if nal_type(nal) in CONFIG_TYPES
+    )
+
+
+class StreamSubscription:
+    """
+    An iterator over the access units of an H264Stream.
+
+    Each subscriber has its own bounded queue; when a consumer falls behind,
+    its oldest pending access units are dropped so the others are unaffected.
+    """
+
+    def __init__(self, stream, maxsize=64):
+        self._stream = stream
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._synced = False
+        self.dropped = 0
+
+    def _publish(self, unit: AccessUnit, config: bytes):
+        if not self._synced:
+            # Start on a keyframe, with the stream's SPS/PPS, so it can be decoded.
+            if not unit.keyframe:
+                return
+            if NAL_SPS not in unit.nal_types:
+                unit = unit._replace(data=config + unit.data)
+            self._synced = True
+        while True:
+            try:
+                self._queue.put_nowait(unit)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _end(self):
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> AccessUnit:
+        unit = self._queue.get()
+        if unit is None:
+            raise StopIteration
+        return unit
+
+    def close(self):
+        self._stream._unsubscribe(self)
+        self._end()
+
+
+class H264Stream:
+    """
+    Reads the device's H.264 stream in-process and shares it between consumers.
+
+    `screenrecord` stops after its time limit (3 minutes at most), so the
+    stream starts the next run `overlap` seconds before the current one ends.
+    The output switches to the next run at its opening keyframe, leaving no
+    gap; the rest of the current run is dropped, so no picture is published
+    twice and timestamps never go backwards.
+
+    A run that ends without producing anything is retried after a growing
+    delay; after `max_empty_runs` of them in a row the stream stops and
+    `error` says why.
+    """
+
+    def __init__(
+        self,
+        manager,
+        command,
+        time_limit=180,
+        overlap=2.0,
+        chunk_size=65536,
+        retry_delay=0.5,
+        max_empty_runs=5,
+    ):
+        """
+        :param manager: The ADBBase used to open the device stream.
+        :param command: Callable returning the `exec-out screenrecord` command for a
+            given time limit in seconds.
+        :param time_limit: Duration of each screenrecord run, at most 180 seconds.
+        :param overlap: Seconds before the end of a run to start the next one.
+        :param chunk_size: Size of each read from the device stream.
+        :param retry_delay: Seconds to wait after a first empty run, doubled
+            after each further one.
+        :param max_empty_runs: Empty runs in a row after which the stream stops.
+        """
+        self.manager = manager
+        self.command = command
+        self.time_limit = time_limit
+        self.overlap = min(overlap, time_limit / 2)
+        self.chunk_size = chunk_size
+        self.retry_delay = retry_delay
+        self.max_empty_runs = max_empty_runs
+        self.restarts = 0
+        self.error = None
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._events = queue.Queue()
+        self._streams = {}
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+        self._config = b""
+        self._last_timestamp = 0.0
+        self._dispatcher = None
+
+    def subscribe(self, maxsize=64) -> StreamSubscription:
+        """Add a consumer; it receives access units from the next keyframe on."""
+        subscription = StreamSubscription(self, maxsize)
+        with self._lock:
+            self._subscribers.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def start(self):
+        """Start reading the device stream in the background."""
+        if not self._running.is_set():
+            self._running.set()
+            self._stopped.clear()
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+        return self
+
+    def stop(self):
+        """Stop the device stream and end every subscription."""
+        self._running.clear()
+        self._stopped.set()
+        self._events.put(None)
+        self._close_streams()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+
+    def frames(self, maxsize=64):
+        """Start the stream if needed and iterate over its access units."""
+        subscription = self.subscribe(maxsize)
+        self.start()
+        try:
+            yield from subscription
+        finally:
+            subscription.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _close_streams(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        for stream in streams:
+            stream.close()
+
+    def _read_run(self, run):
+        """Parse one screenrecord run and forward its access units to the dispatcher."""
+        parser = NALUnitParser()
+        assembler = AccessUnitAssembler()
+        produced = 0
+        try:
+            stream = self.manager.open_stream(self.command(self.time_limit))
+            with self._lock:
+                self._streams[run] = stream
+            if not self._running.is_set():
+                return
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                units = [assembler.push(nal) for nal in parser.feed(chunk)]
+                for unit in units:
+                    if unit is not None:
+                        self._events.put((run, unit))
+                        produced += 1
+            units = [assembler.push(nal) for nal in parser.flush()]
+            units.append(assembler.flush())
+            for unit in units:
+                if unit is not None:
+                    self._events.put((run, unit))
+                    produced += 1
+        except Exception as e:
+            if self._running.is_set():
+                self.error = e
+        finally:
+            with self._lock:
+                stream = self._streams.pop(run, None)
+            if stream is not None:
+                stream.close()
+            self._events.put((run, produced))
+
+    def _start_run(self, run):
+        threading.Thread(target=self._read_run, args=(run,), daemon=True).start()
+        return time.monotonic()
+
+    def _publish(self, unit: AccessUnit):
+        if NAL_SPS in unit.nal_types:
+            self._config = stream_config(unit)
+        self._last_timestamp = unit.timestamp
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber._publish(unit, self._config)
+
+    def _dispatch(self):
+        current, started = 0, self._start_run(0)
+        pending, empty = None, 0
+        try:
+            while self._running.is_set():
+                timeout = None
+                if pending is None:
+                    next_start = started + self.time_limit - self.overlap
+                    timeout = max(0, next_start - time.monotonic())
+                try:
+                    event = self._events.get(timeout=timeout)
+                except queue.Empty:
+                    pending, pending_started = current + 1, self._start_run(current + 1)
+                    continue
+                if event is None:
+                    break
+                run, payload = event
+                if isinstance(payload, AccessUnit):
+                    if run == pending and payload.keyframe:
+                        # Hand over to the next run; the rest of this one is dropped.
+                        current, started, pending = pending, pending_started, None
+                        self.restarts += 1
+                        if payload.timestamp <= self._last_timestamp:
+                            payload = payload._replace(timestamp=self._last_timestamp)
+                    if run == current:
+                        self._publish(payload)
+                    continue
+
+                # A run ended; `payload` is the number of access units it produced.
+                if run not in (current, pending):
+                    continue
+                empty = empty + 1 if payload == 0 else 0
+                if run == current and payload == 0 and self.error is not None:
+                    break
+                if empty >= self.max_empty_runs:
+                    self.error = RuntimeError(
+                        f"screenrecord produced no output {empty} times in a row."
+                    )
+                    break
+                if empty and self._stopped.wait(self.retry_delay * 2 ** (empty - 1)):
+                    break
+                if run == pending:
+                    pending = None
+                    continue
+                if pending is None:
+                    pending, pending_started = current + 1, self._start_run(current + 1)
+                current, started, pending = pending, pending_started, None
+                self.restarts += 1
+        finally:
+            self._running.clear()
+            self._close_streams()
+            with self._lock:
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                subscriber._end()
+
+
+class SegmentedRecorder:
+    """
+    Records an H264Stream into rolling files of about `segment_duration` seconds.
+
+    A segment is closed at the first keyframe after its duration, so every
+    file starts on a keyframe preceded by the SPS/PPS and plays on its own
+    (e.g. `ffmpeg -i segment_00001.h264 -c copy segment_00001.mp4`). Access
+    units go straight to disk as they arrive: memory is bounded by the
+    subscription queue, and if the disk falls behind the oldest pending
+    units are dropped (counted in `dropped`).
+
+        recorder = SegmentedRecorder(stream, "recordings", segment_duration=30)
+        recorder.start()
+        ...
+        recorder.stop()  # the paths of the finished segments
+    """
+
+    def __init__(
+        self,
+        stream,
+        output_path,
+        segment_duration=60.0,
+        duration=None,
+        max_segments=None,
+        prefix="segment",
+        on_segment=None,
+        maxsize=256,
+    ):
+        """
+        :param stream: The H264Stream to record; the recorder starts and stops it.
+        :param output_path: Directory of the segment files, created if needed.
+        :param duration: Stop after this many seconds, or None to record until `stop`.
+        :param max_segments: Keep only the newest segments, deleting older ones.
+        :param on_segment: Called with the path of every finished segment,
+            e.g. to upload it while recording continues.
+        :param maxsize: Access units buffered between the stream and the disk.
+        """
+        self.stream = stream
+        self.output_path = output_path
+        self.segment_duration = segment_duration
+        self.duration = duration
+        self.max_segments = max_segments
+        self.prefix = prefix
+        self.on_segment = on_segment
+        self.maxsize = maxsize
+        self.segments = []
+        self.deleted = 0
+        self.error = None
+        self._subscription = None
+        self._thread = None
+        self._timer = None
+
+    @property
+    def dropped(self) -> int:
+        return self._subscription.dropped if self._subscription is not None else 0
+
+    def start(self) -> "SegmentedRecorder":
+        os.makedirs(self.output_path, exist_ok=True)
+        self._subscription = self.stream.subscribe(self.maxsize)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self.stream.start()
+        if self.duration is not None:
+            self._timer = threading.Timer(self.duration, self.stream.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def stop(self) -> list:
+        """Stop recording, close the current segment and return the segments."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self.stream.stop()
+        return self.wait()
+
+    def wait(self, timeout=None) -> list:
+        """Wait for the recording to end (see `duration`) and return the segments."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is None and self.stream.error is not None:
+            self.error = self.stream.error
+        return list(self.segments)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _finish(self, file):
+        file.close()
+        self.segments.append(file.name)
+        if self.on_segment is not None:
+            try:
+                self.on_segment(file.name)
+            except Exception:
+                logger.exception("on_segment failed for %s.", file.name)
+        if self.max_segments is not None:
+            while len(self.segments) > self.max_segments:
+                os.remove(self.segments.pop(0))
+                self.deleted += 1
+
+    def _run(self):
+        file, started, config, index = None, 0.0, b"", 0
+        try:
+            for unit in self._subscription:
+                if NAL_SPS in unit.nal_types:
+                    config = stream_config(unit)
+                if file is None or (
+                    unit.keyframe and unit.timestamp - started >= self.segment_duration
+                ):
+                    if file is not None:
+                        self._finish(file)
+                    index += 1
+                    name = f"{self.prefix}_{index:05d}.h264"
+                    file = open(os.path.join(self.output_path, name), "wb")
+                    started = unit.timestamp
+                    if NAL_SPS not in unit.nal_types:
+                        file.write(config)
+                file.write(unit.data)
+        except Exception as e:
+            self.error = e
+            self.stream.stop()
+        finally:
+            self._subscription.close()
+            if file is not None:
+                self._finish(file)
+
 
 class AndroidScreenMirroring(ADBBase):
     def __init__(
@@ -11,9 +447,11 @@ class AndroidScreenMirroring(ADBBase):
         buffer_size=1024,
         screen_title="Android Screen",
         *args,
+        device=None,
         **kwargs,
     ):
         super().__init__(*args, **kwargs)
+        self.device = device
         self.width = width
         self.adb_path = ADB_PATH
         self.height = height
@@ -32,12 +470,53 @@ class AndroidScreenMirroring(ADBBase):
         except Exception as e:
             print(f"An error occurred: {e}")
 
-    def _build_adb_command(self):
+    def _build_adb_command(self, time_limit=None):
         """Constructs the ADB command for screen recording."""
-        return (
+        command = (
             f"exec-out screenrecord --size {self.width}x{self.height} "
-            f"--bit-rate={self.bit_rate} --output-format=h264 -"
+            f"--bit-rate={self.bit_rate} --output-format=h264"
         )
+        if time_limit:
+            command = f"{command} --time-limit {time_limit}"
+        if self.device:
+            command = f"-s {self.device} {command}"
+        return f"{command} -"
+
+    def h264_stream(self, time_limit=180, overlap=2.0) -> H264Stream:
+        """
+        Create an in-process H.264 stream of the device screen.
+
+        The stream is not started until `start()` (or iteration over `frames()`),
+        so every consumer can subscribe first.
+
+        :param time_limit: Duration of each screenrecord run, at most 180 seconds.
+        :param overlap: Seconds of overlap between consecutive runs.
+        """
+        return H264Stream(
+            self,
+            self._build_adb_command,
+            time_limit=time_limit,
+            overlap=overlap,
+            chunk_size=max(self.buffer_size, 65536),
+        )
+
+    def record(self, output_path, segment_duration=60.0, **kwargs):
+        """
+        Start recording the screen into rolling segment files.
+
+        :return: The started SegmentedRecorder; see its parameters for `kwargs`.
+        """
+        return SegmentedRecorder(
+            self.h264_stream(), output_path, segment_duration, **kwargs
+        ).start()
+
+    def frames(self, maxsize=64):
+        """Iterate over the device's H.264 access units until the caller stops."""
+        stream = self.h264_stream()
+        try:
+            yield from stream.frames(maxsize)
+        finally:
+            stream.stop()
 
     def _build_ffmpeg_command(self):
         """Constructs the FFmpeg command for displaying the screen."""
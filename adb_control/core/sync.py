@@ -0,0 +1,238 @@
+"""
+A client for the ADB file sync protocol (the `sync:` device service).
+
+After switching to sync mode, every request is a 4-byte id followed by a
+little-endian 32-bit length and a payload:
+
+    STAT <path>           -> STAT mode size mtime
+    LIST <path>           -> DENT mode size mtime namelen name ... DONE
+    SEND <path>,<mode>    -> DATA chunks, then DONE <mtime> -> OKAY / FAIL
+    RECV <path>           -> DATA chunks ... DONE, or FAIL
+    QUIT
+
+One SyncConnection can carry any number of requests, so a bulk transfer pays
+for the connection once instead of once per file. Requests can also be
+pipelined: `stat_many` sends a batch of STATs before reading the replies,
+for one round trip per batch.
+
+With `metrics` enabled, every request is recorded as "sync stat", "sync
+list", "sync send" or "sync recv" (a `stat_many` batch as one "sync stat").
+"""
+
+import contextlib
+import os
+import stat
+import struct
+from typing import NamedTuple
+
+from adb_control.core.metrics import metrics
+from adb_control.core.transport import ADBProtocolError
+
+SYNC_DATA_MAX = 64 * 1024
+_HEADER = struct.Struct("<4sI")
+# STAT requests sent ahead of their replies; small enough that neither side's
+# socket buffer fills up while the other is still writing.
+STAT_BATCH = 256
+
+
+class RemoteStat(NamedTuple):
+    mode: int
+    size: int
+    mtime: int
+
+    @property
+    def exists(self) -> bool:
+        return self.mode != 0
+
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+
+
+class RemoteEntry(NamedTuple):
+    name: str
+    mode: int
+    size: int
+    mtime: int
+
+    @property
+    def is_dir(self) -> bool:
+        return stat.S_ISDIR(self.mode)
+
+
+class SyncConnection:
+    def __init__(self, transport, device=None):
+        self.device = device
+        self._sock = transport.open_service("sync:", device)
+        self._recv_exactly = transport._recv_exactly
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @contextlib.contextmanager
+    def _measure(self, request, path):
+        """Record the request in the block when `metrics` is enabled."""
+        if not metrics.enabled:
+            yield None
+            return
+        measurement = metrics.start(
+            f"sync {request} {path}", f"sync {request}", self.device
+        )
+        try:
+            yield measurement
+        except GeneratorExit:
+            # A listing abandoned by its consumer did not fail.
+            measurement.finish()
+            raise
+        except BaseException as e:
+            measurement.finish(error=e)
+            raise
+        measurement.finish()
+
+    def _request(self, kind: bytes, payload: bytes = b""):
+        self._sock.sendall(_HEADER.pack(kind, len(payload)) + payload)
+
+    def _read_header(self):
+        return _HEADER.unpack(self._recv_exactly(self._sock, 8))
+
+    def _fail(self, length):
+        message = self._recv_exactly(self._sock, length).decode("utf-8", "replace")
+        raise ADBProtocolError(message)
+
+    def stat(self, remote_path: str) -> RemoteStat:
+        """Return the mode, size and mtime of a remote path (all zero if missing)."""
+        with self._measure("stat", remote_path) as measurement:
+            self._request(b"STAT", remote_path.encode("utf-8"))
+            kind, mode = self._read_header()
+            if kind != b"STAT":
+                raise ADBProtocolError(f"Unexpected sync reply {kind!r} to STAT.")
+            size, mtime = struct.unpack("<II", self._recv_exactly(self._sock, 8))
+            if measurement is not None:
+                measurement.add_bytes(16)
+            return RemoteStat(mode, size, mtime)
+
+    def stat_many(self, remote_paths) -> list:
+        """Stat several paths, pipelining the requests; see `stat`."""
+        remote_paths = list(remote_paths)
+        results = []
+        if not remote_paths:
+            return results
+        with self._measure("stat", f"{len(remote_paths)} paths") as measurement:
+            for start in range(0, len(remote_paths), STAT_BATCH):
+                batch = remote_paths[start : start + STAT_BATCH]
+                self._sock.sendall(
+                    b"".join(
+                        _HEADER.pack(b"STAT", len(path)) + path
+                        for path in (path.encode("utf-8") for path in batch)
+                    )
+                )
+                for _ in batch:
+                    reply = self._recv_exactly(self._sock, 16)
+                    kind, mode, size, mtime = struct.unpack("<4sIII", reply)
+                    if kind != b"STAT":
+                        raise ADBProtocolError(
+                            f"Unexpected sync reply {kind!r} to STAT."
+                        )
+                    results.append(RemoteStat(mode, size, mtime))
+            if measurement is not None:
+                measurement.add_bytes(16 * len(results))
+        return results
+
+    def list(self, remote_path: str):
+        """Yield the entries of a remote directory, without `.` and `..`."""
+        with self._measure("list", remote_path) as measurement:
+            self._request(b"LIST", remote_path.encode("utf-8"))
+            while True:
+                kind, mode = self._read_header()
+                if kind == b"DONE":
+                    self._recv_exactly(self._sock, 12)
+                    return
+                if kind != b"DENT":
+                    raise ADBProtocolError(f"Unexpected sync reply {kind!r} to LIST.")
+                size, mtime, length = struct.unpack(
+                    "<III", self._recv_exactly(self._sock, 12)
+                )
+                name = self._recv_exactly(self._sock, length)
+                if measurement is not None:
+                    measurement.add_bytes(20 + length)
+                name = name.decode("utf-8", "replace")
+                if name not in (".", ".."):
+                    yield RemoteEntry(name, mode, size, mtime)
+
+    def send(self, local_path: str, remote_path: str, mode=None, mtime=None) -> int:
+        """
+        Push a local file, preserving its permissions and modification time.
+
+        :return: The number of bytes sent.
+        """
+        info = os.stat(local_path)
+        mode = stat.S_IMODE(info.st_mode) if mode is None else mode
+        mtime = int(info.st_mtime) if mtime is None else mtime
+        with self._measure("send", remote_path) as measurement:
+            self._request(
+                b"SEND", f"{remote_path},{mode | stat.S_IFREG}".encode("utf-8")
+            )
+            sent = 0
+            with open(local_path, "rb") as file:
+                while True:
+                    chunk = file.read(SYNC_DATA_MAX)
+                    if not chunk:
+                        break
+                    self._request(b"DATA", chunk)
+                    sent += len(chunk)
+            self._sock.sendall(_HEADER.pack(b"DONE", mtime))
+            kind, length = self._read_header()
+            if kind == b"FAIL":
+                self._fail(length)
+            if kind != b"OKAY":
+                raise ADBProtocolError(f"Unexpected sync reply {kind!r} to SEND.")
+            if measurement is not None:
+                measurement.add_sent(sent)
+        self.bytes_sent += sent
+        return sent
+
+    def recv(self, remote_path: str, local_path: str, mtime=None) -> int:
+        """
+        Pull a remote file; the partial file is removed if the transfer fails.
+
+        :param mtime: Modification time to give the local copy, if any.
+        :return: The number of bytes received.
+        """
+        received = 0
+        with self._measure("recv", remote_path) as measurement:
+            self._request(b"RECV", remote_path.encode("utf-8"))
+            try:
+                with open(local_path, "wb") as file:
+                    while True:
+                        kind, length = self._read_header()
+                        if kind == b"DONE":
+                            break
+                        if kind == b"FAIL":
+                            self._fail(length)
+                        if kind != b"DATA":
+                            raise ADBProtocolError(
+                                f"Unexpected sync reply {kind!r} to RECV."
+                            )
+                        file.write(self._recv_exactly(self._sock, length))
+                        received += length
+            except BaseException:
+                os.remove(local_path)
+                raise
+            if measurement is not None:
+                measurement.add_bytes(received)
+        if mtime is not None:
+            os.utime(local_path, (mtime, mtime))
+        self.bytes_received += received
+        return received
+
+    def close(self):
+        try:
+            self._request(b"QUIT")
+        except OSError:
+            pass
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,294 @@
+"""
+A class to synchronise whole directory trees with Android devices.
+
+Files are transferred with the ADB sync protocol over a few long-lived
+connections per device, several files at a time. Files whose size and
+modification time already match on the other side are skipped, and each
+transfer reports its throughput. Passing several devices runs the same sync
+on all of them concurrently.
+
+Like `run_command`, a sync is bounded by the instance timeout and the current
+`deadline()`, is listed by `in_flight()` and can be cancelled; the workers run
+in the caller's context so all of its connections are.
+
+Attributes:
+    adb_path (str): Path to the ADB executable (default is "adb").
+"""
+
+import contextvars
+import os
+import posixpath
+import queue
+import threading
+import time
+
+from adb_control.core.base import ADBBase
+from adb_control.core.commands import current_command
+from adb_control.core.fleet import DeviceFleet
+from adb_control.core.sync import SyncConnection
+from adb_control.core.transport import ADBProtocolError
+
+
+class SyncManager(ADBBase):
+    def _local_files(self, sources):
+        """Expand a directory or a list of files into (local path, relative path) pairs."""
+        if isinstance(sources, str):
+            sources = [sources]
+        files = []
+        for source in sources:
+            if os.path.isdir(source):
+                for root, _, names in os.walk(source):
+                    for name in sorted(names):
+                        path = os.path.join(root, name)
+                        relative = os.path.relpath(path, source).replace(os.sep, "/")
+                        files.append((path, relative))
+            else:
+                files.append((source, os.path.basename(source)))
+        return files
+
+    def _remote_files(self, connection, remote_path):
+        """Recursively list a remote directory as (remote path, relative path, entry)."""
+        info = connection.stat(remote_path)
+        if not info.exists:
+            raise FileNotFoundError(f"{remote_path} does not exist on the device.")
+        if not info.is_dir:
+            name = posixpath.basename(remote_path)
+            return [(remote_path, name, info)]
+        files, directories = [], [(remote_path, "")]
+        while directories:
+            directory, prefix = directories.pop()
+            for entry in connection.list(directory):
+                path = posixpath.join(directory, entry.name)
+                relative = f"{prefix}{entry.name}"
+                if entry.is_dir:
+                    directories.append((path, relative + "/"))
+                else:
+                    files.append((path, relative, entry))
+        return files
+
+    def _run_workers(self, jobs, transfer, device, workers, connection):
+        """
+        Run `transfer(connection, job)` for every job over `workers` sync connections.
+
+        `connection` is an already open connection handed to the first worker.
+        A timeout or a cancellation stops every worker and is raised here.
+        """
+        spare = [connection]
+        pending = queue.SimpleQueue()
+        for job in jobs:
+            pending.put(job)
+        report = {"transferred": 0, "skipped": 0, "bytes": 0, "errors": {}}
+        lock = threading.Lock()
+        owner = current_command()
+        aborted = []
+
+        def worker():
+            with lock:
+                connection = spare.pop() if spare else None
+            try:
+                while not aborted:
+                    try:
+                        job = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        if connection is None:
+                            connection = SyncConnection(self.transport, device)
+                        size = transfer(connection, job)
+                        with lock:
+                            if size is None:
+                                report["skipped"] += 1
+                            else:
+                                report["transferred"] += 1
+                                report["bytes"] += size
+                    except (ADBProtocolError, OSError) as e:
+                        if isinstance(e, TimeoutError) or (
+                            owner is not None and owner.cancelled
+                        ):
+                            aborted.append(e)
+                            return
+                        with lock:
+                            report["errors"][job[0]] = str(e)
+                        # The device ends the sync session after a failure.
+                        if connection is not None:
+                            connection.close()
+                            connection = None
+            finally:
+                if connection is not None:
+                    connection.close()
+
+        # Each worker runs in a copy of the caller's context, so it keeps the
+        # deadline and the command its connections are cancelled with.
+        threads = [
+            threading.Thread(
+                target=contextvars.copy_context().run, args=(worker,), daemon=True
+            )
+            for _ in range(max(1, min(workers, len(jobs))))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for connection in spare:
+            connection.close()
+        if aborted:
+            raise aborted[0]
+        return report
+
+    @staticmethod
+    def _result(report, started, direction):
+        elapsed = time.monotonic() - started
+        report["seconds"] = elapsed
+        report["throughput"] = report["bytes"] / elapsed if elapsed > 0 else 0.0
+        if report["errors"]:
+            failed = len(report["errors"])
+            report["status"] = "error"
+            report["message"] = f"{failed} file(s) failed to {direction}."
+        else:
+            report["status"] = "success"
+            report["message"] = (
+                f"{report['transferred']} file(s) {direction}ed, "
+                f"{report['skipped']} unchanged, "
+                f"{report['throughput'] / 1e6:.2f} MB/s."
+            )
+        return report
+
+    def push(
+        self,
+        sources,
+        remote_directory,
+        device=None,
+        devices=None,
+        workers=4,
+        skip_unchanged=True,
+    ) -> dict:
+        """
+        Push a directory tree or a list of files to a remote directory.
+
+        Args:
+            sources (str | list): A local directory (its content is pushed) or files.
+            remote_directory (str): The destination directory on the device.
+            device (str, optional): The device identifier.
+            devices (list, optional): Several devices to push to concurrently.
+            workers (int, optional): Number of files transferred at once per device.
+            skip_unchanged (bool, optional): Skip files whose size and mtime match.
+
+        Returns:
+            dict: "status", "message", "transferred", "skipped", "bytes", "seconds",
+                "throughput" (bytes per second) and per-file "errors". With `devices`,
+                a map of serial to such results.
+        """
+        if devices is not None:
+            return DeviceFleet(devices=devices).run(
+                self.push,
+                sources,
+                remote_directory,
+                workers=workers,
+                skip_unchanged=skip_unchanged,
+            )
+        started = time.monotonic()
+        try:
+            files = self._local_files(sources)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+        def transfer(connection, job):
+            local_path, relative = job
+            remote_path = posixpath.join(remote_directory, relative)
+            if skip_unchanged:
+                info = os.stat(local_path)
+                remote = connection.stat(remote_path)
+                if remote.size == info.st_size and remote.mtime == int(info.st_mtime):
+                    return None
+            return connection.send(local_path, remote_path)
+
+        try:
+            if not self.transport:
+                raise ConnectionRefusedError
+            with self._bounded(self._sync_command("push", remote_directory, device)):
+                connection = SyncConnection(self.transport, device)
+                report = self._run_workers(files, transfer, device, workers, connection)
+        except ConnectionRefusedError:
+            return self._fallback(files, remote_directory, "push", device, started)
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return self._result(report, started, "push")
+
+    def pull(
+        self,
+        remote_path,
+        local_directory,
+        device=None,
+        devices=None,
+        workers=4,
+        skip_unchanged=True,
+    ) -> dict:
+        """
+        Pull a remote file or directory tree into a local directory.
+
+        With `devices`, each device's files go to `<local_directory>/<serial>`.
+        The result has the same shape as `push`.
+        """
+        if devices is not None:
+            return DeviceFleet(devices=devices).run(
+                lambda device: self.pull(
+                    remote_path,
+                    os.path.join(local_directory, device),
+                    device=device,
+                    workers=workers,
+                    skip_unchanged=skip_unchanged,
+                )
+            )
+        started = time.monotonic()
+
+        def transfer(connection, job):
+            path, relative, entry = job
+            local_path = os.path.join(local_directory, *relative.split("/"))
+            if skip_unchanged and os.path.isfile(local_path):
+                info = os.stat(local_path)
+                if info.st_size == entry.size and int(info.st_mtime) == entry.mtime:
+                    return None
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            return connection.recv(path, local_path, mtime=entry.mtime)
+
+        try:
+            if not self.transport:
+                raise ConnectionRefusedError
+            with self._bounded(self._sync_command("pull", remote_path, device)):
+                connection = SyncConnection(self.transport, device)
+                try:
+                    files = self._remote_files(connection, remote_path)
+                except BaseException:
+                    connection.close()
+                    raise
+                report = self._run_workers(files, transfer, device, workers, connection)
+        except ConnectionRefusedError:
+            return self._fallback(
+                [(remote_path, "")], local_directory, "pull", device, started
+            )
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+        return self._result(report, started, "pull")
+
+    @staticmethod
+    def _sync_command(direction, path, device=None) -> str:
+        """The command line a sync is listed under by `in_flight()`."""
+        return f"-s {device} {direction} {path}" if device else f"{direction} {path}"
+
+    def _fallback(self, files, destination, direction, device, started):
+        """Transfer with one ADB process per file when the adb server is unreachable."""
+        report = {"transferred": 0, "skipped": 0, "bytes": 0, "errors": {}}
+        for source, relative in files:
+            if direction == "push":
+                target = posixpath.join(destination, relative)
+                result = self.transfer_file(source, target, "push", device)
+            else:
+                os.makedirs(destination, exist_ok=True)
+                result = self.transfer_file(destination, source, "pull", device)
+            if result["status"] == "success":
+                report["transferred"] += 1
+                if direction == "push":
+                    report["bytes"] += os.path.getsize(source)
+            else:
+                report["errors"][source] = result["message"]
+        return self._result(report, started, direction)
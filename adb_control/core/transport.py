@@ -0,0 +1,481 @@
+"""
+A transport that speaks the ADB host protocol directly to the adb server.
+
+Instead of spawning an `adb` client process for every command, the socket
+transport opens a TCP connection to the adb server (localhost:5037 by default)
+and issues "smart socket" requests: a 4-digit hex length followed by the
+service name, answered by "OKAY" or "FAIL" plus a length-prefixed message.
+
+Device services (`shell:`, `exec:`) are reached by first switching the
+connection to a device with `host:transport:<serial>` (or `host:transport-any`
+when no serial is given).
+
+Commands run through `run` use the shell v2 protocol (`shell,v2,raw:`) when
+the device supports it, like the `adb` client does, so their stdout, stderr
+and exit code come back separately. Older devices get the legacy service with
+an exit-code sentinel appended to the command.
+
+ADBBase uses this transport for the commands it understands and falls back to
+the `adb` executable for everything else or when the server is unreachable.
+
+For bursts of small commands, `shell_session` keeps one interactive shell per
+device open and pipelines commands onto it, so N commands cost one round trip.
+"""
+
+import itertools
+import re
+import shlex
+import socket
+import struct
+import subprocess
+import threading
+
+from adb_control.core.commands import current_command, remaining
+from adb_control.core.metrics import metrics
+from adb_control.core.utils.params import ADB_SERVER_HOST, ADB_SERVER_PORT, ENCODING
+
+# Host shell operators that only the subprocess path can honour.
+_HOST_SHELL_OPERATORS = "|&;<>()"
+
+# Frames each command's output in a ShellSession: RS, sequence, exit code, RS.
+# The RS bytes are produced by printf, so an echoing PTY cannot fake a match.
+_SENTINEL_FORMAT = "printf '\\036%d %d\\036\\n' {seq} $?"
+# Seconds a ShellSession waits for output when neither the transport nor the
+# caller sets a timeout, so a command that never finishes cannot hold the
+# session forever.
+SESSION_TIMEOUT = 60.0
+_SENTINEL_PATTERN = re.compile(rb"\x1e(\d+) (\d+)\x1e\r?\n")
+
+# Shell v2 packets: an id byte and a little-endian length, then the payload.
+_SHELL_HEADER = struct.Struct("<BI")
+_SHELL_STDOUT = 1
+_SHELL_STDERR = 2
+# The device's exit packet; sent by the host, the same id closes stdin.
+_SHELL_EXIT = 3
+# Sent right after opening a command: nothing is fed to its stdin.
+SHELL_CLOSE_STDIN = _SHELL_HEADER.pack(_SHELL_EXIT, 0)
+
+
+class ADBProtocolError(Exception):
+    """Raised when the adb server answers a request with FAIL."""
+
+
+def _recv(sock, size) -> bytes:
+    """Receive from `sock`, giving up when the current deadline passes."""
+    limit = remaining()
+    if limit is not None:
+        sock.settimeout(limit)
+    return sock.recv(size)
+
+
+def _shutdown(sock):
+    """Close a socket, waking up any thread blocked reading it."""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    sock.close()
+
+
+def _has_host_expansion(command: str) -> bool:
+    """Whether the host shell would expand `$` or backticks outside single quotes."""
+    single = double = escaped = False
+    for char in command:
+        if escaped:
+            escaped = False
+        elif single:
+            single = char != "'"
+        elif char == "\\":
+            escaped = True
+        elif char == "'" and not double:
+            single = True
+        elif char == '"':
+            double = not double
+        elif char in "$`":
+            return True
+    return False
+
+
+def command_argv(command: str):
+    """
+    Split a raw adb command line into the arguments of the adb executable, or
+    return None when it relies on host shell features such as pipes,
+    redirections or variable expansion.
+
+    The line is split the POSIX way on every platform, so arguments quoted
+    with `shlex.quote` reach adb intact even where the host shell is cmd.exe.
+    """
+    if _has_host_expansion(command):
+        return None
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=_HOST_SHELL_OPERATORS)
+    lexer.whitespace_split = True
+    try:
+        argv = list(lexer)
+    except ValueError:
+        return None
+    if any(token and set(token) <= set(_HOST_SHELL_OPERATORS) for token in argv):
+        return None
+    return argv
+
+
+def parse_adb_command(command: str):
+    """
+    Translate a raw adb command line into a (device, verb, argument) request.
+
+    Returns None when the command needs the adb executable, either because
+    the verb has no socket equivalent or because it relies on host shell
+    features (see `command_argv`).
+    """
+    argv = command_argv(command)
+    if argv is None:
+        return None
+
+    device = None
+    if len(argv) >= 2 and argv[0] == "-s":
+        device, argv = argv[1], argv[2:]
+    if not argv:
+        return None
+
+    verb, args = argv[0], argv[1:]
+    if verb in ("shell", "exec-out") and args:
+        return device, verb, " ".join(args)
+    if verb in ("devices", "start-server", "kill-server") and not args:
+        return device, verb, None
+    if verb in ("connect", "disconnect") and len(args) <= 1:
+        return device, verb, args[0] if args else ""
+    return None
+
+
+def sentinel_command(command: str) -> str:
+    """Wrap a command for the legacy services so that its exit code follows its output."""
+    return f"( eval {shlex.quote(command)} ); " + _SENTINEL_FORMAT.format(seq=0)
+
+
+def split_sentinel(command, output: bytes) -> subprocess.CompletedProcess:
+    """Split the output of a `sentinel_command` into a CompletedProcess."""
+    match = None
+    for match in _SENTINEL_PATTERN.finditer(output):
+        pass
+    if match is None or output[match.end() :].strip():
+        raise ADBProtocolError("Connection closed before the command finished.")
+    return subprocess.CompletedProcess(
+        command, int(match.group(2)), output[: match.start()], b""
+    )
+
+
+def shell_v2_packets(data: bytes):
+    """
+    Collect shell v2 packets: return (exit code, stdout, stderr), or None
+    while the exit packet has not arrived.
+    """
+    stdout, stderr, offset = bytearray(), bytearray(), 0
+    while offset + _SHELL_HEADER.size <= len(data):
+        kind, length = _SHELL_HEADER.unpack_from(data, offset)
+        start, offset = (
+            offset + _SHELL_HEADER.size,
+            offset + _SHELL_HEADER.size + length,
+        )
+        if offset > len(data):
+            break
+        payload = data[start:offset]
+        if kind == _SHELL_EXIT:
+            return payload[0], bytes(stdout), bytes(stderr)
+        if kind == _SHELL_STDOUT:
+            stdout += payload
+        elif kind == _SHELL_STDERR:
+            stderr += payload
+    return None
+
+
+class ShellSession:
+    """
+    A long-lived `shell:` connection onto which commands are pipelined.
+
+    Each command runs with stdin closed and stderr merged into stdout, and is
+    followed by a sentinel carrying its exit code, so the output of several
+    commands written in one go can be split apart again. Commands are passed
+    quoted to `eval` in a subshell: an unbalanced quote or a syntax error
+    fails that command alone instead of swallowing the following sentinels or
+    ending the session's shell.
+    """
+
+    def __init__(self, transport, device=None):
+        self.device = device
+        self._timeout = (
+            SESSION_TIMEOUT if transport.timeout is None else transport.timeout
+        )
+        self._sock = transport.open_service("shell:sh", device)
+        self._buffer = bytearray()
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.closed = False
+
+    def run(self, command: str) -> subprocess.CompletedProcess:
+        """Run a single command in the session."""
+        return self.run_many([command])[0]
+
+    def run_many(self, commands, timeout=None, label="shell-session") -> list:
+        """
+        Pipeline several commands in one write and collect their results.
+
+        :param commands: Shell command strings, executed in order.
+        :param timeout: Seconds to wait for output, instead of the session's
+            default; on timeout the session is closed.
+        :param label: The series `metrics` records the batch under.
+        :return: One CompletedProcess per command.
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        with self._lock:
+            if self.closed:
+                raise ADBProtocolError("Shell session is closed.")
+            sequences = [next(self._sequence) for _ in commands]
+            script = "".join(
+                f"( eval {shlex.quote(command)} ) </dev/null 2>&1; "
+                + _SENTINEL_FORMAT.format(seq=seq)
+                + "\n"
+                for command, seq in zip(commands, sequences)
+            )
+            # Cancelling the command being run closes the session under it.
+            owner = current_command()
+            if owner is not None:
+                owner.attach(self.close)
+            measurement = None
+            if metrics.enabled:
+                measurement = metrics.start(script, label, self.device)
+            try:
+                # Drop any deadline of an earlier command; _recv applies the current one.
+                self._sock.settimeout(self._timeout if timeout is None else timeout)
+                self._sock.sendall(script.encode(ENCODING))
+                results = [
+                    self._read_result(command, seq)
+                    for command, seq in zip(commands, sequences)
+                ]
+            except BaseException as e:
+                self.close()
+                if measurement is not None:
+                    measurement.finish(error=e)
+                raise
+            finally:
+                if owner is not None:
+                    owner.detach(self.close)
+            if measurement is not None:
+                measurement.finish(results)
+            return results
+
+    def _read_result(self, command, seq) -> subprocess.CompletedProcess:
+        """Read up to the sentinel of command `seq`."""
+        while True:
+            match = _SENTINEL_PATTERN.search(self._buffer)
+            if match:
+                found, returncode = int(match.group(1)), int(match.group(2))
+                stdout = bytes(self._buffer[: match.start()])
+                del self._buffer[: match.end()]
+                if found == seq:
+                    return subprocess.CompletedProcess(command, returncode, stdout, b"")
+                continue
+            chunk = _recv(self._sock, 65536)
+            if not chunk:
+                raise ADBProtocolError("Shell session closed by device.")
+            self._buffer.extend(chunk)
+
+    def close(self):
+        self.closed = True
+        _shutdown(self._sock)
+
+
+class SocketTransport:
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sessions = {}
+        self._sessions_lock = threading.Lock()
+        # device -> whether it speaks the shell v2 protocol.
+        self._shell_v2 = {}
+
+    def _connect(self) -> socket.socket:
+        """
+        Open a new connection to the adb server, bounded by the current
+        deadline and closed if the command using it is cancelled.
+        """
+        sock = socket.create_connection(
+            (self.host, self.port), timeout=remaining(self.timeout)
+        )
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        owner = current_command()
+        if owner is not None:
+            owner.attach(lambda: _shutdown(sock))
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock, size) -> bytes:
+        """Read exactly `size` bytes or raise if the connection closes early."""
+        buffer = bytearray()
+        while len(buffer) < size:
+            chunk = _recv(sock, size - len(buffer))
+            if not chunk:
+                raise ADBProtocolError("Connection closed by adb server.")
+            buffer.extend(chunk)
+        return bytes(buffer)
+
+    @staticmethod
+    def _recv_all(sock) -> bytes:
+        """Read until the remote end closes the connection."""
+        chunks = []
+        while True:
+            chunk = _recv(sock, 65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _read_length_prefixed(self, sock) -> bytes:
+        length = int(self._recv_exactly(sock, 4), 16)
+        return self._recv_exactly(sock, length)
+
+    def _send_request(self, sock, service: str):
+        """Send a smart socket request and wait for its OKAY/FAIL status."""
+        payload = service.encode(ENCODING)
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = self._recv_exactly(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            message = self._read_length_prefixed(sock).decode(ENCODING)
+            raise ADBProtocolError(message)
+        raise ADBProtocolError(f"Unexpected adb server status: {status!r}")
+
+    def open_service(self, service: str, device=None) -> socket.socket:
+        """
+        Open a connection to a device service such as `shell:ls` or `exec:screencap`.
+
+        The returned socket is positioned right after the service's OKAY, ready to
+        stream the service's output. The caller owns the socket and must close it.
+        """
+        sock = self._connect()
+        try:
+            self._send_request(
+                sock, f"host:transport:{device}" if device else "host:transport-any"
+            )
+            self._send_request(sock, service)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    def host_command(self, service: str, reply=True) -> bytes:
+        """
+        Run a host service such as `host:devices` and return its payload.
+
+        Services that answer with a bare OKAY (e.g. `host:kill`) must pass
+        `reply=False`.
+        """
+        with self._connect() as sock:
+            self._send_request(sock, service)
+            if not reply:
+                return b""
+            return self._read_length_prefixed(sock)
+
+    def shell(self, command: str, device=None) -> bytes:
+        """Run a command through the `shell:` service and return its output."""
+        with self.open_service(f"shell:{command}", device) as sock:
+            return self._recv_all(sock)
+
+    def exec_out(self, command: str, device=None) -> bytes:
+        """Run a command through the binary-safe `exec:` service."""
+        with self.open_service(f"exec:{command}", device) as sock:
+            return self._recv_all(sock)
+
+    def supports_shell_v2(self, device=None) -> bool:
+        """Whether the device's adbd has the `shell_v2` feature; looked up once."""
+        if device not in self._shell_v2:
+            service = f"host-serial:{device}:features" if device else "host:features"
+            try:
+                features = self.host_command(service).decode(ENCODING).split(",")
+            except ADBProtocolError:
+                features = []
+            self._shell_v2[device] = "shell_v2" in features
+        return self._shell_v2[device]
+
+    def shell_v2(self, command: str, device=None) -> subprocess.CompletedProcess:
+        """
+        Run a command through the `shell,v2,raw:` service, with its stdout,
+        stderr and exit code kept apart.
+        """
+        with self.open_service(f"shell,v2,raw:{command}", device) as sock:
+            sock.sendall(SHELL_CLOSE_STDIN)
+            data = self._recv_all(sock)
+        result = shell_v2_packets(data)
+        if result is None:
+            raise ADBProtocolError("Connection closed before the command finished.")
+        returncode, stdout, stderr = result
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+    def _run_shell(self, command, device, verb, argument):
+        if self.supports_shell_v2(device):
+            result = self.shell_v2(argument, device)
+            result.args = command
+            return result
+        script = sentinel_command(argument)
+        if verb == "shell":
+            output = self.shell(script, device)
+        else:
+            output = self.exec_out(script, device)
+        return split_sentinel(command, output)
+
+    def shell_session(self, device=None) -> ShellSession:
+        """
+        Return the persistent shell session of a device, opening it if needed.
+
+        Sessions are shared by every caller using this transport; a session
+        whose connection dropped is replaced by a fresh one.
+        """
+        with self._sessions_lock:
+            session = self._sessions.get(device)
+            if session is None or session.closed:
+                session = ShellSession(self, device)
+                self._sessions[device] = session
+            return session
+
+    def close_sessions(self):
+        """Close every persistent shell session opened by this transport."""
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def parse_command(self, command: str):
+        """Translate a raw adb command line, see `parse_adb_command`."""
+        return parse_adb_command(command)
+
+    def run(self, command: str, device, verb, argument) -> subprocess.CompletedProcess:
+        """
+        Execute a request returned by `parse_command`.
+
+        The result mimics the `adb` client: `shell` and `exec-out` carry the
+        command's exit code (and, with shell v2, its stderr), and protocol
+        failures become a non-zero return code with the server's message on
+        stderr. Connection errors are raised so the caller can fall back.
+        """
+        try:
+            if verb in ("shell", "exec-out"):
+                return self._run_shell(command, device, verb, argument)
+            if verb == "devices":
+                devices = self.host_command("host:devices")
+                stdout = b"List of devices attached\n" + devices + b"\n"
+            elif verb == "start-server":
+                self.host_command("host:version")
+                stdout = b""
+            elif verb == "kill-server":
+                self.host_command("host:kill", reply=False)
+                stdout = b""
+            elif verb == "connect":
+                stdout = self.host_command(f"host:connect:{argument}") + b"\n"
+            else:
+                stdout = self.host_command(f"host:disconnect:{argument}") + b"\n"
+        except ADBProtocolError as e:
+            return subprocess.CompletedProcess(
+                command, 1, b"", f"error: {e}\n".encode(ENCODING)
+            )
+        return subprocess.CompletedProcess(command, 0, stdout, b"")
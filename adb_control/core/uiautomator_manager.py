@@ -1,29 +1,113 @@
+"""
+A class to read the UI hierarchy of Android devices with uiautomator.
+
+By default the hierarchy is dumped to `/dev/tty` and read straight from
+`adb exec-out`, so a snapshot costs one round trip and no files on either
+side. The XML is parsed incrementally while it arrives, and nothing is shared
+between calls, so many devices can be queried concurrently.
+
+Each dump also yields a UITree (see utils/ui_tree.py): take one `snapshot` and
+run as many selectors against it as needed. `find_elements` takes a selector;
+`find_element` and the waits take a resource-id or text, or a selector
+prefixed with "xpath:".
+
+`wait_for`, `wait_until_gone` and `wait_for_idle` poll with adaptive backoff:
+the interval grows while the screen does not change and resets when it does.
+Successive dumps are hashed, and an unchanged dump is neither parsed nor
+queried again.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
 import xml.etree.ElementTree as ET
 from adb_control.core.base import ADBBase
+from adb_control.core.commands import CommandTimeout, remaining
+from adb_control.core.utils.ui_tree import UITree
+
+_HIERARCHY_END = b"</hierarchy>"
+# Marks a selector where a resource-id or text is otherwise expected.
+XPATH_PREFIX = "xpath:"
+
+
+class UIHierarchyParser:
+    """
+    Incremental parser for `uiautomator dump` output.
+
+    Anything before the XML (warnings) and after `</hierarchy>` (the
+    "UI hierchary dumped to" notice) is ignored.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._started = False
+        self._tail = b""
+        self.done = False
+        self.tree = UITree()
+
+    def feed(self, data: bytes) -> bool:
+        """Feed a chunk of output; return True once the hierarchy is complete."""
+        if self.done:
+            return True
+        if not self._started:
+            start = data.find(b"<")
+            if start < 0:
+                return False
+            data, self._started = data[start:], True
+        window = self._tail + data
+        end = window.find(_HIERARCHY_END)
+        if end >= 0:
+            data = data[: end + len(_HIERARCHY_END) - len(self._tail)]
+            self.done = True
+        self._tail = window[-(len(_HIERARCHY_END) - 1) :]
+        self._parser.feed(data)
+        for event, node in self._parser.read_events():
+            if event == "start":
+                self.tree.start(node.tag, node.attrib)
+            else:
+                self.tree.end()
+                node.clear()
+        return self.done
+
+    def close(self) -> dict:
+        """Return {"elements": [element dicts], "tree": UITree}."""
+        if not self.done:
+            raise ValueError("Incomplete UI hierarchy dump.")
+        return {
+            "elements": [node.to_dict() for node in self.tree.nodes],
+            "tree": self.tree,
+        }
+
+
+def parse_ui_dump(data: bytes) -> dict:
+    """Parse the complete output of `uiautomator dump /dev/tty`."""
+    parser = UIHierarchyParser()
+    parser.feed(data)
+    return parser.close()
 
 
 class UIExtractor(ADBBase):
-    def uiautomator(self) -> dict:
+    def _prepare_command(self, command, device=None):
+        """Helper method to prepend device flag if provided."""
+        if device:
+            return f"-s {device} {command}"
+        return command
+
+    def uiautomator(self, device=None, streaming=True) -> dict:
         """
         Extract and process UI data from the device in real-time.
+
+        :param streaming: Read the dump from exec-out; False dumps to a file on
+            the device and pulls it, for devices whose uiautomator cannot write
+            to /dev/tty.
         """
         try:
-            # Step 1: Dump the UI hierarchy to a file on the device
-            dump_path = "/sdcard/window_dump.xml"
-            self.shell_command(f"uiautomator dump {dump_path}")
-
-            # Step 2: Pull the file from the device to the local system
-            local_file = "window_dump.xml"
-            self.transfer_file(
-                direction="pull", remote_file_path=dump_path, local_file_path=local_file
-            )
-
-            # Step 3: Remove the dumped file from the device
-            self.remove_file(dump_path)
-
-            # Step 4: Parse the XML file to extract UI information
-            ui_data = self._parse_ui_hierarchy(local_file)
-
+            if streaming:
+                ui_data = self._stream_ui_hierarchy(device)
+            else:
+                ui_data = self._pull_ui_hierarchy(device)
             return {
                 "status": "success",
                 "data": ui_data,
@@ -35,6 +119,38 @@ class UIExtractor(ADBBase):
                 "message": f"Failed to extract UI: {str(e)}",
             }
 
+    def _stream_ui_hierarchy(self, device=None) -> dict:
+        parser = UIHierarchyParser()
+        command = self._prepare_command("exec-out uiautomator dump /dev/tty", device)
+        with self.open_stream(command) as stream:
+            while not parser.done:
+                chunk = stream.read(65536)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+        return parser.close()
+
+    def _pull_ui_hierarchy(self, device=None) -> dict:
+        dump_path = "/sdcard/window_dump.xml"
+        fd, local_file = tempfile.mkstemp(suffix=".xml")
+        os.close(fd)
+        try:
+            self.run_command(
+                self._prepare_command(f"shell uiautomator dump {dump_path}", device)
+            )
+            result = self.transfer_file(
+                direction="pull",
+                remote_file_path=dump_path,
+                local_file_path=local_file,
+                device=device,
+            )
+            if result["status"] == "error":
+                raise Exception(result["message"])
+            self.run_command(self._prepare_command(f"shell rm {dump_path}", device))
+            return self._parse_ui_hierarchy(local_file)
+        finally:
+            os.remove(local_file)
+
     def _parse_ui_hierarchy(self, file_path: str) -> dict:
         """
         Parse the UI hierarchy XML file and extract relevant data.
@@ -43,43 +159,56 @@ class UIExtractor(ADBBase):
         :return: Parsed data as a dictionary.
         """
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-
-            # Extract UI data
-            ui_elements = []
-            for node in root.iter("node"):
-                element = {
-                    "text": node.attrib.get("text", ""),
-                    "resource_id": node.attrib.get("resource-id", ""),
-                    "package": node.attrib.get("package", ""),
-                    "class": node.attrib.get("class", ""),
-                    "content_desc": node.attrib.get("content-desc", ""),
-                    "bounds": node.attrib.get("bounds", ""),
-                }
-                ui_elements.append(element)
-
-            return {"elements": ui_elements}
+            with open(file_path, "rb") as file:
+                return parse_ui_dump(file.read())
 
         except Exception as e:
             raise Exception(f"Error parsing UI hierarchy XML: {e}")
 
-    def find_element(self, element_id: str) -> dict:
+    def snapshot(self, device=None, streaming=True) -> UITree:
+        """Dump the UI once and return it as a UITree to query with selectors."""
+        ui_data = self.uiautomator(device, streaming)
+        if ui_data["status"] == "error":
+            raise Exception(ui_data["message"])
+        return ui_data["data"]["tree"]
+
+    def find_elements(self, selector: str, device=None, tree=None) -> dict:
         """
-        Find an element by resource-id or text.
+        Find all elements matching a selector such as `//Button[@text="OK"]`.
 
-        :param element_id: The resource-id or text to filter by.
+        :param tree: A snapshot to query instead of dumping the UI again.
+        :return: "elements" (element dicts) and "nodes" (UINode objects).
+        """
+        try:
+            tree = tree or self.snapshot(device)
+            nodes = tree.select(selector)
+            return {
+                "status": "success",
+                "elements": [node.to_dict() for node in nodes],
+                "nodes": nodes,
+            }
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Failed to find elements: {str(e)}",
+            }
+
+    def find_element(self, element_id: str, device=None, tree=None) -> dict:
+        """
+        Find an element by resource-id or text, or by a selector prefixed with
+        "xpath:", e.g. `xpath://Button[@text="OK"]`.
+
+        :param element_id: The resource-id, text or prefixed selector to filter by.
+        :param tree: A snapshot to query instead of dumping the UI again.
         :return: The matched element or an error message.
         """
         try:
             # Step 1: Extract UI data
-            ui_data = self.uiautomator()
-            if ui_data["status"] == "error":
-                return ui_data
+            tree = tree or self.snapshot(device)
 
-            # Step 2: Find the element by ID
-            element = self._get_element_by_id(ui_data["data"]["elements"], element_id)
-            if element["element"] == "not found":
+            # Step 2: Find the element through the tree indexes
+            node = self._match(tree, element_id)
+            if node is None:
                 return {
                     "status": "error",
                     "message": "Element not found.",
@@ -87,7 +216,8 @@ class UIExtractor(ADBBase):
 
             return {
                 "status": "success",
-                "element": element["element"],
+                "element": node.to_dict(),
+                "node": node,
             }
 
         except Exception as e:
@@ -96,15 +226,187 @@ class UIExtractor(ADBBase):
                 "message": f"Failed to find element: {str(e)}",
             }
 
-    def _get_element_by_id(self, ui_elements: list, element_id: str) -> dict:
+    def _read_dump(self, device=None, timeout=None) -> bytes:
+        """
+        Read the raw output of one `uiautomator dump /dev/tty`, raising
+        CommandTimeout when it takes longer than `timeout` seconds.
+        """
+        command = self._prepare_command("exec-out uiautomator dump /dev/tty", device)
+        data = bytearray()
+        expired = threading.Event()
+        with self.open_stream(command) as stream:
+
+            def expire():
+                expired.set()
+                stream.close()
+
+            timer = None
+            if timeout is not None:
+                timer = threading.Timer(timeout, expire)
+                timer.daemon = True
+                timer.start()
+            try:
+                while True:
+                    try:
+                        chunk = stream.read(65536)
+                    except (OSError, ValueError):
+                        if expired.is_set():
+                            break
+                        raise
+                    if not chunk:
+                        break
+                    search_from = max(0, len(data) - len(_HIERARCHY_END))
+                    data += chunk
+                    if data.find(_HIERARCHY_END, search_from) >= 0:
+                        break
+            finally:
+                if timer is not None:
+                    timer.cancel()
+        if expired.is_set():
+            raise CommandTimeout(f"{command!r} timed out after {timeout} seconds.")
+        return bytes(data)
+
+    def _poll(self, device, timeout, interval, max_interval):
+        """
+        Yield (tree, changed) for successive dumps until `timeout` expires.
+
+        The wait between dumps starts at `interval` and grows by half while
+        the hierarchy stays the same, up to `max_interval`. `timeout` is
+        clamped to the current deadline, and a dump still running when it
+        expires is abandoned.
+        """
+        expires = time.monotonic() + remaining(timeout)
+        digest, tree, delay = None, None, interval
+        while True:
+            try:
+                data = self._read_dump(device, max(0.0, expires - time.monotonic()))
+            except CommandTimeout:
+                return
+            # Hash the XML alone: how much of the trailer was read varies.
+            end = data.find(_HIERARCHY_END)
+            if end >= 0:
+                data = data[: end + len(_HIERARCHY_END)]
+            current = hashlib.blake2b(data, digest_size=16).digest()
+            changed = current != digest
+            if changed:
+                tree, digest, delay = parse_ui_dump(data)["tree"], current, interval
+            else:
+                delay = min(delay * 1.5, max_interval)
+            yield tree, changed
+            left = expires - time.monotonic()
+            if left <= 0:
+                return
+            time.sleep(min(delay, left))
+
+    @staticmethod
+    def _match(tree, element_id):
+        """Return the first node matching a resource-id, text or prefixed selector."""
+        if element_id.startswith(XPATH_PREFIX):
+            return tree.select_one(element_id[len(XPATH_PREFIX) :])
+        matches = tree.by_resource_id.get(element_id, []) + tree.by_text.get(
+            element_id, []
+        )
+        return min(matches, key=lambda node: node.order) if matches else None
+
+    def wait_for(
+        self,
+        selector,
+        timeout=10.0,
+        device=None,
+        interval=0.1,
+        max_interval=1.0,
+    ) -> dict:
+        """
+        Wait until an element appears.
+
+        :param selector: A resource-id, text or "xpath:" selector, or a list
+            of them; the first one found wins.
+        :return: "selector" that matched, "element", "node", "elapsed" and the
+            number of "dumps" taken.
+        """
+        selectors = [selector] if isinstance(selector, str) else list(selector)
+        started, dumps = time.monotonic(), 0
+        try:
+            for tree, changed in self._poll(device, timeout, interval, max_interval):
+                dumps += 1
+                if not changed:
+                    continue
+                for candidate in selectors:
+                    node = self._match(tree, candidate)
+                    if node is not None:
+                        return {
+                            "status": "success",
+                            "selector": candidate,
+                            "element": node.to_dict(),
+                            "node": node,
+                            "elapsed": time.monotonic() - started,
+                            "dumps": dumps,
+                        }
+            return {
+                "status": "error",
+                "message": f"Timed out after {timeout}s waiting for {selectors}.",
+                "dumps": dumps,
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to wait: {str(e)}"}
+
+    def wait_until_gone(
+        self,
+        selector,
+        timeout=10.0,
+        device=None,
+        interval=0.1,
+        max_interval=1.0,
+    ) -> dict:
+        """Wait until none of the given elements (see `wait_for`) is on screen."""
+        selectors = [selector] if isinstance(selector, str) else list(selector)
+        started, dumps = time.monotonic(), 0
+        try:
+            for tree, changed in self._poll(device, timeout, interval, max_interval):
+                dumps += 1
+                if changed and all(self._match(tree, s) is None for s in selectors):
+                    return {
+                        "status": "success",
+                        "elapsed": time.monotonic() - started,
+                        "dumps": dumps,
+                    }
+            return {
+                "status": "error",
+                "message": f"Timed out after {timeout}s waiting for {selectors} to go.",
+                "dumps": dumps,
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to wait: {str(e)}"}
+
+    def wait_for_idle(
+        self,
+        timeout=10.0,
+        device=None,
+        stable_dumps=2,
+        interval=0.1,
+        max_interval=0.5,
+    ) -> dict:
         """
-        Find an element by resource-id or text.
+        Wait until the screen settles: `stable_dumps` identical dumps in a row.
 
-        :param ui_elements: List of parsed UI elements.
-        :param element_id: The resource-id or text to filter by.
-        :return: The matched element or an empty dictionary if not found.
+        :return: "tree" with the settled hierarchy, "elapsed" and "dumps".
         """
-        for element in ui_elements:
-            if element["resource_id"] == element_id or element["text"] == element_id:
-                return {"element": element}
-        return {"element": "not found"}
+        started, dumps, unchanged = time.monotonic(), 0, 0
+        try:
+            for tree, changed in self._poll(device, timeout, interval, max_interval):
+                dumps += 1
+                unchanged = 1 if changed else unchanged + 1
+                if unchanged >= stable_dumps:
+                    return {
+                        "status": "success",
+                        "tree": tree,
+                        "elapsed": time.monotonic() - started,
+                        "dumps": dumps,
+                    }
+            return {
+                "status": "error",
+                "message": f"The screen did not settle within {timeout}s.",
+                "dumps": dumps,
+            }
+        except Exception as e:
+            return {"status": "error", "message": f"Failed to wait: {str(e)}"}
@@ -0,0 +1,120 @@
+"""
+Helpers to identify APK files on the host without `aapt`.
+
+`read_manifest` decodes just enough of the binary AndroidManifest.xml (its
+string pool and the attributes of the root <manifest> element) to return the
+package name and version code. `file_digest` hashes files once per
+(path, size, mtime) so repeated installs of the same build are cheap.
+"""
+
+import hashlib
+import os
+import struct
+import threading
+import zipfile
+
+_RES_STRING_POOL_TYPE = 0x0001
+_RES_XML_START_ELEMENT_TYPE = 0x0102
+_RES_XML_RESOURCE_MAP_TYPE = 0x0180
+_VERSION_CODE_RESOURCE_ID = 0x0101021B
+_UTF8_FLAG = 1 << 8
+_TYPE_STRING = 0x03
+_TYPE_INT_DEC = 0x10
+_TYPE_INT_HEX = 0x11
+
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _decode_length(data, offset, utf8):
+    """Decode a string pool length prefix, returning (length, next offset)."""
+    if utf8:
+        length = data[offset]
+        if length & 0x80:
+            return ((length & 0x7F) << 8) | data[offset + 1], offset + 2
+        return length, offset + 1
+    length = struct.unpack_from("<H", data, offset)[0]
+    if length & 0x8000:
+        low = struct.unpack_from("<H", data, offset + 2)[0]
+        return ((length & 0x7FFF) << 16) | low, offset + 4
+    return length, offset + 2
+
+
+def _string_pool(data, offset):
+    _, header_size, _, count, _, flags, strings_start = struct.unpack_from(
+        "<HHIIIII", data, offset
+    )
+    utf8 = bool(flags & _UTF8_FLAG)
+    offsets = struct.unpack_from(f"<{count}I", data, offset + header_size)
+    strings = []
+    for string_offset in offsets:
+        position = offset + strings_start + string_offset
+        if utf8:
+            _, position = _decode_length(data, position, True)
+            length, position = _decode_length(data, position, True)
+            strings.append(data[position : position + length].decode("utf-8"))
+        else:
+            length, position = _decode_length(data, position, False)
+            raw = data[position : position + length * 2]
+            strings.append(raw.decode("utf-16-le"))
+    return strings
+
+
+def parse_binary_manifest(data: bytes) -> dict:
+    """Return the package name and version code from a binary AndroidManifest.xml."""
+    strings, resource_ids = [], ()
+    offset = 8
+    while offset < len(data):
+        chunk_type, header_size, chunk_size = struct.unpack_from("<HHI", data, offset)
+        if chunk_type == _RES_STRING_POOL_TYPE:
+            strings = _string_pool(data, offset)
+        elif chunk_type == _RES_XML_RESOURCE_MAP_TYPE:
+            count = (chunk_size - header_size) // 4
+            resource_ids = struct.unpack_from(f"<{count}I", data, offset + header_size)
+        elif chunk_type == _RES_XML_START_ELEMENT_TYPE:
+            name = struct.unpack_from("<I", data, offset + 20)[0]
+            if strings[name] != "manifest":
+                break
+            start, size, count = struct.unpack_from("<HHH", data, offset + 24)
+            info = {"package": None, "version_code": None}
+            for index in range(count):
+                position = offset + 16 + start + index * size
+                _, attribute, raw, _, _, kind, value = struct.unpack_from(
+                    "<IIIHBBI", data, position
+                )
+                if strings[attribute] == "package":
+                    info["package"] = strings[raw]
+                elif strings[attribute] == "versionCode" or (
+                    attribute < len(resource_ids)
+                    and resource_ids[attribute] == _VERSION_CODE_RESOURCE_ID
+                ):
+                    if kind in (_TYPE_INT_DEC, _TYPE_INT_HEX):
+                        info["version_code"] = value
+                    elif kind == _TYPE_STRING:
+                        info["version_code"] = int(strings[raw])
+            return info
+        offset += chunk_size
+    raise ValueError("AndroidManifest.xml has no <manifest> element.")
+
+
+def read_manifest(apk_path: str) -> dict:
+    """Return {"package", "version_code"} of an APK."""
+    with zipfile.ZipFile(apk_path) as apk:
+        return parse_binary_manifest(apk.read("AndroidManifest.xml"))
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of a file, cached while its size and mtime are unchanged."""
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_size, info.st_mtime_ns)
+    with _digests_lock:
+        digest = _digests.get(key)
+    if digest is None:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with _digests_lock:
+            _digests[key] = digest
+    return digest
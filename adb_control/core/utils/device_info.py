@@ -1,9 +1,57 @@
+"""
+A class to read device properties with a per-device cache.
+
+`getprop` runs once per device and all properties are kept. Read-only `ro.*`
+properties never change while the device is up, so they are cached for
+`ro_ttl` (forever by default); the other properties expire after
+`volatile_ttl` seconds. Display size and density (from `wm`) are cached like
+volatile properties. `refresh` fetches many devices concurrently.
+"""
+
+import re
+import threading
+import time
+
 from adb_control.core.base import ADBBase
+from adb_control.core.fleet import DeviceFleet
+from adb_control.core.utils.params import ENCODING
+
+_PROPERTY = re.compile(r"^\[(.+?)\]: \[(.*)\]$")
+_SIZE = re.compile(r"(\d+)x(\d+)")
+_DENSITY = re.compile(r"density: (\d+)")
+
+
+def parse_getprop(output: str) -> dict:
+    """Parse `getprop` output ("[name]: [value]" lines) into a dict."""
+    properties = {}
+    for line in output.splitlines():
+        match = _PROPERTY.match(line)
+        if match:
+            properties[match.group(1)] = match.group(2)
+    return properties
 
 
 class DeviceInfo(ADBBase):
-    def __init__(self, adb_path="adb"):
-        super().__init__(adb_path)
+    def __init__(
+        self,
+        adb_path="adb",
+        transport=None,
+        ro_ttl=None,
+        volatile_ttl=5.0,
+        timeout=None,
+    ):
+        """
+        :param ro_ttl: Seconds to keep `ro.*` properties; None keeps them until
+            `refresh` or `invalidate`.
+        :param volatile_ttl: Seconds to keep the other properties and the display.
+        :param timeout: Default timeout in seconds applied to every command.
+        """
+        super().__init__(adb_path, transport, timeout)
+        self.ro_ttl = ro_ttl
+        self.volatile_ttl = volatile_ttl
+        # device -> {"ro": (fetched at, dict), "volatile": ..., "display": ...}
+        self._cache = {}
+        self._lock = threading.Lock()
 
     def _prepare_command(self, command, device=None):
         """
@@ -13,20 +61,114 @@ class DeviceInfo(ADBBase):
             return f"-s {device} {command}"
         return command
 
+    def _cached(self, device, part, ttl):
+        with self._lock:
+            entry = self._cache.get(device, {}).get(part)
+        if entry is None:
+            return None
+        fetched, value = entry
+        if ttl is not None and time.monotonic() - fetched >= ttl:
+            return None
+        return value
+
+    def _store(self, device, part, value, fetched):
+        with self._lock:
+            self._cache.setdefault(device, {})[part] = (fetched, value)
+
+    def invalidate(self, device=None):
+        """Forget everything cached for a device (e.g. after a reboot or an OTA)."""
+        with self._lock:
+            self._cache.pop(device, None)
+
+    def properties(self, device=None, refresh=False) -> dict:
+        """Return all system properties of the device, from the cache when fresh."""
+        ro = self._cached(device, "ro", self.ro_ttl)
+        volatile = self._cached(device, "volatile", self.volatile_ttl)
+        if refresh or ro is None or volatile is None:
+            fetched = time.monotonic()
+            result = self.run_command(self._prepare_command("shell getprop", device))
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.decode(ENCODING).strip())
+            properties = parse_getprop(result.stdout.decode(ENCODING))
+            ro = {k: v for k, v in properties.items() if k.startswith("ro.")}
+            volatile = {k: v for k, v in properties.items() if not k.startswith("ro.")}
+            self._store(device, "ro", ro, fetched)
+            self._store(device, "volatile", volatile, fetched)
+        return {**ro, **volatile}
+
+    def getprop(self, name, device=None, default=None):
+        """
+        Return one property. `ro.*` properties are answered from the cache
+        without touching the device once they have been fetched.
+        """
+        if name.startswith("ro."):
+            ro = self._cached(device, "ro", self.ro_ttl)
+            if ro is not None:
+                return ro.get(name, default)
+        return self.properties(device).get(name, default)
+
+    def sdk(self, device=None) -> int:
+        """The API level, e.g. 34."""
+        return int(self.getprop("ro.build.version.sdk", device, "0") or 0)
+
+    def android_version(self, device=None) -> str:
+        return self.getprop("ro.build.version.release", device, "")
+
+    def model(self, device=None) -> str:
+        return self.getprop("ro.product.model", device, "")
+
+    def abis(self, device=None) -> list:
+        """Supported ABIs, preferred first."""
+        abis = self.getprop("ro.product.cpu.abilist", device)
+        if not abis:
+            abis = self.getprop("ro.product.cpu.abi", device, "")
+        return [abi for abi in abis.split(",") if abi]
+
+    def display(self, device=None, refresh=False) -> dict:
+        """
+        Return the display "width", "height" and "density" from `wm`, taking
+        overrides into account.
+        """
+        display = (
+            None if refresh else self._cached(device, "display", self.volatile_ttl)
+        )
+        if display is None:
+            fetched = time.monotonic()
+            command = self._prepare_command("shell 'wm size; wm density'", device)
+            output = self.run_command(command).stdout.decode(ENCODING)
+            sizes, densities = _SIZE.findall(output), _DENSITY.findall(output)
+            if not sizes:
+                raise RuntimeError(output.strip() or "Could not read the display.")
+            # The override, when there is one, is printed last.
+            width, height = (int(value) for value in sizes[-1])
+            density = int(densities[-1]) if densities else None
+            display = {"width": width, "height": height, "density": density}
+            self._store(device, "display", display, fetched)
+        return display
+
+    def screen_size(self, device=None) -> tuple:
+        display = self.display(device)
+        return display["width"], display["height"]
+
+    def density(self, device=None) -> int:
+        return self.display(device)["density"]
+
+    def refresh(self, devices, max_workers=16) -> dict:
+        """
+        Fetch the properties of many devices concurrently.
+
+        Returns:
+            dict: The DeviceFleet result map of serial to {"status", "result", "elapsed"}.
+        """
+        fleet = DeviceFleet(devices=devices, max_workers=max_workers)
+        return fleet.run(self.properties, refresh=True)
+
     def device_info(self, device=None):
         """
         Retrieve system properties from the device and filter key information.
         """
-        command = self._prepare_command("shell getprop", device)
         try:
-            result = self.run_command(command)
-            properties = {}
-            for line in result.splitlines():
-                parts = line.split(": ", maxsplit=1)
-                if len(parts) == 2:
-                    key = parts[0].strip("[]")
-                    value = parts[1].strip("[]")
-                    properties[key] = value
+            properties = self.properties(device)
 
             fingerprint = properties.get("ro.build.fingerprint", "Unknown")
             model = properties.get("ro.product.model", "Unknown")
@@ -0,0 +1,365 @@
+"""
+Change detection, deduplication and template matching on raw frames.
+
+Frames (see image.py) are split into square tiles. Each tile gets a CRC of
+its pixel bytes, computed straight from the frame's memoryview, so comparing
+two frames costs one pass over the pixels and no image decoding. FrameDiffer
+keeps the previous frame's hashes and reports, for every new frame, whether
+it is a duplicate and which regions changed. Changed tiles that touch are
+merged into bounding boxes. Row hashes are checked first, so bands of rows
+that did not change are not hashed tile by tile.
+
+NumPy is optional. Without it, tiles are compared exactly. With it,
+`tolerance` ignores small per-pixel noise (e.g. video compression or
+dithering), `fingerprint` gives a downsampled luminance signature of a
+frame, and `locate` finds a template image on screen with normalized
+cross-correlation, computed by FFT on a downscaled copy and refined at full
+resolution.
+"""
+
+import zlib
+from typing import NamedTuple
+
+from adb_control.core.utils.image import PIXEL_FORMAT_RGB_565
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - depends on the environment
+    numpy = None
+
+
+def _require_numpy(feature):
+    if numpy is None:
+        raise RuntimeError(f"{feature} requires numpy (pip install numpy).")
+
+
+def row_hashes(frame) -> list:
+    """CRC of every pixel row of the frame."""
+    stride = frame.width * frame.bytes_per_pixel
+    data = frame.data
+    return [
+        zlib.crc32(data[o : o + stride])
+        for o in range(0, stride * frame.height, stride)
+    ]
+
+
+def tile_hashes(frame, tile=64, bands=None) -> list:
+    """
+    CRC of every `tile` x `tile` block, as rows of columns.
+
+    :param bands: Only hash these tile rows; the others are returned as None.
+    """
+    bpp = frame.bytes_per_pixel
+    stride, span = frame.width * bpp, tile * bpp
+    columns = range(0, stride, span)
+    data = frame.data
+    grid = []
+    for band, top in enumerate(range(0, frame.height, tile)):
+        if bands is not None and band not in bands:
+            grid.append(None)
+            continue
+        hashes = [0] * len(columns)
+        for offset in range(
+            top * stride, min(top + tile, frame.height) * stride, stride
+        ):
+            for column, start in enumerate(columns):
+                end = offset + min(start + span, stride)
+                hashes[column] = zlib.crc32(data[offset + start : end], hashes[column])
+        grid.append(hashes)
+    return grid
+
+
+def merge_tiles(tiles, tile, width, height) -> list:
+    """Merge touching (row, column) tiles into (x1, y1, x2, y2) boxes."""
+    pending, regions = set(tiles), []
+    while pending:
+        stack = [pending.pop()]
+        rows, columns = [], []
+        while stack:
+            row, column = stack.pop()
+            rows.append(row)
+            columns.append(column)
+            for neighbour in (
+                (row - 1, column),
+                (row + 1, column),
+                (row, column - 1),
+                (row, column + 1),
+            ):
+                if neighbour in pending:
+                    pending.remove(neighbour)
+                    stack.append(neighbour)
+        regions.append(
+            (
+                min(columns) * tile,
+                min(rows) * tile,
+                min((max(columns) + 1) * tile, width),
+                min((max(rows) + 1) * tile, height),
+            )
+        )
+    return sorted(regions, key=lambda box: (box[1], box[0]))
+
+
+def frame_array(frame):
+    """The frame's pixels as a (height, width, channels) uint8 array, without copying."""
+    _require_numpy("frame_array")
+    return numpy.frombuffer(frame.data, numpy.uint8).reshape(
+        frame.height, frame.width, frame.bytes_per_pixel
+    )
+
+
+def luminance(frame):
+    """The frame as a float32 (height, width) luminance array."""
+    pixels = frame_array(frame)
+    if frame.pixel_format == PIXEL_FORMAT_RGB_565:
+        value = pixels[..., 0].astype(numpy.uint16) | (
+            pixels[..., 1].astype(numpy.uint16) << 8
+        )
+        red = ((value >> 11) & 0x1F) * (255 / 31)
+        green = ((value >> 5) & 0x3F) * (255 / 63)
+        blue = (value & 0x1F) * (255 / 31)
+        return (0.299 * red + 0.587 * green + 0.114 * blue).astype(numpy.float32)
+    weights = numpy.array([0.299, 0.587, 0.114], numpy.float32)
+    return pixels[..., :3].astype(numpy.float32) @ weights
+
+
+def _block_means(array, tile):
+    """Mean of every `tile` x `tile` block of a 2-D array (edge blocks may be smaller)."""
+    rows = numpy.arange(0, array.shape[0], tile)
+    columns = numpy.arange(0, array.shape[1], tile)
+    sums = numpy.add.reduceat(numpy.add.reduceat(array, rows, axis=0), columns, axis=1)
+    heights = numpy.diff(numpy.append(rows, array.shape[0]))
+    widths = numpy.diff(numpy.append(columns, array.shape[1]))
+    return sums / numpy.outer(heights, widths)
+
+
+def fingerprint(frame, grid=(16, 9)):
+    """
+    A downsampled luminance signature: the mean luminance of a `grid`
+    (columns, rows) of cells, as a uint8 array. Compare two with
+    `numpy.abs(a.astype(int) - b).mean()`.
+    """
+    columns, rows = grid
+    array = luminance(frame)
+    tile_y, tile_x = -(-frame.height // rows), -(-frame.width // columns)
+    rows_at = numpy.arange(0, frame.height, tile_y)
+    columns_at = numpy.arange(0, frame.width, tile_x)
+    sums = numpy.add.reduceat(numpy.add.reduceat(array, rows_at, axis=0), columns_at, 1)
+    heights = numpy.diff(numpy.append(rows_at, frame.height))
+    widths = numpy.diff(numpy.append(columns_at, frame.width))
+    return (sums / numpy.outer(heights, widths)).round().astype(numpy.uint8)
+
+
+class FrameChange(NamedTuple):
+    frame: object
+    duplicate: bool
+    regions: list
+    changed_ratio: float
+
+
+class FrameDiffer:
+    """
+    Compare each frame with the previous one:
+
+        differ = FrameDiffer(tile=64, ignore=[(0, 0, 1080, 80)])  # status bar
+        for frame in media_manager.stream_screenshots(device):
+            change = differ.update(frame)
+            if not change.duplicate:
+                ...  # change.regions lists the (x1, y1, x2, y2) boxes that changed
+    """
+
+    def __init__(self, tile=64, tolerance=0, ignore=()):
+        """
+        :param tile: Tile size in pixels.
+        :param tolerance: Mean absolute luminance difference (0-255) a tile
+            may have and still count as unchanged; above 0 it needs numpy.
+        :param ignore: (x1, y1, x2, y2) boxes whose tiles are never reported.
+        """
+        if tolerance:
+            _require_numpy("FrameDiffer tolerance")
+        self.tile = tile
+        self.tolerance = tolerance
+        self.ignore = list(ignore)
+        self.previous = None
+        self._rows = None
+        self._tiles = None
+        self._luminance = None
+
+    def _ignored(self, row, column) -> bool:
+        x1, y1 = column * self.tile, row * self.tile
+        x2, y2 = x1 + self.tile, y1 + self.tile
+        return any(
+            x1 < bx2 and bx1 < x2 and y1 < by2 and by1 < y2
+            for bx1, by1, bx2, by2 in self.ignore
+        )
+
+    def reset(self):
+        self.previous = self._rows = self._tiles = self._luminance = None
+
+    def update(self, frame) -> FrameChange:
+        """Compare `frame` with the previous frame and make it the new reference."""
+        previous = self.previous
+        if previous is not None and (previous.width, previous.height) != (
+            frame.width,
+            frame.height,
+        ):
+            # Rotation or resolution change: start over.
+            self.reset()
+            previous = None
+        if self.tolerance:
+            return self._update_tolerant(frame, previous)
+
+        rows = row_hashes(frame)
+        if previous is None:
+            self._tiles = tile_hashes(frame, self.tile)
+        else:
+            bands = {
+                index // self.tile
+                for index, (old, new) in enumerate(zip(self._rows, rows))
+                if old != new
+            }
+            if bands:
+                tiles = tile_hashes(frame, self.tile, bands)
+                changed = [
+                    (row, column)
+                    for row in sorted(bands)
+                    for column, (old, new) in enumerate(
+                        zip(self._tiles[row], tiles[row])
+                    )
+                    if old != new
+                ]
+                for row in bands:
+                    self._tiles[row] = tiles[row]
+            else:
+                changed = []
+        self._rows = rows
+        self.previous = frame
+        if previous is None:
+            return FrameChange(frame, False, [(0, 0, frame.width, frame.height)], 1.0)
+        return self._change(frame, changed)
+
+    def _update_tolerant(self, frame, previous) -> FrameChange:
+        current = luminance(frame)
+        self.previous, before, self._luminance = frame, self._luminance, current
+        if previous is None:
+            return FrameChange(frame, False, [(0, 0, frame.width, frame.height)], 1.0)
+        means = _block_means(numpy.abs(current - before), self.tile)
+        changed = [
+            tuple(map(int, index)) for index in numpy.argwhere(means > self.tolerance)
+        ]
+        return self._change(frame, changed)
+
+    def _change(self, frame, changed) -> FrameChange:
+        changed = [tile for tile in changed if not self._ignored(*tile)]
+        total = -(-frame.width // self.tile) * -(-frame.height // self.tile)
+        regions = merge_tiles(changed, self.tile, frame.width, frame.height)
+        return FrameChange(frame, not changed, regions, len(changed) / total)
+
+
+class Match(NamedTuple):
+    x: int
+    y: int
+    width: int
+    height: int
+    score: float
+
+    @property
+    def center(self):
+        return self.x + self.width // 2, self.y + self.height // 2
+
+    @property
+    def bounds(self):
+        return self.x, self.y, self.x + self.width, self.y + self.height
+
+
+def _gray(image):
+    """Luminance of a Frame or of an (h, w) / (h, w, channels) array."""
+    if hasattr(image, "pixel_format"):
+        return luminance(image).astype(numpy.float64)
+    array = numpy.asarray(image, numpy.float64)
+    if array.ndim == 3:
+        array = array[..., :3] @ numpy.array([0.299, 0.587, 0.114])
+    return array
+
+
+def _downscale(array, factor):
+    if factor == 1:
+        return array
+    height, width = array.shape[0] // factor, array.shape[1] // factor
+    return (
+        array[: height * factor, : width * factor]
+        .reshape(height, factor, width, factor)
+        .mean(axis=(1, 3))
+    )
+
+
+def _window_sums(array, height, width):
+    table = numpy.zeros((array.shape[0] + 1, array.shape[1] + 1))
+    table[1:, 1:] = array.cumsum(0).cumsum(1)
+    return (
+        table[height:, width:]
+        - table[:-height, width:]
+        - table[height:, :-width]
+        + table[:-height, :-width]
+    )
+
+
+def match_template(image, template):
+    """
+    Normalized cross-correlation of `template` at every position of `image`
+    (2-D float arrays), in [-1, 1]. Positions are top-left corners.
+    """
+    height, width = template.shape
+    centered = template - template.mean()
+    norm = numpy.sqrt((centered**2).sum())
+    shape = (image.shape[0] + height - 1, image.shape[1] + width - 1)
+    spectrum = numpy.fft.rfft2(image, shape) * numpy.fft.rfft2(
+        centered[::-1, ::-1], shape
+    )
+    correlation = numpy.fft.irfft2(spectrum, shape)[
+        height - 1 : image.shape[0], width - 1 : image.shape[1]
+    ]
+    sums = _window_sums(image, height, width)
+    squares = _window_sums(image**2, height, width)
+    variance = numpy.maximum(squares - sums**2 / (height * width), 0)
+    denominator = numpy.sqrt(variance) * norm
+    scores = numpy.zeros_like(correlation)
+    valid = denominator > 1e-6 * max(norm, 1.0)
+    scores[valid] = correlation[valid] / denominator[valid]
+    return scores
+
+
+def locate(image, template, threshold=0.9, region=None, max_coarse=32):
+    """
+    Find the best match of `template` in `image` (Frames or arrays).
+
+    :param threshold: Minimum normalized correlation (1.0 is a perfect match).
+    :param region: Only search this (x1, y1, x2, y2) box of the image.
+    :param max_coarse: The coarse search downscales until the template's
+        shorter side is about this many pixels.
+    :return: A Match, or None when nothing scores above `threshold`.
+    """
+    _require_numpy("locate")
+    image, template = _gray(image), _gray(template)
+    left, top = 0, 0
+    if region is not None:
+        left, top, right, bottom = region
+        image = image[top:bottom, left:right]
+    height, width = template.shape
+    if height > image.shape[0] or width > image.shape[1]:
+        return None
+    factor = max(1, min(height, width) // max_coarse)
+    coarse = match_template(_downscale(image, factor), _downscale(template, factor))
+    y, x = numpy.unravel_index(numpy.argmax(coarse), coarse.shape)
+    if factor > 1:
+        # Refine around the coarse hit at full resolution.
+        y0, x0 = max(0, (y - 1) * factor), max(0, (x - 1) * factor)
+        y1 = min(image.shape[0], (y + 2) * factor + height)
+        x1 = min(image.shape[1], (x + 2) * factor + width)
+        fine = match_template(image[y0:y1, x0:x1], template)
+        dy, dx = numpy.unravel_index(numpy.argmax(fine), fine.shape)
+        y, x, score = y0 + dy, x0 + dx, fine[dy, dx]
+    else:
+        score = coarse[y, x]
+    if score < threshold:
+        return None
+    return Match(int(left + x), int(top + y), width, height, float(score))
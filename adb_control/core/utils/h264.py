@@ -0,0 +1,112 @@
+"""
+Helpers to split an H.264 Annex-B elementary stream (as written by
+`screenrecord --output-format=h264`) into NAL units and access units.
+
+NALUnitParser keeps incoming bytes in a single reusable buffer and only
+compacts it once the consumed prefix grows large, so feeding it many small
+reads does not copy the stream over and over.
+"""
+
+import time
+from typing import NamedTuple
+
+START_CODE = b"\x00\x00\x01"
+START_CODE_4 = b"\x00\x00\x00\x01"
+
+NAL_SLICE = 1
+NAL_IDR_SLICE = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+VCL_TYPES = (NAL_SLICE, NAL_IDR_SLICE)
+CONFIG_TYPES = (NAL_SPS, NAL_PPS)
+
+
+def nal_type(nal: bytes) -> int:
+    return nal[0] & 0x1F
+
+
+class AccessUnit(NamedTuple):
+    """One encoded picture: its NAL units joined back into Annex-B form."""
+
+    timestamp: float
+    keyframe: bool
+    data: bytes
+
+    @property
+    def nal_types(self) -> list:
+        return [nal_type(nal) for nal in self.data.split(START_CODE_4)[1:]]
+
+
+class NALUnitParser:
+    def __init__(self, compact_threshold=1 << 20):
+        self._buffer = bytearray()
+        self._offset = 0
+        self._compact_threshold = compact_threshold
+
+    def feed(self, data) -> list:
+        """Add stream bytes and return the NAL units completed by them."""
+        self._buffer += data
+        units = []
+        start = self._buffer.find(START_CODE, self._offset)
+        while start != -1:
+            end = self._buffer.find(START_CODE, start + 3)
+            if end == -1:
+                break
+            units.append(self._unit(start + 3, end))
+            start = end
+        if start == -1:
+            # No start code yet: keep the last bytes, they may begin one.
+            self._offset = max(self._offset, len(self._buffer) - 3)
+        else:
+            self._offset = start
+        if self._offset > self._compact_threshold:
+            del self._buffer[: self._offset]
+            self._offset = 0
+        return units
+
+    def flush(self) -> list:
+        """Return the last NAL unit once the stream has ended."""
+        start = self._buffer.find(START_CODE, self._offset)
+        units = [] if start == -1 else [self._unit(start + 3, len(self._buffer))]
+        self._buffer.clear()
+        self._offset = 0
+        return [unit for unit in units if unit]
+
+    def _unit(self, start, end) -> bytes:
+        # A 4-byte start code leaves a trailing zero on the previous unit.
+        while end > start and self._buffer[end - 1] == 0:
+            end -= 1
+        return bytes(self._buffer[start:end])
+
+
+class AccessUnitAssembler:
+    """Groups NAL units into access units (H.264 section 7.4.1.2.3)."""
+
+    def __init__(self):
+        self._units = []
+        self._has_picture = False
+
+    def push(self, nal: bytes):
+        """Add a NAL unit; returns the previous AccessUnit when this one starts a new one."""
+        kind = nal_type(nal)
+        starts_picture = kind in VCL_TYPES and len(nal) > 1 and nal[1] & 0x80
+        completed = None
+        if self._has_picture and (
+            starts_picture or kind in (NAL_AUD, NAL_SPS, NAL_PPS, NAL_SEI)
+        ):
+            completed = self._build()
+        self._units.append(nal)
+        self._has_picture = self._has_picture or kind in VCL_TYPES
+        return completed
+
+    def flush(self):
+        """Return the pending access unit, if it holds a picture."""
+        return self._build() if self._has_picture else None
+
+    def _build(self) -> AccessUnit:
+        units, self._units, self._has_picture = self._units, [], False
+        keyframe = any(nal_type(nal) == NAL_IDR_SLICE for nal in units)
+        data = b"".join(START_CODE_4 + nal for nal in units)
+        return AccessUnit(time.time(), keyframe, data)
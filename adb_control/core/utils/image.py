@@ -0,0 +1,140 @@
+"""
+Helpers to handle raw frames produced by `screencap` without a PNG round trip.
+
+`screencap` without `-p` writes a small little-endian header (width, height,
+pixel format and, since Android 9, a color space) followed by the raw pixels.
+`parse_screencap` wraps those pixels in a Frame without copying them, and
+`encode_png` turns a frame into a PNG on the host when a file is needed.
+"""
+
+import struct
+import time
+import zlib
+from typing import NamedTuple
+
+# screencap pixel formats (android.graphics.PixelFormat) and their byte sizes.
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+PIXEL_FORMAT_RGB_565 = 4
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+    PIXEL_FORMAT_RGB_565: 2,
+}
+
+
+class Frame(NamedTuple):
+    """
+    A raw screen capture.
+
+    `data` is a memoryview over the pixel rows, usable without copying, e.g.
+    `numpy.frombuffer(frame.data, numpy.uint8).reshape(frame.height, frame.width, -1)`.
+    """
+
+    timestamp: float
+    width: int
+    height: int
+    pixel_format: int
+    data: memoryview
+
+    @property
+    def bytes_per_pixel(self) -> int:
+        return BYTES_PER_PIXEL[self.pixel_format]
+
+
+def parse_screencap(payload, timestamp=None) -> Frame:
+    """
+    Wrap the output of a raw `screencap` in a Frame.
+
+    :param payload: The bytes (or bytearray) written by `screencap`.
+    :param timestamp: Capture time, defaults to now.
+    :return: A Frame whose data is a view into `payload`.
+    """
+    if len(payload) < 12:
+        raise ValueError("screencap output is too short to contain a header.")
+    width, height, pixel_format = struct.unpack_from("<III", payload)
+    if pixel_format not in BYTES_PER_PIXEL:
+        raise ValueError(f"Unsupported screencap pixel format {pixel_format}.")
+    size = width * height * BYTES_PER_PIXEL[pixel_format]
+    # Android 9+ appends a 4-byte color space to the 12-byte header.
+    header = 16 if len(payload) - 16 == size else 12
+    if len(payload) - header < size:
+        raise ValueError("screencap output is truncated.")
+    data = memoryview(payload)[header : header + size]
+    return Frame(
+        time.time() if timestamp is None else timestamp,
+        width,
+        height,
+        pixel_format,
+        data,
+    )
+
+
+def _png_chunk(kind: bytes, body: bytes) -> bytes:
+    chunk = kind + body
+    return struct.pack(">I", len(body)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+
+
+def _scale_table(shift, mask, bits) -> bytes:
+    """Translation table extracting a `bits`-wide channel and scaling it to 8 bits."""
+    table = bytearray(256)
+    for byte in range(256):
+        value = (byte >> shift) & mask
+        table[byte] = (value << (8 - bits)) | (value >> (2 * bits - 8))
+    return bytes(table)
+
+
+# RGB_565 is little-endian: the high byte holds red and the top of green,
+# the low byte the rest of green and blue.
+_RED_565 = _scale_table(3, 0x1F, 5)
+_BLUE_565 = _scale_table(0, 0x1F, 5)
+_GREEN_HIGH_565 = bytes(((b & 7) << 5) | ((b & 7) >> 1) for b in range(256))
+_GREEN_LOW_565 = bytes((b >> 5) << 2 for b in range(256))
+
+
+def _rgb_pixels(frame) -> bytes:
+    """The pixels of an RGBX_8888 or RGB_565 frame as packed RGB_888."""
+    pixels = bytearray(frame.width * frame.height * 3)
+    if frame.pixel_format == PIXEL_FORMAT_RGBX_8888:
+        for channel in range(3):
+            pixels[channel::3] = frame.data[channel::4]
+        return pixels
+    low, high = bytes(frame.data[0::2]), bytes(frame.data[1::2])
+    green = int.from_bytes(high.translate(_GREEN_HIGH_565), "little") | int.from_bytes(
+        low.translate(_GREEN_LOW_565), "little"
+    )
+    pixels[0::3] = high.translate(_RED_565)
+    pixels[1::3] = green.to_bytes(len(low), "little")
+    pixels[2::3] = low.translate(_BLUE_565)
+    return pixels
+
+
+def encode_png(frame: Frame, level=1) -> bytes:
+    """
+    Encode a frame as PNG: RGBA_8888 as RGBA, every other format as RGB
+    (the padding byte of RGBX_8888 is dropped and RGB_565 is expanded).
+
+    :param frame: The frame to encode.
+    :param level: zlib compression level; low levels keep encoding fast.
+    """
+    if frame.pixel_format == PIXEL_FORMAT_RGBA_8888:
+        color_type, data, stride = 6, frame.data, frame.width * 4
+    elif frame.pixel_format == PIXEL_FORMAT_RGB_888:
+        color_type, data, stride = 2, frame.data, frame.width * 3
+    else:
+        color_type, data, stride = 2, _rgb_pixels(frame), frame.width * 3
+    rows = bytearray()
+    for offset in range(0, stride * frame.height, stride):
+        rows += b"\x00"
+        rows += data[offset : offset + stride]
+    header = struct.pack(">IIBBBBB", frame.width, frame.height, 8, color_type, 0, 0, 0)
+    return b"".join(
+        [
+            b"\x89PNG\r\n\x1a\n",
+            _png_chunk(b"IHDR", header),
+            _png_chunk(b"IDAT", zlib.compress(bytes(rows), level)),
+            _png_chunk(b"IEND", b""),
+        ]
+    )
@@ -4,11 +4,17 @@ This module contains parameters for the adb_control application.
 Attributes:
     ENCODING (str): The encoding used for adb communication. Default is 'ISO-8859-1'.
     DEFAULT_PORT (int): The default port used for adb communication. Default is 5555.
+    ADB_SERVER_HOST (str): The host the adb server listens on. Default is '127.0.0.1'.
+    ADB_SERVER_PORT (int): The port the adb server listens on. Default is 5037.
 
 The ENCODING parameter is used to specify the character encoding for adb communication.
 The DEFAULT_PORT parameter specifies the default port number for adb communication.
+The ADB_SERVER_HOST and ADB_SERVER_PORT parameters locate the adb server used by the
+socket transport.
 """
 
 ENCODING = "ISO-8859-1"
 DEFAULT_PORT = 5555
 ADB_PATH = "adb.exe"
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = 5037
@@ -0,0 +1,377 @@
+"""
+An in-memory model of a uiautomator hierarchy and a small selector language.
+
+UITree keeps the node tree (with integer bounds) plus hash indexes by
+resource-id, text, class and content-desc. Selectors are an XPath subset,
+compiled once and cached:
+
+    //Button[@text="OK"]                     class name (short or full) or *
+    //*[@resource-id="com.app:id/list"]//*[contains(@text, "Item")]
+    /hierarchy/node/node[2]                  child steps, 1-based positions
+    //*[matches(@content-desc, "^Photo \\d+$")]
+    //*[starts-with(@text, "Sign") and @enabled="true"]
+    //*[@text="Delete"][ancestor::*[@resource-id="com.app:id/toolbar"]]
+    //*[.//*[@text="Wi-Fi"] and not(@checked="true")]
+
+Positions apply to the result of their step, like `(//step)[n]`. Steps of
+the form `//name[@attr="value"]` on an indexed attribute start from the index
+instead of walking the tree.
+"""
+
+import functools
+import re
+
+_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"[^"]*"|'[^']*')
+        |(?P<number>\d+)
+        |(?P<op>//|::|!=|[/\[\]()@=,.])
+        |(?P<name>[A-Za-z_*$][\w.$*-]*)
+    )""",
+    re.VERBOSE,
+)
+_INDEXED = {
+    "resource-id": "by_resource_id",
+    "text": "by_text",
+    "class": "by_class",
+    "content-desc": "by_content_desc",
+}
+
+
+def parse_bounds(bounds: str):
+    """Parse "[x1,y1][x2,y2]" into (x1, y1, x2, y2), or None."""
+    match = _BOUNDS.fullmatch(bounds or "")
+    return tuple(int(value) for value in match.groups()) if match else None
+
+
+class UINode:
+    __slots__ = (
+        "tag",
+        "attrib",
+        "bounds",
+        "parent",
+        "children",
+        "order",
+    )
+
+    def __init__(self, tag, attrib, parent=None, order=0):
+        self.tag = tag
+        self.attrib = attrib
+        self.bounds = parse_bounds(attrib.get("bounds"))
+        self.parent = parent
+        self.children = []
+        self.order = order
+
+    def get(self, name, default=""):
+        return self.attrib.get(name, default)
+
+    @property
+    def text(self) -> str:
+        return self.attrib.get("text", "")
+
+    @property
+    def resource_id(self) -> str:
+        return self.attrib.get("resource-id", "")
+
+    @property
+    def class_name(self) -> str:
+        return self.attrib.get("class", "")
+
+    @property
+    def content_desc(self) -> str:
+        return self.attrib.get("content-desc", "")
+
+    @property
+    def center(self):
+        if self.bounds is None:
+            return None
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+    def ancestors(self):
+        node = self.parent
+        while node is not None:
+            yield node
+            node = node.parent
+
+    def descendants(self):
+        stack = list(reversed(self.children))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+
+    def to_dict(self) -> dict:
+        """The element dict returned by UIExtractor."""
+        return {
+            "text": self.text,
+            "resource_id": self.resource_id,
+            "package": self.get("package"),
+            "class": self.class_name,
+            "content_desc": self.content_desc,
+            "bounds": self.get("bounds"),
+        }
+
+    def __repr__(self):
+        return f"<UINode {self.class_name or self.tag} {self.bounds}>"
+
+
+class UITree:
+    """A parsed hierarchy. Build it with `start`/`end` as XML events arrive."""
+
+    def __init__(self):
+        self.root = None
+        self.nodes = []
+        self.by_resource_id = {}
+        self.by_text = {}
+        self.by_class = {}
+        self.by_content_desc = {}
+        self._open = []
+        self._count = 0
+
+    def start(self, tag, attrib) -> UINode:
+        parent = self._open[-1] if self._open else None
+        node = UINode(tag, dict(attrib), parent, self._count)
+        self._count += 1
+        if parent is None:
+            self.root = node
+        else:
+            parent.children.append(node)
+        self._open.append(node)
+        if tag == "node":
+            self.nodes.append(node)
+            for attribute, index in _INDEXED.items():
+                value = node.attrib.get(attribute)
+                if value:
+                    getattr(self, index).setdefault(value, []).append(node)
+        return node
+
+    def end(self):
+        self._open.pop()
+
+    def select(self, selector) -> list:
+        """Return the nodes matching a selector string, in document order."""
+        return compile_selector(selector)(self)
+
+    def select_one(self, selector):
+        matches = self.select(selector)
+        return matches[0] if matches else None
+
+
+class _Step:
+    __slots__ = ("axis", "name", "predicates", "position", "hint")
+
+    def __init__(self, axis, name):
+        self.axis = axis
+        self.name = name
+        self.predicates = []
+        self.position = None
+        self.hint = None
+
+    def matches_name(self, node) -> bool:
+        if self.name in ("*", node.tag):
+            return True
+        class_name = node.attrib.get("class", "")
+        return self.name == class_name or class_name.endswith("." + self.name)
+
+    def matches(self, node) -> bool:
+        return self.matches_name(node) and all(test(node) for test in self.predicates)
+
+
+class _Parser:
+    def __init__(self, selector):
+        self.selector = selector
+        self.tokens = []
+        position = 0
+        selector = selector.strip()
+        while position < len(selector):
+            match = _TOKEN.match(selector, position)
+            if not match or match.end() == position:
+                raise ValueError(f"Invalid selector at {position}: {selector!r}")
+            kind = match.lastgroup
+            self.tokens.append((kind, match.group(kind)))
+            position = match.end()
+        self.index = 0
+
+    def peek(self, value=None):
+        if self.index >= len(self.tokens):
+            return None
+        token = self.tokens[self.index]
+        return token if value is None or token[1] == value else None
+
+    def take(self, value=None, kind=None):
+        token = self.peek()
+        if (
+            token is None
+            or (value and token[1] != value)
+            or (kind and token[0] != kind)
+        ):
+            expected = value or kind or "more input"
+            raise ValueError(f"Expected {expected} in selector {self.selector!r}")
+        self.index += 1
+        return token[1]
+
+    def path(self, relative=False) -> list:
+        steps = []
+        if relative:
+            self.take(".")
+        axis = self.take("//") if self.peek("//") else self.take("/")
+        while True:
+            steps.append(self.step("descendant" if axis == "//" else "child"))
+            if self.peek("//") or self.peek("/"):
+                axis = self.take()
+            else:
+                return steps
+
+    def step(self, axis) -> _Step:
+        step = _Step(axis, self.take(kind="name"))
+        while self.peek("["):
+            self.take("[")
+            if self.peek() and self.peek()[0] == "number":
+                step.position = int(self.take())
+            else:
+                test = self.expression()
+                step.predicates.append(test)
+                hint = getattr(test, "hint", None)
+                if hint and hint[0] in _INDEXED and step.hint is None:
+                    step.hint = hint
+            self.take("]")
+        return step
+
+    def expression(self):
+        tests = [self.conjunction()]
+        while self.peek("or"):
+            self.take()
+            tests.append(self.conjunction())
+        if len(tests) == 1:
+            return tests[0]
+        return lambda node: any(test(node) for test in tests)
+
+    def conjunction(self):
+        tests = [self.term()]
+        while self.peek("and"):
+            self.take()
+            tests.append(self.term())
+        if len(tests) == 1:
+            return tests[0]
+
+        def test(node):
+            return all(check(node) for check in tests)
+
+        test.hint = next((t.hint for t in tests if getattr(t, "hint", None)), None)
+        return test
+
+    def string(self) -> str:
+        return self.take(kind="string")[1:-1]
+
+    def term(self):
+        token = self.peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of selector {self.selector!r}")
+        if token[1] == "(":
+            self.take()
+            test = self.expression()
+            self.take(")")
+            return test
+        if token[1] == "@":
+            self.take()
+            attribute = self.take(kind="name")
+            if self.peek("=") or self.peek("!="):
+                operator = self.take()
+                value = self.string()
+                if operator == "!=":
+                    return lambda node: node.attrib.get(attribute, "") != value
+
+                def test(node):
+                    return node.attrib.get(attribute, "") == value
+
+                # The indexes hold non-empty values only; an empty value also
+                # matches nodes without the attribute.
+                if value:
+                    test.hint = (attribute, value)
+                return test
+            return lambda node: attribute in node.attrib
+        if token[1] == ".":
+            steps = self.path(relative=True)
+            return lambda node: bool(_evaluate(steps, [node]))
+        name = self.take(kind="name")
+        if name == "ancestor" and self.peek("::"):
+            self.take()
+            step = self.step("self")
+            return lambda node: any(step.matches(a) for a in node.ancestors())
+        self.take("(")
+        if name == "not":
+            inner = self.expression()
+            self.take(")")
+            return lambda node: not inner(node)
+        self.take("@")
+        attribute = self.take(kind="name")
+        self.take(",")
+        value = self.string()
+        self.take(")")
+        if name == "contains":
+            return lambda node: value in node.attrib.get(attribute, "")
+        if name == "starts-with":
+            return lambda node: node.attrib.get(attribute, "").startswith(value)
+        if name == "ends-with":
+            return lambda node: node.attrib.get(attribute, "").endswith(value)
+        if name == "matches":
+            pattern = re.compile(value)
+            return lambda node: bool(pattern.search(node.attrib.get(attribute, "")))
+        raise ValueError(f"Unknown selector function {name}()")
+
+
+def _evaluate(steps, context, tree=None) -> list:
+    """
+    Apply steps to a list of context nodes (None stands for the document).
+    """
+    for step in steps:
+        found = {}
+        if step.axis == "descendant" and step.hint and tree is not None:
+            attribute, value = step.hint
+            candidates = getattr(tree, _INDEXED[attribute]).get(value, ())
+            if None in context:
+                scope = candidates
+            else:
+                context_ids = {id(node) for node in context}
+                scope = [
+                    node
+                    for node in candidates
+                    if any(id(a) in context_ids for a in node.ancestors())
+                ]
+            for node in scope:
+                if step.matches(node):
+                    found[id(node)] = node
+        else:
+            for parent in context:
+                if parent is None:
+                    if tree is None or tree.root is None:
+                        continue
+                    nodes = [tree.root]
+                    if step.axis == "descendant":
+                        nodes += list(tree.root.descendants())
+                elif step.axis == "descendant":
+                    nodes = parent.descendants()
+                else:
+                    nodes = parent.children
+                for node in nodes:
+                    if id(node) not in found and step.matches(node):
+                        found[id(node)] = node
+        nodes = sorted(found.values(), key=lambda node: node.order)
+        if step.position is not None:
+            nodes = nodes[step.position - 1 : step.position]
+        context = nodes
+        if not context:
+            break
+    return context
+
+
+@functools.lru_cache(maxsize=256)
+def compile_selector(selector: str):
+    """Compile a selector into a function taking a UITree and returning nodes."""
+    parser = _Parser(selector)
+    steps = parser.path()
+    if parser.peek() is not None:
+        raise ValueError(f"Unexpected {parser.peek()[1]!r} in selector {selector!r}")
+    return lambda tree: _evaluate(steps, [None], tree)
@@ -0,0 +1,176 @@
+"""
+Benchmarks of the managers' hot paths against the fake adb server.
+
+    python -m benchmarks.bench_managers [--devices 1 10 100] [--iterations 20]
+        [--latency 2] [--only tap find_element]
+
+Every benchmark makes `iterations` calls per simulated device, with all
+devices running at once (one thread each, as DeviceFleet does). The fake
+server answers with canned `getprop`, `pm list packages`, `uiautomator dump`
+and screencap output, each delayed by `--latency` milliseconds to stand in
+for the device. For each benchmark the harness reports the throughput over
+all devices and the p50/p99 latency of a single call.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from adb_control.core.app_manager import AppManager
+from adb_control.core.device_manager import DeviceManager
+from adb_control.core.input_manager import InputManager
+from adb_control.core.media_manger import MediaManager
+from adb_control.core.transport import SocketTransport
+from adb_control.core.uiautomator_manager import UIExtractor
+from tests.fake_adb import FakeADBServer
+
+BENCHMARKS = (
+    "tap",
+    "take_screenshot",
+    "find_element",
+    "installed_package",
+    "list_devices",
+)
+
+
+def canned_responses(packages=300, nodes=200, screenshot_size=64 * 1024) -> dict:
+    """Device output for the benchmarked commands, sized like a real phone's."""
+    listing = b"".join(
+        b"package:/data/app/com.example.app%d-1/base.apk=com.example.app%d "
+        b"versionCode:%d uid:%d\n" % (i, i, i, 10000 + i)
+        for i in range(packages)
+    )
+    dump = (
+        b"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+        b'<hierarchy rotation="0"><node index="0" text="" resource-id="" '
+        b'class="android.widget.FrameLayout" package="com.example" '
+        b'content-desc="" bounds="[0,0][1080,2340]">'
+        + b"".join(
+            b'<node index="%d" text="Item %d" resource-id="com.example:id/title_%d" '
+            b'class="android.widget.TextView" package="com.example" '
+            b'content-desc="" bounds="[0,%d][1080,%d]" />'
+            % (i, i, i, i * 10, i * 10 + 10)
+            for i in range(nodes)
+        )
+        + b"</node></hierarchy>UI hierchary dumped to: /dev/tty\n"
+    )
+    png = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * (screenshot_size // 256)
+    return {
+        "getprop ro.serialno": b"BENCH\n",
+        "pm list packages -f -U --show-versioncode": listing,
+        "uiautomator dump /dev/tty": dump,
+        "screencap -p": png,
+    }
+
+
+def operations(transport, workdir) -> dict:
+    """The benchmarked calls, each taking the serial of the device to use."""
+    inputs = InputManager(transport=transport)
+    media = MediaManager(transport=transport)
+    ui = UIExtractor(transport=transport)
+    # No inventory cache, so every call reaches the device.
+    apps = AppManager(transport=transport, inventory_ttl=0)
+    devices = DeviceManager(transport=transport)
+    return {
+        "tap": lambda serial: inputs.tap(540, 1200, device=serial),
+        "take_screenshot": lambda serial: media.take_screenshot(
+            os.path.join(workdir, f"{serial}.png"), device=serial
+        ),
+        "find_element": lambda serial: ui.find_element(
+            "com.example:id/title_150", device=serial
+        ),
+        "installed_package": lambda serial: apps.installed_package(
+            serial, ["com.example.app150"]
+        ),
+        "list_devices": lambda serial: devices.list_devices(),
+    }
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a sorted list."""
+    index = max(0, round(percent / 100 * len(values)) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def run_benchmark(operation, serials, iterations) -> dict:
+    """Run `operation` on every serial concurrently and summarize the timings."""
+    latencies, errors = [], []
+    barrier = threading.Barrier(len(serials) + 1)
+
+    def worker(serial):
+        timings = []
+        barrier.wait()
+        try:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                result = operation(serial)
+                timings.append(time.perf_counter() - start)
+                if isinstance(result, dict) and result.get("status") == "error":
+                    raise RuntimeError(result["message"])
+        except Exception as e:
+            errors.append(e)
+        latencies.extend(timings)
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in serials]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "ops_per_second": len(latencies) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def main(argv=None) -> list:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument(
+        "--latency", type=float, default=2.0, help="Device latency in milliseconds."
+    )
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = []
+    if not args.quiet:
+        print(
+            f"{'benchmark':<20}{'devices':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+    for count in args.devices:
+        serials = [f"emulator-{5554 + 2 * i}" for i in range(count)]
+        server = FakeADBServer(
+            devices=dict.fromkeys(serials, "device"),
+            responses=canned_responses(),
+            latency=args.latency / 1000,
+        )
+        with server, tempfile.TemporaryDirectory() as workdir:
+            transport = SocketTransport(port=server.port)
+            calls = operations(transport, workdir)
+            for name in args.only:
+                row = {"benchmark": name, "devices": count}
+                row.update(run_benchmark(calls[name], serials, args.iterations))
+                rows.append(row)
+                if not args.quiet:
+                    print(
+                        f"{name:<20}{count:>8}{row['ops_per_second']:>12.1f}"
+                        f"{row['p50'] * 1000:>10.2f}{row['p99'] * 1000:>10.2f}"
+                    )
+            transport.close_sessions()
+    return rows
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
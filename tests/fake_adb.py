@@ -0,0 +1,343 @@
+"""
+A local stand-in for the adb server, used to test the socket transport.
+
+The fake speaks enough of the ADB host protocol to answer host services
+(`host:devices`, `host:version`, `host:connect:`...) and device services
+(`shell:`, `exec:`). Device output is looked up in `responses`, a mapping from
+the command string to bytes or to a callable taking (device, command);
+commands missing from it are passed to `fallback`, a callable taking
+(device, command), when one is set. Either may also give a
+(stdout, stderr, exit code) tuple.
+
+Devices advertise `features` (`host-serial:<serial>:features`); with
+`shell_v2` among them, `shell,v2,raw:` answers in shell v2 packets, otherwise
+the sentinel appended to legacy `shell:` and `exec:` commands is honoured.
+
+`shell:sh` opens an interactive session that understands the sentinel framing
+used by ShellSession; every command it runs is recorded in `session_commands`.
+
+`sync:` serves STAT/LIST/SEND/RECV against `files`, a mapping from remote path
+to (data, mode, mtime). Directories are implied by the paths of their files;
+their mtime is the newest mtime of the files directly inside them.
+
+`host:track-devices-l` sends the device list, then a new one whenever
+`devices` changes, until the client or the server goes away.
+
+`host:connect:` adds the target to `devices` unless it is in `unreachable`;
+`host:disconnect:` removes it.
+
+Commands streaming `-S <size> ... -` from stdin (`cmd package install-write`)
+have their input read and stored in `stdin`.
+"""
+
+import re
+import shlex
+import socket
+import socketserver
+import stat
+import struct
+import threading
+import time
+
+_SESSION_LINE = re.compile(
+    rb"\( eval (.*) \) </dev/null 2>&1; printf '\\036%d %d\\036\\n' (\d+) \$\?"
+)
+
+_SENTINEL_COMMAND = re.compile(
+    r"\( eval (.*) \); printf '\\036%d %d\\036\\n' 0 \$\?", re.DOTALL
+)
+
+_STDIN_SIZE = re.compile(r" -S (\d+) .* -$")
+
+
+def _stat(files, path):
+    """Return (mode, size, mtime) of a fake remote path, all zero if missing."""
+    if path in files:
+        data, mode, mtime = files[path]
+        return stat.S_IFREG | mode, len(data), mtime
+    prefix = path.rstrip("/") + "/"
+    inside = [name for name in files if name.startswith(prefix)]
+    if path == "/" or inside:
+        mtimes = [files[name][2] for name in inside if "/" not in name[len(prefix) :]]
+        return stat.S_IFDIR | 0o771, 4096, max(mtimes, default=0)
+    return 0, 0, 0
+
+
+def _devices_l(server, devices) -> bytes:
+    lines = []
+    for serial, state in devices.items():
+        transport_id = server.transport_ids.setdefault(
+            serial, len(server.transport_ids) + 1
+        )
+        lines.append(
+            f"{serial}\t{state} model:Fake_Phone transport_id:{transport_id}\n"
+        )
+    return "".join(lines).encode()
+
+
+def _length_prefixed(data: bytes) -> bytes:
+    return b"%04x" % len(data) + data
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def _read_request(self):
+        header = self._recv_exactly(4)
+        if header is None:
+            return None
+        body = self._recv_exactly(int(header, 16))
+        return body.decode("ISO-8859-1") if body is not None else None
+
+    def _recv_exactly(self, size):
+        buffer = b""
+        while len(buffer) < size:
+            chunk = self.request.recv(size - len(buffer))
+            if not chunk:
+                return None
+            buffer += chunk
+        return buffer
+
+    def _output(self, device, command):
+        if self.server.fake.latency:
+            time.sleep(self.server.fake.latency)
+        fake = self.server.fake
+        output = fake.responses.get(command, fake.fallback or b"")
+        if callable(output):
+            output = output(device, command)
+        if isinstance(output, tuple):
+            return output
+        return output, b"", 0
+
+    def _shell_v2(self, device, command):
+        self.request.sendall(b"OKAY")
+        # The client closes the command's stdin first.
+        self._recv_exactly(5)
+        stdout, stderr, returncode = self._output(device, command)
+        packets = b""
+        for kind, data in ((1, stdout), (2, stderr)):
+            if data:
+                packets += struct.pack("<BI", kind, len(data)) + data
+        packets += struct.pack("<BIB", 3, 1, returncode)
+        self.request.sendall(packets)
+
+    def _interactive_shell(self, device):
+        self.request.sendall(b"OKAY")
+        pending = b""
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            pending += chunk
+            *lines, pending = pending.split(b"\n")
+            replies = []
+            for line in lines:
+                match = _SESSION_LINE.fullmatch(line)
+                command = shlex.split(match.group(1).decode())[0]
+                self.server.fake.session_commands.append((device, command))
+                stdout, stderr, returncode = self._output(device, command)
+                replies.append(
+                    stdout + stderr + b"\x1e%s %d\x1e\n" % (match.group(2), returncode)
+                )
+            self.request.sendall(b"".join(replies))
+
+    def _sync(self):
+        files = self.server.fake.files
+        self.request.sendall(b"OKAY")
+        while True:
+            header = self._recv_exactly(8)
+            if header is None:
+                return
+            kind, length = struct.unpack("<4sI", header)
+            if kind == b"QUIT":
+                return
+            path = self._recv_exactly(length).decode()
+            self.server.fake.sync_requests.append((kind.decode(), path))
+            if kind == b"STAT":
+                self.request.sendall(b"STAT" + struct.pack("<III", *_stat(files, path)))
+            elif kind == b"LIST":
+                prefix = path.rstrip("/") + "/"
+                names = {
+                    name[len(prefix) :].split("/")[0]
+                    for name in files
+                    if name.startswith(prefix)
+                }
+                for name in sorted(names):
+                    mode, size, mtime = _stat(files, prefix + name)
+                    encoded = name.encode()
+                    self.request.sendall(
+                        b"DENT"
+                        + struct.pack("<IIII", mode, size, mtime, len(encoded))
+                        + encoded
+                    )
+                self.request.sendall(b"DONE" + bytes(16))
+            elif kind == b"SEND":
+                remote, mode = path.rsplit(",", 1)
+                data = b""
+                while True:
+                    kind, length = struct.unpack("<4sI", self._recv_exactly(8))
+                    if kind == b"DONE":
+                        break
+                    data += self._recv_exactly(length)
+                files[remote] = (data, stat.S_IMODE(int(mode)), length)
+                self.request.sendall(b"OKAY" + bytes(4))
+            elif kind == b"RECV":
+                if path not in files:
+                    message = b"No such file or directory"
+                    self.request.sendall(b"FAIL" + struct.pack("<I", len(message)))
+                    self.request.sendall(message)
+                    return
+                data = files[path][0]
+                for offset in range(0, len(data), 65536):
+                    chunk = data[offset : offset + 65536]
+                    self.request.sendall(
+                        b"DATA" + struct.pack("<I", len(chunk)) + chunk
+                    )
+                self.request.sendall(b"DONE" + bytes(4))
+
+    def _track_devices(self):
+        server, sent = self.server.fake, None
+        self.request.sendall(b"OKAY")
+        while not server.stopped.is_set():
+            current = dict(server.devices)
+            if current != sent:
+                try:
+                    self.request.sendall(_length_prefixed(_devices_l(server, current)))
+                except OSError:
+                    return
+                sent = current
+            server.stopped.wait(0.02)
+
+    def _fail(self, message):
+        self.request.sendall(b"FAIL" + _length_prefixed(message.encode()))
+
+    def setup(self):
+        # Replies are written piecemeal; don't let Nagle delay them.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        server = self.server.fake
+        device = None
+        while True:
+            service = self._read_request()
+            if service is None:
+                return
+            server.requests.append((device, service))
+
+            if service.startswith("host:transport:"):
+                serial = service[len("host:transport:") :]
+                if server.devices.get(serial) != "device":
+                    return self._fail(f"device '{serial}' not found")
+                device = serial
+                self.request.sendall(b"OKAY")
+            elif service == "host:transport-any":
+                online = [s for s, state in server.devices.items() if state == "device"]
+                if not online:
+                    return self._fail("no devices/emulators found")
+                device = online[0]
+                self.request.sendall(b"OKAY")
+            elif service == "host:devices":
+                listing = "".join(
+                    f"{serial}\t{state}\n" for serial, state in server.devices.items()
+                )
+                self.request.sendall(b"OKAY" + _length_prefixed(listing.encode()))
+            elif service == "host:devices-l":
+                listing = _devices_l(server, server.devices)
+                self.request.sendall(b"OKAY" + _length_prefixed(listing))
+            elif service == "host:track-devices-l":
+                return self._track_devices()
+            elif service.endswith(":features") and service.startswith("host"):
+                features = server.features.encode()
+                self.request.sendall(b"OKAY" + _length_prefixed(features))
+            elif service == "host:version":
+                self.request.sendall(b"OKAY" + _length_prefixed(b"0029"))
+            elif service == "host:kill":
+                self.request.sendall(b"OKAY")
+                return
+            elif service.startswith("host:connect:"):
+                target = service[len("host:connect:") :]
+                if target in server.unreachable:
+                    message = f"failed to connect to {target}".encode()
+                else:
+                    server.devices.setdefault(target, "device")
+                    message = f"connected to {target}".encode()
+                self.request.sendall(b"OKAY" + _length_prefixed(message))
+            elif service.startswith("host:disconnect:"):
+                target = service[len("host:disconnect:") :]
+                server.devices.pop(target, None)
+                message = f"disconnected {target or 'everything'}".encode()
+                self.request.sendall(b"OKAY" + _length_prefixed(message))
+            elif service == "sync:" and device:
+                return self._sync()
+            elif service == "shell:sh" and device:
+                return self._interactive_shell(device)
+            elif service.startswith("shell,v2,raw:") and device:
+                if "shell_v2" not in server.features.split(","):
+                    return self._fail("closed")
+                return self._shell_v2(device, service.split(":", 1)[1])
+            elif service.startswith(("shell:", "exec:")) and device:
+                command = service.split(":", 1)[1]
+                self.request.sendall(b"OKAY")
+                size = _STDIN_SIZE.search(command)
+                if size:
+                    server.stdin[command] = self._recv_exactly(int(size.group(1)))
+                wrapped = _SENTINEL_COMMAND.fullmatch(command)
+                if wrapped:
+                    command = shlex.split(wrapped.group(1))[0]
+                stdout, stderr, returncode = self._output(device, command)
+                if wrapped:
+                    stderr += b"\x1e0 %d\x1e\n" % returncode
+                self.request.sendall(stdout + stderr)
+                return
+            else:
+                return self._fail(f"unknown service {service}")
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Room for a burst of connections from many simulated devices.
+    request_queue_size = 256
+
+
+class FakeADBServer:
+    def __init__(self, devices=None, responses=None, latency=0.0):
+        """
+        :param latency: Seconds each device command takes to answer, to
+            simulate the device's round trip.
+        """
+        self.latency = latency
+        self.devices = {"emulator-5554": "device"} if devices is None else devices
+        self.responses = responses or {}
+        self.fallback = None
+        self.requests = []
+        self.session_commands = []
+        self.files = {}
+        self.sync_requests = []
+        self.stdin = {}
+        self.unreachable = set()
+        self.features = "shell_v2,cmd,stat_v2"
+        self.transport_ids = {}
+        self.stopped = threading.Event()
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, args=(0.05,), daemon=True
+        )
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from adb_control.aio import (
+    AsyncADBBase,
+    AsyncAppManager,
+    AsyncDeviceManager,
+    AsyncInputManager,
+    AsyncMediaManager,
+    AsyncSocketTransport,
+)
+from tests.fake_adb import FakeADBServer
+
+
+@pytest.fixture
+def adb_server():
+    devices = {"emulator-5554": "device", "emulator-5556": "device"}
+    with FakeADBServer(devices=devices) as server:
+        yield server
+
+
+def test_list_devices(adb_server):
+    manager = AsyncDeviceManager(transport=AsyncSocketTransport(port=adb_server.port))
+    devices = asyncio.run(manager.list_devices())
+    assert devices == ["emulator-5554", "emulator-5556"]
+
+
+def test_concurrent_screenshots(adb_server):
+    adb_server.responses["screencap -p"] = lambda device, _: device.encode()
+    manager = AsyncMediaManager(transport=AsyncSocketTransport(port=adb_server.port))
+
+    async def capture_all():
+        return await asyncio.gather(
+            manager.screenshot_bytes("emulator-5554"),
+            manager.screenshot_bytes("emulator-5556"),
+        )
+
+    assert asyncio.run(capture_all()) == [b"emulator-5554", b"emulator-5556"]
+
+
+def test_batch_is_one_shell_call(adb_server):
+    manager = AsyncInputManager(transport=AsyncSocketTransport(port=adb_server.port))
+    commands = ["input tap 1 2", "input keyevent 66"]
+    asyncio.run(manager.batch(commands, device="emulator-5554"))
+    assert adb_server.requests[-1] == (
+        "emulator-5554",
+        "shell,v2,raw:input tap 1 2 ; input keyevent 66",
+    )
+
+
+@pytest.mark.parametrize("features", ["shell_v2", ""])
+def test_failing_shell_command_returns_its_exit_code(adb_server, features):
+    adb_server.features = features
+    adb_server.responses["false"] = (b"", b"", 1)
+    manager = AsyncADBBase(transport=AsyncSocketTransport(port=adb_server.port))
+    result = asyncio.run(manager.run_command("-s emulator-5554 shell false"))
+    assert result.returncode == 1
+
+
+def test_executable_fallback_gets_arguments_without_a_host_shell(tmp_path):
+    adb = tmp_path / "adb"
+    adb.write_text("#!/bin/sh\nprintf '%s\\n' \"$@\"\n")
+    adb.chmod(0o755)
+    manager = AsyncADBBase(adb_path=str(adb), transport=False)
+    result = asyncio.run(manager.run_command("shell 'input text \"a b\"' *"))
+    assert result.stdout.decode().splitlines() == ["shell", 'input text "a b"', "*"]
+
+
+def test_timeout_kills_subprocess():
+    manager = AsyncADBBase(adb_path="sleep", transport=False)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(manager.run_command("5", timeout=0.1))
+
+
+def test_installed_package_strips_the_package_prefix(adb_server):
+    adb_server.responses["pm list packages -f -U --show-versioncode"] = (
+        b"package:/data/app/base.apk=com.foo versionCode:7 uid:10101\n"
+        b"package:/system/app/b.apk=com.bar versionCode:1 uid:1000\n"
+    )
+    manager = AsyncAppManager(transport=AsyncSocketTransport(port=adb_server.port))
+    result = asyncio.run(
+        manager.installed_package("emulator-5554", ["com.foo", "com.missing"])
+    )
+    assert result["packages"] == ["com.foo"]
+    assert result["info"]["com.foo"].version_code == 7
+    listed = asyncio.run(manager.list_installed_packages("emulator-5554", timeout=5))
+    assert listed["packages"] == ["com.bar", "com.foo"]
@@ -0,0 +1,173 @@
+import hashlib
+import struct
+import zipfile
+
+import pytest
+from adb_control.core import app_manager
+from adb_control.core.app_manager import AppManager
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.apk import read_manifest
+from tests.fake_adb import FakeADBServer
+
+PACKAGE = "com.example.app"
+REMOTE_APK = f"/data/app/{PACKAGE}-1/base.apk"
+
+
+def _binary_manifest(package, version_code):
+    """Build a minimal binary AndroidManifest.xml with a <manifest> element."""
+    strings = ["versionCode", "manifest", "package", package]
+    offsets, data = [], b""
+    for string in strings:
+        offsets.append(len(data))
+        data += struct.pack("<H", len(string)) + string.encode("utf-16-le") + b"\0\0"
+    data += b"\0" * (-len(data) % 4)
+    header = 28 + 4 * len(strings)
+    pool = struct.pack(
+        "<HHIIIIII", 0x0001, 28, header + len(data), len(strings), 0, 0, header, 0
+    )
+    pool += struct.pack(f"<{len(strings)}I", *offsets) + data
+    resources = struct.pack("<HHII", 0x0180, 8, 12, 0x0101021B)
+    attributes = struct.pack(
+        "<IIIHBBI", 0xFFFFFFFF, 0, 0xFFFFFFFF, 8, 0, 0x10, version_code
+    )
+    attributes += struct.pack("<IIIHBBI", 0xFFFFFFFF, 2, 3, 8, 0, 0x03, 3)
+    element = struct.pack("<IIHHHHHH", 0xFFFFFFFF, 1, 20, 20, 2, 0, 0, 0) + attributes
+    element = (
+        struct.pack("<HHIII", 0x0102, 16, 16 + len(element), 1, 0xFFFFFFFF) + element
+    )
+    body = pool + resources + element
+    return struct.pack("<HHI", 0x0003, 8, 8 + len(body)) + body
+
+
+@pytest.fixture
+def apk(tmp_path):
+    path = tmp_path / "app.apk"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("AndroidManifest.xml", _binary_manifest(PACKAGE, 42))
+        archive.writestr("classes.dex", b"dex\n035")
+    return path
+
+
+def test_read_manifest(apk):
+    assert read_manifest(str(apk)) == {"package": PACKAGE, "version_code": 42}
+
+
+def test_install_streams_then_skips_unchanged(apk):
+    digest = hashlib.sha256(apk.read_bytes()).hexdigest()
+    installed = {}
+    path_command = f"echo '#{PACKAGE}'; pm path {PACKAGE}"
+    responses = {
+        path_command: lambda device, command: (
+            f"#{PACKAGE}\npackage:{REMOTE_APK}\n" if installed else f"#{PACKAGE}\n"
+        ).encode(),
+        f"sha256sum {REMOTE_APK}": f"{digest}  {REMOTE_APK}\n".encode(),
+        "cmd package install-create -r": b"Success: created install session [7]\n",
+        "cmd package install-commit 7": lambda device, command: (
+            installed.setdefault(device, True) and b"Success\n"
+        ),
+    }
+    write = f"cmd package install-write -S {apk.stat().st_size} 7 0_app.apk -"
+    responses[write] = b"Success: streamed bytes\n"
+    with FakeADBServer(responses=responses) as server:
+        manager = AppManager(transport=SocketTransport(port=server.port))
+        result = manager.install_package(str(apk), device="emulator-5554")
+        assert result == {
+            "status": "success",
+            "message": f"Package {apk} installed.",
+            "skipped": False,
+        }
+        assert server.stdin[write] == apk.read_bytes()
+
+        for _ in range(2):
+            result = manager.install_package(str(apk), device="emulator-5554")
+            assert result["skipped"] is True
+        hashes = [s for _, s in server.requests if "sha256sum" in s]
+        assert len(hashes) == 1
+
+
+def test_package_index_is_cached_and_invalidated():
+    listing = (
+        b"package:/data/app/com.foo-1/base.apk=com.foo versionCode:12 uid:10100\n"
+        b"package:/system/app/Bar/Bar.apk=com.bar versionCode:1 uid:1000\n"
+    )
+    responses = {"pm list packages -f -U --show-versioncode": listing}
+    with FakeADBServer(responses=responses) as server:
+        manager = AppManager(transport=SocketTransport(port=server.port))
+        result = manager.installed_package(package_name=["com.foo", "com.baz"])
+        assert result["packages"] == ["com.foo"]
+        assert result["info"]["com.foo"].version_code == 12
+        assert manager.list_installed_packages()["packages"] == ["com.bar", "com.foo"]
+        assert [s for _, s in server.requests if ":" in s and "host" not in s] == [
+            "shell,v2,raw:pm list packages -f -U --show-versioncode"
+        ]
+
+        manager.uninstall_package("com.foo")
+        manager.installed_package(package_name="com.foo")
+        listings = [s for _, s in server.requests if "pm list packages" in s]
+        assert len(listings) == 2
+
+
+def _apk_file(path, package):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("AndroidManifest.xml", _binary_manifest(package, 1))
+    return str(path)
+
+
+def _installer(multi_package=True):
+    """Answer installer session commands; sessions are numbered from 10."""
+    sessions = iter(range(10, 100))
+
+    def installer(device, command):
+        if command == "cmd package install-create --multi-package -r":
+            if not multi_package:
+                return b"Error: Unknown option --multi-package\n"
+            return b"Success: created install session [%d]\n" % next(sessions)
+        if command == "cmd package install-create -r":
+            return b"Success: created install session [%d]\n" % next(sessions)
+        if command.startswith("cmd package install-write"):
+            return b"Success: streamed bytes\n"
+        if command.startswith(("cmd package install-add", "cmd package install-c")):
+            return b"Success\n"
+        return b""
+
+    return installer
+
+
+def test_install_packages_commits_one_multi_package_session(tmp_path, monkeypatch):
+    apks = [
+        _apk_file(tmp_path / "a.apk", "com.a"),
+        _apk_file(tmp_path / "b.apk", "com.b"),
+    ]
+    hashed = []
+    digest = app_manager.file_digest
+    monkeypatch.setattr(
+        app_manager, "file_digest", lambda path: hashed.append(path) or digest(path)
+    )
+    with FakeADBServer() as server:
+        server.fallback = _installer()
+        manager = AppManager(transport=SocketTransport(port=server.port))
+        report = manager.install_packages(apks, device="emulator-5554")
+    assert report["status"] == "success"
+    assert report["installed"] == ["com.a", "com.b"]
+    commands = [c for _, c in server.requests if "install-" in c]
+    assert "shell,v2,raw:cmd package install-add-session 10 11 12" in commands
+    assert commands[-1] == "shell,v2,raw:cmd package install-commit 10"
+    assert sum("install-commit" in c for c in commands) == 1
+    assert sorted(hashed) == sorted(apks)
+
+
+def test_install_packages_falls_back_to_one_session_each(tmp_path):
+    apks = [
+        _apk_file(tmp_path / "a.apk", "com.a"),
+        _apk_file(tmp_path / "b.apk", "com.b"),
+    ]
+    with FakeADBServer() as server:
+        server.fallback = _installer(multi_package=False)
+        manager = AppManager(transport=SocketTransport(port=server.port))
+        report = manager.install_packages(apks, device="emulator-5554")
+    assert report["installed"] == ["com.a", "com.b"]
+    commands = [c for _, c in server.requests if "install-commit" in c]
+    assert commands == [
+        "shell,v2,raw:cmd package install-commit 10",
+        "shell,v2,raw:cmd package install-commit 11",
+    ]
@@ -0,0 +1,9 @@
+from benchmarks.bench_managers import BENCHMARKS, main
+
+
+def test_benchmarks_run_against_fake_server():
+    rows = main(["--devices", "2", "--iterations", "2", "--latency", "0", "--quiet"])
+    assert [row["benchmark"] for row in rows] == list(BENCHMARKS)
+    for row in rows:
+        assert row["calls"] == 4 and row["ops_per_second"] > 0
+        assert 0 < row["p50"] <= row["p99"]
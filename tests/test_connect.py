@@ -0,0 +1,74 @@
+from adb_control.core.connect_manager import ConnectionSupervisor, ConnectManager
+from adb_control.core.transport import SocketTransport
+from tests.fake_adb import FakeADBServer
+
+
+def test_connect_many_and_disconnect_all():
+    with FakeADBServer() as server:
+        server.unreachable.add("10.0.0.12:5555")
+        manager = ConnectManager(transport=SocketTransport(port=server.port))
+        results = manager.connect_many(["10.0.0.11", "10.0.0.12:5555"], timeout=2)
+        assert results["10.0.0.11"]["status"] == "success"
+        assert results["10.0.0.12:5555"]["status"] == "error"
+        assert "10.0.0.11:5555" in server.devices
+        assert manager.disconnect()["message"] == "Disconnected from all devices"
+
+
+def test_supervisor_reconnects_with_backoff():
+    changes = []
+    with FakeADBServer(devices={}) as server:
+        server.unreachable.add("10.0.0.12:5555")
+        manager = ConnectManager(transport=SocketTransport(port=server.port))
+        supervisor = ConnectionSupervisor(
+            manager,
+            ["10.0.0.11", "10.0.0.12"],
+            backoff=60,
+            jitter=0.5,
+            on_change=lambda target, state: changes.append((target, state)),
+        )
+        supervisor.check()
+        metrics = supervisor.metrics()
+        assert metrics["10.0.0.11:5555"]["state"] == "connected"
+        assert metrics["10.0.0.11:5555"]["latency"] is not None
+        down = metrics["10.0.0.12:5555"]
+        assert down["state"] == "down" and down["consecutive_failures"] == 1
+        assert 30 <= down["retry_in"] <= 60
+        assert "failed to connect" in down["last_error"]
+
+        # The device drops: the keepalive notices, the next round reconnects.
+        del server.devices["10.0.0.11:5555"]
+        supervisor.check()
+        assert supervisor.connected() == []
+        supervisor.check()
+        assert supervisor.connected() == ["10.0.0.11:5555"]
+        metrics = supervisor.metrics()
+        assert metrics["10.0.0.11:5555"]["drops"] == 1
+        assert metrics["10.0.0.11:5555"]["connects"] == 2
+        # The unreachable target is not retried before its backoff elapses.
+        assert metrics["10.0.0.12:5555"]["attempts"] == 1
+    assert changes == [
+        ("10.0.0.11:5555", "connected"),
+        ("10.0.0.11:5555", "down"),
+        ("10.0.0.11:5555", "connected"),
+    ]
+
+
+def test_supervisor_counts_any_error_as_a_failure():
+    def broken(target, timeout):
+        raise OSError("connection reset")
+
+    with FakeADBServer(devices={}) as server:
+        manager = ConnectManager(transport=SocketTransport(port=server.port))
+        supervisor = ConnectionSupervisor(manager, ["10.0.0.11"])
+        supervisor.check()
+        assert supervisor.connected() == ["10.0.0.11:5555"]
+
+        manager.keepalive = broken
+        supervisor.check()
+        health = supervisor.metrics()["10.0.0.11:5555"]
+        assert health["state"] == "down" and health["drops"] == 1
+        assert health["last_error"] == "connection reset"
+
+        supervisor.check()
+        health = supervisor.metrics()["10.0.0.11:5555"]
+        assert health["attempts"] == 2 and health["consecutive_failures"] == 2
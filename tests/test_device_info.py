@@ -0,0 +1,34 @@
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.device_info import DeviceInfo
+from tests.fake_adb import FakeADBServer
+
+GETPROP = b"""[ro.build.version.sdk]: [34]
+[ro.build.version.release]: [14]
+[ro.product.model]: [Pixel 8]
+[ro.product.cpu.abilist]: [arm64-v8a,armeabi-v7a,armeabi]
+[sys.boot_completed]: [1]
+"""
+
+
+def test_properties_are_cached_by_lifetime():
+    responses = {
+        "getprop": GETPROP,
+        "wm size; wm density": b"Physical size: 1080x2400\nOverride size: 720x1600\n"
+        b"Physical density: 420\n",
+    }
+    devices = {"emulator-5554": "device", "emulator-5556": "device"}
+    with FakeADBServer(devices=devices, responses=responses) as server:
+        info = DeviceInfo(transport=SocketTransport(port=server.port), volatile_ttl=60)
+        assert info.device_info()["device_info"]["model"] == "Pixel 8"
+        assert info.sdk() == 34
+        assert info.abis() == ["arm64-v8a", "armeabi-v7a", "armeabi"]
+        assert info.getprop("sys.boot_completed") == "1"
+        assert info.screen_size() == (720, 1600) and info.density() == 420
+
+        info.volatile_ttl = 0
+        assert info.model() == "Pixel 8"
+        info.getprop("sys.boot_completed")
+        results = info.refresh(list(devices))
+        assert results["emulator-5556"]["result"]["ro.build.version.release"] == "14"
+    getprops = [s for _, s in server.requests if s == "shell,v2,raw:getprop"]
+    assert len(getprops) == 4
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+
+from adb_control.aio.device_manager import AsyncDeviceManager
+from adb_control.aio.transport import AsyncSocketTransport
+from adb_control.core.device_manager import DeviceManager
+from adb_control.core.device_watcher import (
+    DeviceRecord,
+    DeviceRegistry,
+    DeviceWatcher,
+    parse_devices_l,
+)
+from adb_control.core.transport import SocketTransport
+from tests.fake_adb import FakeADBServer
+
+
+def test_parse_devices_l():
+    records = parse_devices_l(
+        "List of devices attached\n"
+        "R58M123ABC  device usb:1-1 product:beyond1 model:SM_G973F device:beyond1 "
+        "transport_id:3\n"
+        "emulator-5556  offline transport_id:4\n"
+        "0123456789  no permissions (user in plugdev group) usb:1-2\n"
+    )
+    assert records["R58M123ABC"].model == "SM_G973F"
+    assert records["R58M123ABC"].transport_id == 3
+    assert records["emulator-5556"].state == "offline"
+    assert records["0123456789"].state == "no permissions"
+
+
+def test_watcher_emits_events():
+    with FakeADBServer(devices={"emulator-5554": "device"}) as server:
+        manager = DeviceManager(transport=SocketTransport(port=server.port))
+        records = manager.device_records()
+        assert records["emulator-5554"].model == "Fake_Phone"
+
+        events, lock = [], threading.Lock()
+
+        def record(event):
+            with lock:
+                events.append((event.kind, event.serial))
+
+        watcher = manager.watch(on_connect=record, on_disconnect=record)
+        watcher.on("change", record)
+        assert watcher.wait_for("emulator-5554", timeout=5)
+
+        server.devices["emulator-5556"] = "offline"
+        assert watcher.wait_for("emulator-5556", "offline", timeout=5)
+        server.devices["emulator-5556"] = "device"
+        assert watcher.wait_for("emulator-5556", timeout=5)
+        del server.devices["emulator-5554"]
+        assert watcher.wait_for("emulator-5554", None, timeout=5)
+        assert watcher.wait_for("emulator-5554", timeout=0.05) is False
+        assert watcher.online() == ["emulator-5556"]
+        watcher.stop()
+    assert events == [
+        ("connect", "emulator-5554"),
+        ("connect", "emulator-5556"),
+        ("change", "emulator-5556"),
+        ("disconnect", "emulator-5554"),
+    ]
+
+
+def test_context_manager_and_coroutine_listener():
+    async def main(server):
+        seen = []
+
+        async def on_connect(event):
+            seen.append(event.serial)
+
+        manager = AsyncDeviceManager(transport=AsyncSocketTransport(port=server.port))
+        watcher = manager.watch(on_connect=on_connect)
+        assert await watcher.wait_for("emulator-5554", timeout=5)
+        server.devices["emulator-5556"] = "device"
+        assert await watcher.wait_for("emulator-5556", timeout=5)
+        await asyncio.sleep(0)
+        await watcher.stop()
+        return seen
+
+    with FakeADBServer() as server:
+        assert asyncio.run(main(server)) == ["emulator-5554", "emulator-5556"]
+        with DeviceWatcher(SocketTransport(port=server.port)) as watcher:
+            assert watcher.online() == ["emulator-5554", "emulator-5556"]
+
+
+def test_failing_listeners_are_logged(caplog):
+    registry, seen = DeviceRegistry(), []
+    registry.on("connect", lambda event: 1 / 0)
+    registry.on("*", seen.append)
+    with caplog.at_level(logging.ERROR, logger="adb_control.core.device_watcher"):
+        registry.update({"emulator-5554": DeviceRecord("emulator-5554", "device")})
+    assert [event.kind for event in seen] == ["connect"]
+    assert "ZeroDivisionError" in caplog.text
+
+
+def test_lost_tracking_connections_are_logged(caplog):
+    with socket.socket() as unused:
+        unused.bind(("127.0.0.1", 0))
+        port = unused.getsockname()[1]
+    watcher = DeviceWatcher(SocketTransport(port=port), reconnect_delay=0.01)
+    with caplog.at_level(logging.ERROR, logger="adb_control.core.device_watcher"):
+        watcher.start()
+        while "reconnecting" not in caplog.text:
+            time.sleep(0.01)
+        watcher.stop()
+    assert "ConnectionRefusedError" in caplog.text
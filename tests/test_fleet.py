@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+from adb_control.aio import AsyncDeviceFleet
+from adb_control.core.device_manager import DeviceManager
+from adb_control.core.device_watcher import DeviceRecord
+from adb_control.core.fleet import DeviceFleet, default_host_key
+
+
+def test_host_key_groups_network_devices_by_ip():
+    assert default_host_key("192.168.1.10:5555") == "192.168.1.10"
+    assert default_host_key("R58M123") == "usb"
+
+
+def test_host_key_groups_usb_devices_by_hub():
+    records = {
+        "A1": DeviceRecord("A1", "device", usb="1-1.2"),
+        "A2": DeviceRecord("A2", "device", usb="1-1.3"),
+        "B1": DeviceRecord("B1", "device", usb="2-4"),
+        "10.0.0.2:5555": DeviceRecord("10.0.0.2:5555", "device"),
+    }
+    manager = DeviceManager(transport=False)
+    manager.device_records = lambda: records
+    fleet = DeviceFleet(per_host_limit=1, device_manager=manager)
+    assert fleet._host_keys([*records, "C1"]) == {
+        "A1": "usb:1-1",
+        "A2": "usb:1-1",
+        "B1": "usb:2",
+        "10.0.0.2:5555": "10.0.0.2",
+        "C1": "usb",
+    }
+
+
+def test_timed_out_worker_keeps_its_slot():
+    started = {}
+
+    def operation(device=None):
+        started[device] = time.monotonic()
+        time.sleep(0.4 if device == "slow" else 0)
+
+    fleet = DeviceFleet(
+        devices=["slow", "next"],
+        per_host_limit=1,
+        timeout=0.1,
+        host_key=lambda serial: "hub",
+    )
+    results = fleet.run(operation)
+    assert "Timed out" in results["slow"]["message"]
+    assert results["next"]["status"] == "success"
+    assert started["next"] - started["slow"] >= 0.35
+
+
+def test_run_is_concurrent_and_aggregates_failures():
+    def operation(device=None):
+        time.sleep(0.2)
+        if device == "bad":
+            raise RuntimeError("boom")
+        if device == "error":
+            return {"status": "error", "message": "not installed"}
+        return device.upper()
+
+    fleet = DeviceFleet(devices=["a", "b", "bad", "error"], max_workers=4)
+    start = time.monotonic()
+    results = fleet.run(operation)
+    assert time.monotonic() - start < 0.6
+    assert results["a"] == {**results["a"], "status": "success", "result": "A"}
+    assert results["bad"]["message"] == "boom"
+    assert results["error"]["message"] == "not installed"
+
+
+def test_per_host_limit_and_timeout():
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def operation(device=None):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(5 if device == "10.0.0.1:9" else 0.05)
+        with lock:
+            active[0] -= 1
+
+    devices = [f"10.0.0.1:{port}" for port in range(1, 10)]
+    fleet = DeviceFleet(devices=devices, per_host_limit=2, timeout=0.5)
+    results = fleet.run(operation)
+    assert peak[0] <= 2
+    assert results["10.0.0.1:9"]["status"] == "error"
+    assert results["10.0.0.1:1"]["status"] == "success"
+
+
+def test_async_fleet_cancels_slow_devices():
+    async def operation(device=None):
+        await asyncio.sleep(5 if device == "slow" else 0)
+        return device
+
+    fleet = AsyncDeviceFleet(devices=["fast", "slow"], timeout=0.1)
+    results = asyncio.run(fleet.run(operation))
+    assert results["fast"]["result"] == "fast"
+    assert "Timed out" in results["slow"]["message"]
@@ -0,0 +1,100 @@
+import struct
+
+import pytest
+from adb_control.core.gesture import (
+    ABS_MT_SLOT,
+    ABS_MT_TRACKING_ID,
+    TOUCH_PROBE,
+    Gesture,
+    parse_touch_probe,
+)
+from adb_control.core.input_manager import InputManager
+from adb_control.core.transport import SocketTransport
+from tests.fake_adb import FakeADBServer
+
+PROBE_OUTPUT = b"""add device 1: /dev/input/event4
+  name:     "gpio-keys"
+  events:
+    KEY (0001): KEY_VOLUMEDOWN KEY_VOLUMEUP
+add device 2: /dev/input/event2
+  name:     "fts_ts"
+  events:
+    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_X     : value 0, min 0, max 2159, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_Y     : value 0, min 0, max 4679, fuzz 0, flat 0, resolution 0
+@@
+Physical size: 1080x2340
+@@
+arm64-v8a
+"""
+
+
+def _events(script):
+    """Decode the input events written by a compiled gesture script."""
+    data = b""
+    for part in script.split("; "):
+        if "print -nu3" in part:
+            octal = part.split("'")[1].split("\\0")[1:]
+            data += bytes(int(value, 8) for value in octal)
+    return [struct.unpack_from("<qqHHi", data, i)[2:] for i in range(0, len(data), 24)]
+
+
+def test_pinch_compiles_to_two_slots():
+    touch = parse_touch_probe(PROBE_OUTPUT.decode())
+    assert touch["path"] == "/dev/input/event2"
+    assert (touch["max_x"], touch["slots"], touch["event_size"]) == (2159, 10, 24)
+
+    gesture = Gesture(frame_interval=10).pinch(540, 1170, 200, 800, duration=100)
+    assert gesture.multi_touch
+    script = gesture.compile(touch)
+    assert script.endswith("3>/dev/input/event2")
+    assert script.count("sleep 0.009") == 10
+    events = _events(script)
+    slots = {value for _, code, value in events if code == ABS_MT_SLOT}
+    ids = [value for _, code, value in events if code == ABS_MT_TRACKING_ID]
+    assert slots == {0, 1}
+    assert ids == [0, 1, -1, -1]
+
+
+def test_stroke_reports_its_last_point_before_lifting():
+    touch = parse_touch_probe(PROBE_OUTPUT.decode())
+    events = _events(
+        Gesture(frame_interval=50).drag(100, 900, 100, 300, 200).compile(touch)
+    )
+    lift = events.index((3, ABS_MT_TRACKING_ID, -1))
+    # Touch coordinates are twice the screen's on this device.
+    assert events[lift - 3 : lift] == [(3, 0x35, 200), (3, 0x36, 600), (0, 0, 0)]
+
+
+def test_path_through_one_point_is_a_press():
+    assert Gesture().path([(5, 6)], 500).strokes == Gesture().tap(5, 6, 500).strokes
+    with pytest.raises(ValueError):
+        Gesture().path([])
+
+
+def test_perform_and_repeat_tap_in_one_round_trip():
+    responses = {TOUCH_PROBE: PROBE_OUTPUT}
+    with FakeADBServer(responses=responses) as server:
+        manager = InputManager(transport=SocketTransport(port=server.port))
+        gesture = Gesture().tap(100, 200).wait(30).drag(100, 900, 100, 300, 200)
+        result = manager.perform(gesture, device="emulator-5554")
+        assert result["method"] == "events"
+        manager.perform(gesture, device="emulator-5554")
+        assert manager.repeat_tap(5, 6, times=3, delay=20)["status"] == "success"
+        assert manager.repeat_tap(5, 6, times=0)["message"] == "Nothing to tap."
+    commands = [command for _, command in server.session_commands]
+    assert commands.count(TOUCH_PROBE) == 1
+    assert (
+        commands[-1]
+        == "input tap 5 6; sleep 0.020; input tap 5 6; sleep 0.020; input tap 5 6"
+    )
+    assert len(commands) == 4
+
+
+def test_single_finger_fallback_commands():
+    gesture = Gesture().tap(10, 20).wait(100).long_press(30, 40, 600)
+    assert gesture.input_commands() == [
+        "input tap 10 20",
+        "sleep 0.100",
+        "input swipe 30 40 30 40 600",
+    ]
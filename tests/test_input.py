@@ -0,0 +1,59 @@
+import pytest
+from adb_control.core.input_manager import (
+    ADBKEYBOARD_IME,
+    InputManager,
+    fill_commands,
+    text_commands,
+)
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.key_event import SystemButton
+from tests.fake_adb import FakeADBServer
+
+
+def test_text_is_escaped_chunked_and_batched_with_keys():
+    assert text_commands("it's 5 $HOME", chunk_size=6) == [
+        "input text 'it'\"'\"'s%s5'",
+        "input text '%s$HOME'",
+    ]
+    assert fill_commands(["a b\nc", SystemButton.KEYCODE_ENTER, 61]) == [
+        "input text a%sb",
+        "input keyevent 66",
+        "input text c",
+        "input keyevent 66 61",
+    ]
+    assert text_commands("héllo", method="adbkeyboard") == [
+        "am broadcast -a ADB_INPUT_B64 --es msg aMOpbGxv"
+    ]
+
+
+def test_literal_percent_s_is_not_turned_into_a_space():
+    assert text_commands("100%s ok") == ["input text 100%", "input text s%sok"]
+    assert text_commands("100% ok") == ["input text 100%%sok"]
+
+
+def test_non_ascii_needs_a_receiver():
+    with pytest.raises(ValueError):
+        text_commands("héllo")
+    ime = "settings get secure default_input_method"
+    with FakeADBServer(
+        responses={ime: b"com.google.android.inputmethod/.LatinIME\n"}
+    ) as server:
+        manager = InputManager(transport=SocketTransport(port=server.port))
+        result = manager.text("héllo")
+        assert result["status"] == "error" and "ADBKeyboard" in result["message"]
+        assert manager.text("hello", method="clipboard")["status"] == "error"
+
+        server.responses[ime] = ADBKEYBOARD_IME.encode() + b"\n"
+        assert manager.text("héllo")["status"] == "success"
+        assert manager.text("héllo")["status"] == "success"
+    commands = [command for _, command in server.session_commands]
+    assert commands.count(ime) == 2
+    assert commands[-1].startswith("am broadcast -a ADB_INPUT_B64")
+
+
+def test_empty_text_sends_nothing():
+    with FakeADBServer() as server:
+        manager = InputManager(transport=SocketTransport(port=server.port))
+        assert manager.text("")["status"] == "success"
+        assert manager.fill([])["status"] == "success"
+    assert not server.session_commands
@@ -0,0 +1,80 @@
+import logging
+import struct
+
+from adb_control.core.gesture import TOUCH_PROBE, parse_touch_probe
+from adb_control.core.input_manager import InputManager
+from adb_control.core.macro import Macro, MacroEvent
+from adb_control.core.transport import SocketTransport
+from tests.fake_adb import FakeADBServer
+from tests.test_gesture import PROBE_OUTPUT, _events
+
+GETEVENT = b"""add device 2: /dev/input/event2
+  name:     "fts_ts"
+[   100.000000] /dev/input/event2: 0003 0039 00000007
+[   100.000000] /dev/input/event2: 0003 0035 00000438
+[   100.000000] /dev/input/event2: 0003 0036 00000924
+[   100.000000] /dev/input/event2: 0000 0000 00000000
+[   100.250000] /dev/input/event2: EV_ABS       ABS_MT_TRACKING_ID   ffffffff
+[   100.250000] /dev/input/event2: EV_SYN       SYN_REPORT           00000000
+"""
+
+
+def test_record_save_and_replay_scaled_on_two_devices(tmp_path):
+    small = PROBE_OUTPUT.replace(b"max 2159", b"max 1079").replace(b"arm64", b"arm")
+
+    def probe(device, command):
+        return small if device == "small" else PROBE_OUTPUT
+
+    devices = {"emulator-5554": "device", "small": "device"}
+    responses = {TOUCH_PROBE: probe, "getevent -t": GETEVENT}
+    with FakeADBServer(devices=devices, responses=responses) as server:
+        manager = InputManager(transport=SocketTransport(port=server.port))
+        recorder = manager.macro_recorder(device="emulator-5554").start()
+        recorder._thread.join(5)
+        macro = recorder.stop()
+        assert len(macro.events) == 6 and macro.events[4].value == -1
+        macro.save(tmp_path / "macro.ndjson")
+        macro = Macro.load(tmp_path / "macro.ndjson")
+        assert macro.duration == 0.25
+
+        results = manager.replay_macro(macro, devices=list(devices))
+        assert all(r["status"] == "success" for r in results.values()), results
+    replays = {d: c for d, c in server.session_commands if "print" in c}
+    assert replays["emulator-5554"].count("sleep 0.249") == 1
+    big = _events(replays["emulator-5554"])
+    assert big[:3] == [(3, 0x39, 7), (3, 0x35, 1080), (3, 0x36, 2340)]
+    scaled = replays["small"].split("'")[1].split("\\0")[1:]
+    data = bytes(int(value, 8) for value in scaled)
+    assert struct.unpack_from("<iiHHi", data, 16)[2:] == (3, 0x35, 540)
+
+
+def test_other_input_nodes_are_remapped_by_name_or_dropped(caplog):
+    source = parse_touch_probe(PROBE_OUTPUT.decode())
+    assert source["nodes"] == {
+        "/dev/input/event4": "gpio-keys",
+        "/dev/input/event2": "fts_ts",
+    }
+    target = parse_touch_probe(
+        PROBE_OUTPUT.decode()
+        .replace("event4", "event7")
+        .replace("event2", "event1")
+        .replace("max 2159", "max 1079")
+    )
+    macro = Macro(
+        [
+            MacroEvent(0.0, "/dev/input/event2", 3, 0x35, 1000),
+            MacroEvent(0.0, "/dev/input/event2", 0, 0, 0),
+            MacroEvent(0.1, "/dev/input/event4", 1, 114, 1),
+            MacroEvent(0.1, "/dev/input/event4", 0, 0, 0),
+            MacroEvent(0.2, "/dev/input/event9", 3, 0, 5),
+            MacroEvent(0.2, "/dev/input/event9", 0, 0, 0),
+        ],
+        {"touch": source},
+    )
+    with caplog.at_level(logging.WARNING, logger="adb_control.core.macro"):
+        frames = macro.frames(target)
+    assert [events for _, events in frames] == [
+        [("/dev/input/event1", 3, 0x35, 500), ("/dev/input/event1", 0, 0, 0)],
+        [("/dev/input/event7", 1, 114, 1), ("/dev/input/event7", 0, 0, 0)],
+    ]
+    assert "/dev/input/event9" in caplog.text
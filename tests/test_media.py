@@ -0,0 +1,204 @@
+import shlex
+import struct
+import zlib
+
+import pytest
+from adb_control.core.media_manger import MediaManager
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.frame_diff import FrameDiffer, locate
+from adb_control.core.utils.image import (
+    PIXEL_FORMAT_RGB_565,
+    PIXEL_FORMAT_RGBX_8888,
+    Frame,
+    encode_png,
+    parse_screencap,
+)
+from tests.fake_adb import FakeADBServer
+
+
+def raw_screencap(width, height, fill=b"\x10\x20\x30\xff", color_space=True):
+    header = struct.pack("<III", width, height, 1)
+    if color_space:
+        header += struct.pack("<I", 1)
+    return header + fill * (width * height)
+
+
+@pytest.fixture
+def adb_server():
+    with FakeADBServer() as server:
+        server.responses["screencap"] = raw_screencap(4, 3)
+        yield server
+
+
+def test_parse_screencap_handles_both_header_sizes():
+    for color_space in (True, False):
+        frame = parse_screencap(raw_screencap(4, 3, color_space=color_space))
+        assert (frame.width, frame.height, frame.bytes_per_pixel) == (4, 3, 4)
+        assert frame.data.nbytes == 48
+        assert bytes(frame.data[:4]) == b"\x10\x20\x30\xff"
+
+
+def test_encode_png():
+    png = encode_png(parse_screencap(raw_screencap(4, 3)))
+    assert png.startswith(b"\x89PNG\r\n\x1a\n")
+    assert struct.unpack(">II", png[16:24]) == (4, 3)
+
+
+def _png_pixels(png) -> tuple:
+    """Color type and unfiltered pixel rows of a PNG written by encode_png."""
+    color_type = png[25]
+    length = struct.unpack(">I", png[33:37])[0]
+    return color_type, zlib.decompress(png[41 : 41 + length])
+
+
+def test_encode_png_drops_padding_and_expands_rgb_565():
+    rgbx = Frame(0, 2, 1, PIXEL_FORMAT_RGBX_8888, memoryview(b"\x01\x02\x03\x00" * 2))
+    assert _png_pixels(encode_png(rgbx)) == (2, b"\x00" + b"\x01\x02\x03" * 2)
+    # Pure red, pure green and pure blue, little-endian.
+    rgb565 = Frame(
+        0, 3, 1, PIXEL_FORMAT_RGB_565, memoryview(b"\x00\xf8\xe0\x07\x1f\x00")
+    )
+    assert _png_pixels(encode_png(rgb565)) == (
+        2,
+        b"\x00\xff\x00\x00\x00\xff\x00\x00\x00\xff",
+    )
+
+
+def test_stream_screenshots(adb_server):
+    manager = MediaManager(transport=SocketTransport(port=adb_server.port))
+    frames = list(manager.stream_screenshots(count=5, prefetch=3))
+    assert len(frames) == 5
+    assert all(frame.width == 4 for frame in frames)
+    assert frames == sorted(frames, key=lambda frame: frame.timestamp)
+
+
+def test_take_screenshots_writes_in_background(adb_server, tmp_path):
+    manager = MediaManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.take_screenshots(str(tmp_path), num_screenshots=3, interval=0)
+    assert result["status"] == "success"
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == ["screenshot_1.png", "screenshot_2.png", "screenshot_3.png"]
+
+
+def paint(width, height, boxes):
+    """A raw screencap with each (x1, y1, x2, y2) box painted white."""
+    pixels = bytearray(b"\x10\x20\x30\xff" * (width * height))
+    for x1, y1, x2, y2 in boxes:
+        for y in range(y1, y2):
+            start = (y * width + x1) * 4
+            pixels[start : (y * width + x2) * 4] = b"\xff" * ((x2 - x1) * 4)
+    return struct.pack("<III", width, height, 1) + bytes(pixels)
+
+
+def test_frame_differ_reports_changed_regions():
+    differ = FrameDiffer(tile=8, ignore=[(0, 0, 40, 8)])
+    first = differ.update(parse_screencap(paint(40, 32, [])))
+    assert not first.duplicate and first.regions == [(0, 0, 40, 32)]
+    assert differ.update(parse_screencap(paint(40, 32, []))).duplicate
+
+    # Two touching tiles merge into one box, the far one is separate and
+    # the change in the ignored top band is not reported.
+    change = differ.update(
+        parse_screencap(
+            paint(
+                40,
+                32,
+                [(9, 9, 10, 10), (17, 9, 18, 10), (1, 1, 2, 2), (33, 25, 34, 26)],
+            )
+        )
+    )
+    assert change.regions == [(8, 8, 24, 16), (32, 24, 40, 32)]
+    assert change.changed_ratio == 3 / 20
+
+
+def test_take_screenshots_dedupe(adb_server, tmp_path):
+    manager = MediaManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.take_screenshots(
+        str(tmp_path), num_screenshots=3, interval=0, dedupe=True
+    )
+    assert result["status"] == "success"
+    assert [path.name for path in tmp_path.iterdir()] == ["screenshot_1.png"]
+
+
+def test_locate_template():
+    numpy = pytest.importorskip("numpy")
+    rng = numpy.random.default_rng(0)
+    screen = rng.integers(0, 255, (200, 120), dtype=numpy.uint8)
+    match = locate(screen, screen[130:170, 30:90], threshold=0.95)
+    assert (match.x, match.y, match.width, match.height) == (30, 130, 60, 40)
+    assert match.score > 0.99
+
+
+def fake_rm(files):
+    """Run removal scripts against the fake's files, as the device shell would."""
+
+    def run(device, command):
+        arguments = shlex.split(command.split(";")[0])[2:]
+        recursive = " rm -rf -- " in command
+        output = []
+        for path in arguments:
+            inside = [name for name in files if name.startswith(path + "/")]
+            if path not in files and not inside:
+                output.append(f"?{path}")
+            elif inside and not recursive:
+                output += [f"rm: {path}: Is a directory", f"!{path}"]
+            else:
+                for name in inside + [path]:
+                    files.pop(name, None)
+        return "".join(line + "\n" for line in output).encode()
+
+    return run
+
+
+def test_remove_files_batches_and_reports_each_path(adb_server):
+    names = [f"/sdcard/Pictures/shot_{i:03d}.png" for i in range(300)]
+    adb_server.files.update({name: (b"x", 0o644, 0) for name in names})
+    adb_server.files["/sdcard/Pictures/keep.jpg"] = (b"x", 0o644, 0)
+    adb_server.files["/sdcard/Download/dir/file"] = (b"x", 0o644, 0)
+    adb_server.fallback = fake_rm(adb_server.files)
+    manager = MediaManager(transport=SocketTransport(port=adb_server.port))
+
+    result = manager.remove_files(
+        ["/sdcard/Pictures/*.png", "/sdcard/nope.txt", "/sdcard/Download/dir"],
+        max_batch_bytes=2048,
+    )
+    assert result["status"] == "error"
+    assert (result["removed"], result["missing"], result["failed"]) == (300, 1, 1)
+    assert result["results"]["/sdcard/Download/dir"] == "Is a directory"
+    assert set(adb_server.files) == {
+        "/sdcard/Pictures/keep.jpg",
+        "/sdcard/Download/dir/file",
+    }
+    # 300 paths of ~30 bytes in 2 KiB batches, all on one shell session.
+    assert len(adb_server.session_commands) == 5
+
+    result = manager.remove_file("/sdcard/Download/dir", folder=True)
+    assert result["status"] == "success"
+    assert set(adb_server.files) == {"/sdcard/Pictures/keep.jpg"}
+
+    results = manager.remove_files("/sdcard/Pictures/*", devices=["emulator-5554"])
+    assert results["emulator-5554"]["result"]["removed"] == 1
+    assert not adb_server.files
+
+
+def test_remove_files_lets_the_device_shell_expand_globs(tmp_path):
+    # An "adb" running `adb shell <script>` in the local shell.
+    adb = tmp_path / "adb"
+    adb.write_text('#!/bin/sh\nshift\nexec sh -c "$*"\n')
+    adb.chmod(0o755)
+    pictures = tmp_path / "my pics"
+    pictures.mkdir()
+    for name in ("a.png", "b.png", "keep.jpg"):
+        (pictures / name).write_bytes(b"x")
+
+    manager = MediaManager(adb_path=str(adb), transport=False)
+    result = manager.remove_files([f"{pictures}/*.png", f"{pictures}/*.gif"])
+    assert (result["removed"], result["missing"], result["failed"]) == (2, 1, 0)
+    assert sorted(result["results"]) == [
+        f"{pictures}/*.gif",
+        f"{pictures}/a.png",
+        f"{pictures}/b.png",
+    ]
+    assert [path.name for path in pictures.iterdir()] == ["keep.jpg"]
+    assert manager.remove_file(f"{pictures}/keep.jpg")["status"] == "success"
+    assert not list(pictures.iterdir())
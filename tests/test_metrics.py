@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+from adb_control.core.base import ADBBase
+from adb_control.core.metrics import Histogram, logging_hook, metrics
+from adb_control.core.sync import SyncConnection
+from adb_control.core.transport import ADBProtocolError, SocketTransport
+from tests.fake_adb import FakeADBServer
+
+
+@pytest.fixture
+def recording():
+    metrics.reset()
+    metrics.enable()
+    yield metrics
+    metrics.disable()
+    metrics.reset()
+
+
+def test_histogram_quantiles():
+    histogram = Histogram((0.1, 1.0, 10.0))
+    for value in [0.05] * 50 + [0.5] * 49 + [5.0]:
+        histogram.observe(value)
+    assert histogram.counts == [50, 49, 1, 0]
+    assert histogram.quantile(0.5) == pytest.approx(0.1)
+    assert 1.0 < histogram.quantile(0.995) <= 10.0
+
+
+def test_commands_are_recorded(recording, caplog):
+    events = []
+    recording.add_hook(events.append)
+    recording.add_hook(logging_hook(level=logging.INFO))
+    with FakeADBServer(responses={"getprop ro.serialno": b"ABC\n"}) as server:
+        manager = ADBBase(transport=SocketTransport(port=server.port))
+        with caplog.at_level(logging.INFO, logger="adb_control.commands"):
+            for _ in range(3):
+                manager.run_command("-s emulator-5554 shell getprop ro.serialno")
+            manager.run_command("-s missing shell getprop ro.serialno")
+        with manager.open_stream("-s emulator-5554 exec-out getprop ro.serialno") as s:
+            assert s.read() == b"ABC\n"
+
+    snapshot = recording.snapshot()
+    ok = snapshot[("shell getprop", "emulator-5554")]
+    assert ok["count"] == 3 and ok["errors"] == 0 and ok["in_flight"] == 0
+    assert ok["bytes_in"] == 12 and ok["latency"]["p99"] > 0
+    assert snapshot[("shell getprop", "missing")]["error_rate"] == 1.0
+    assert snapshot[("exec-out getprop", "emulator-5554")]["bytes_in"] == 4
+    assert [event["status"] for event in events[:4]] == ["success"] * 3 + ["error"]
+    assert caplog.records[-1].adb["device"] == "missing"
+
+    text = recording.prometheus()
+    labels = 'command="shell getprop",device="emulator-5554"'
+    assert f"adb_control_commands_total{{{labels}}} 3" in text
+    assert (
+        f'adb_control_command_duration_seconds_bucket{{{labels},le="+Inf"}} 3' in text
+    )
+    assert "# TYPE adb_control_command_duration_seconds histogram" in text
+
+
+def test_failing_hooks_are_logged(recording, caplog):
+    events = []
+    recording.add_hook(lambda event: 1 / 0)
+    recording.add_hook(events.append)
+    with FakeADBServer() as server:
+        manager = ADBBase(transport=SocketTransport(port=server.port))
+        with caplog.at_level(logging.ERROR, logger="adb_control.core.metrics"):
+            manager.run_command("-s emulator-5554 shell getprop ro.serialno")
+    assert len(events) == 1
+    assert "ZeroDivisionError" in caplog.text
+
+
+def test_disabled_metrics_record_nothing():
+    metrics.reset()
+    with FakeADBServer() as server:
+        ADBBase(transport=SocketTransport(port=server.port)).run_command("devices")
+    assert metrics.snapshot() == {}
+
+
+def test_sync_requests_and_failed_streams_are_recorded(recording, tmp_path):
+    local = tmp_path / "a.txt"
+    local.write_bytes(b"hello")
+    with FakeADBServer() as server:
+        manager = ADBBase(transport=SocketTransport(port=server.port))
+        push = manager.transfer_file(
+            str(local), "/sdcard/a.txt", "push", "emulator-5554"
+        )
+        assert push["status"] == "success"
+        with SyncConnection(manager.transport, "emulator-5554") as connection:
+            assert [entry.name for entry in connection.list("/sdcard")] == ["a.txt"]
+        with pytest.raises(ADBProtocolError):
+            manager.open_stream("-s missing exec-out screencap")
+
+    snapshot = recording.snapshot()
+    sent = snapshot[("sync send", "emulator-5554")]
+    assert sent["count"] == 1 and sent["bytes_out"] > len(b"hello")
+    assert snapshot[("sync stat", "emulator-5554")]["count"] == 1
+    assert snapshot[("sync list", "emulator-5554")]["bytes_in"] == 20 + len("a.txt")
+    failed = snapshot[("exec-out screencap", "missing")]
+    assert failed["errors"] == 1 and failed["in_flight"] == 0
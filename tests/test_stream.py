@@ -0,0 +1,168 @@
+import io
+import itertools
+import os
+import threading
+import time
+
+from adb_control.core.media_manger import MediaManager
+from adb_control.core.base import ADBBase
+from adb_control.core.stream_manager import AndroidScreenMirroring, H264Stream
+from adb_control.core.transport import SocketTransport
+from adb_control.core.utils.h264 import AccessUnitAssembler, NALUnitParser
+from tests.fake_adb import FakeADBServer
+
+SPS = b"\x67\x42\x00\x1f"
+PPS = b"\x68\xce\x3c\x80"
+IDR = b"\x65\x88\x84\x21"
+SLICE = b"\x41\x9a\x00\x10"
+RUN = b"".join(b"\x00\x00\x00\x01" + nal for nal in (SPS, PPS, IDR, SLICE, SLICE))
+
+
+def test_parser_handles_split_start_codes():
+    parser = NALUnitParser()
+    units = []
+    for i in range(len(RUN)):
+        units += parser.feed(RUN[i : i + 1])
+    units += parser.flush()
+    assert units == [SPS, PPS, IDR, SLICE, SLICE]
+
+
+def test_assembler_groups_config_with_keyframe():
+    assembler = AccessUnitAssembler()
+    units = [assembler.push(nal) for nal in (SPS, PPS, IDR, SLICE, SLICE)]
+    units = [unit for unit in units if unit] + [assembler.flush()]
+    assert [unit.keyframe for unit in units] == [True, False, False]
+    assert units[0].nal_types == [7, 8, 5]
+
+
+def test_stream_restarts_and_fans_out():
+    command = (
+        "screenrecord --size 420x960 --bit-rate=1000000 --output-format=h264 "
+        "--time-limit 180 -"
+    )
+    with FakeADBServer(responses={command: RUN}) as server:
+        mirroring = AndroidScreenMirroring(
+            transport=SocketTransport(port=server.port), device="emulator-5554"
+        )
+        stream = mirroring.h264_stream()
+        recorder, viewer = stream.subscribe(), stream.subscribe()
+        with stream:
+            recorded = list(itertools.islice(recorder, 9))
+            viewed = list(itertools.islice(viewer, 9))
+        assert stream.restarts >= 2
+    assert [unit.keyframe for unit in recorded] == [True, False, False] * 3
+    assert [unit.data for unit in viewed] == [unit.data for unit in recorded]
+
+
+class _TimedRun:
+    """A screenrecord run: a keyframe, then a slice every `interval` seconds."""
+
+    def __init__(self, slices=12, interval=0.04):
+        start = b"\x00\x00\x00\x01"
+        self._chunks = [start + SPS + start + PPS + start + IDR]
+        self._chunks += [start + SLICE] * slices
+        self._interval = interval
+        self._closed = threading.Event()
+
+    def read(self, size):
+        if not self._chunks or self._closed.wait(self._interval):
+            return b""
+        return self._chunks.pop(0)
+
+    def close(self):
+        self._closed.set()
+
+
+class _TimedRuns(ADBBase):
+    def open_stream(self, command):
+        return _TimedRun()
+
+
+def test_overlapping_runs_hand_over_without_duplicates():
+    stream = H264Stream(_TimedRuns(transport=False), str, time_limit=0.4, overlap=0.2)
+    subscription = stream.subscribe(maxsize=256)
+    with stream:
+        time.sleep(1.2)
+    units = list(subscription)
+    assert stream.restarts >= 2
+    timestamps = [unit.timestamp for unit in units]
+    assert timestamps == sorted(timestamps)
+    # One keyframe per run: each run is published from its keyframe on, once.
+    assert sum(unit.keyframe for unit in units) == stream.restarts + 1
+
+
+def test_empty_runs_back_off_and_stop():
+    manager = ADBBase(transport=False)
+    manager.open_stream = lambda command: io.BytesIO()
+    stream = H264Stream(manager, str, retry_delay=0.01, max_empty_runs=3)
+    start = time.monotonic()
+    assert list(stream.frames()) == []
+    assert "no output 3 times" in str(stream.error)
+    assert stream.restarts == 2 and time.monotonic() - start >= 0.03
+
+
+def test_segmented_recorder_rolls_and_keeps_newest(tmp_path):
+    command = (
+        "screenrecord --size 420x960 --bit-rate=1000000 --output-format=h264 "
+        "--time-limit 180 -"
+    )
+    # Only the first run sends the SPS/PPS, as MediaCodec does.
+    runs = itertools.count()
+    later = b"".join(b"\x00\x00\x00\x01" + nal for nal in (IDR, SLICE))
+    responses = {command: lambda device, command: later if next(runs) else RUN}
+    with FakeADBServer(responses=responses) as server:
+        mirroring = AndroidScreenMirroring(
+            transport=SocketTransport(port=server.port), device="emulator-5554"
+        )
+        finished = []
+        recorder = mirroring.record(
+            str(tmp_path),
+            segment_duration=0,
+            max_segments=2,
+            on_segment=finished.append,
+        )
+        deadline = time.monotonic() + 5
+        while len(finished) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        segments = recorder.stop()
+    assert len(finished) >= 5
+    assert len(segments) == 2 and recorder.deleted >= 4
+    assert sorted(str(path) for path in tmp_path.iterdir()) == segments
+    for segment in segments:
+        with open(segment, "rb") as file:
+            assert file.read().startswith(b"\x00\x00\x00\x01" + SPS)
+
+
+def test_record_video_streams_segments(tmp_path):
+    command = "screenrecord --output-format=h264 --time-limit 180 -"
+    with FakeADBServer(responses={command: RUN}) as server:
+        manager = MediaManager(transport=SocketTransport(port=server.port))
+        results = manager.record_many(
+            str(tmp_path), ["emulator-5554"], duration=0.2, segment_duration=30
+        )
+    result = results["emulator-5554"]
+    assert result["status"] == "success"
+    # Restarts without a keyframe boundary past 30 s all land in one segment.
+    assert [os.path.basename(path) for path in result["segments"]] == [
+        "segment_00001.h264"
+    ]
+    with open(result["segments"][0], "rb") as file:
+        assert file.read().startswith(RUN)
+
+
+def test_record_video_reports_a_failure_after_some_segments(tmp_path):
+    command = "screenrecord --output-format=h264 --time-limit 180 -"
+
+    def unplugged(device, command):
+        # The device goes away after its first run.
+        server.devices.pop(device, None)
+        return RUN
+
+    with FakeADBServer(responses={command: unplugged}) as server:
+        manager = MediaManager(transport=SocketTransport(port=server.port))
+        result = manager.record_video(
+            str(tmp_path), device="emulator-5554", duration=5, segment_duration=30
+        )
+    assert result["status"] == "error"
+    assert result["message"].startswith("Recording stopped early:")
+    assert len(result["segments"]) == 1
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+
+import pytest
+from adb_control.core.commands import cancel, deadline, in_flight
+from adb_control.core.media_manger import MediaManager
+from adb_control.core.sync import SyncConnection
+from adb_control.core.sync_manager import SyncManager
+from adb_control.core.transport import SocketTransport
+from tests.fake_adb import FakeADBServer
+
+
+@pytest.fixture
+def adb_server():
+    devices = {"emulator-5554": "device", "emulator-5556": "device"}
+    with FakeADBServer(devices=devices) as server:
+        yield server
+
+
+@pytest.fixture
+def media_tree(tmp_path):
+    root = tmp_path / "media"
+    (root / "photos").mkdir(parents=True)
+    for i in range(6):
+        (root / "photos" / f"{i}.jpg").write_bytes(os.urandom(70_000 + i))
+    (root / "clip.mp4").write_bytes(b"video")
+    return root
+
+
+def test_push_tree_then_skip_unchanged(adb_server, media_tree):
+    manager = SyncManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.push(str(media_tree), "/sdcard/Test", device="emulator-5554")
+    assert result["status"] == "success"
+    assert result["transferred"] == 7
+    expected = (media_tree / "photos" / "3.jpg").read_bytes()
+    assert adb_server.files["/sdcard/Test/photos/3.jpg"][0] == expected
+
+    again = manager.push(str(media_tree), "/sdcard/Test", device="emulator-5554")
+    assert (again["transferred"], again["skipped"]) == (0, 7)
+
+
+def test_pull_tree_across_devices(adb_server, tmp_path):
+    adb_server.files["/sdcard/DCIM/a.png"] = (b"a" * 10, 0o660, 1_700_000_000)
+    adb_server.files["/sdcard/DCIM/sub/b.png"] = (b"b" * 20, 0o660, 1_700_000_000)
+    manager = SyncManager(transport=SocketTransport(port=adb_server.port))
+    results = manager.pull(
+        "/sdcard/DCIM", str(tmp_path), devices=["emulator-5554", "emulator-5556"]
+    )
+    for serial in ("emulator-5554", "emulator-5556"):
+        assert results[serial]["result"]["transferred"] == 2
+        local = tmp_path / serial / "sub" / "b.png"
+        assert local.read_bytes() == b"b" * 20
+        assert int(local.stat().st_mtime) == 1_700_000_000
+
+
+def test_transfer_file_with_device_uses_sync(adb_server, tmp_path):
+    adb_server.files["/sdcard/x.txt"] = (b"hello", 0o644, 0)
+    manager = SyncManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.transfer_file(
+        str(tmp_path), "/sdcard/x.txt", "pull", device="emulator-5554"
+    )
+    assert result["status"] == "success"
+    assert (tmp_path / "x.txt").read_bytes() == b"hello"
+
+
+def test_transfers_are_bounded_and_cancellable(adb_server, media_tree, monkeypatch):
+    send = SyncConnection.send
+
+    def slow_send(connection, *args, **kwargs):
+        time.sleep(0.2)
+        return send(connection, *args, **kwargs)
+
+    monkeypatch.setattr(SyncConnection, "send", slow_send)
+    manager = SyncManager(transport=SocketTransport(port=adb_server.port))
+    with deadline(0.1):
+        result = manager.push(str(media_tree), "/sdcard/Test", device="emulator-5554")
+    assert result["status"] == "error" and "Deadline" in result["message"]
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(
+            manager.push(str(media_tree), "/sdcard/Test", device="emulator-5554")
+        )
+    )
+    thread.start()
+    while not in_flight():
+        time.sleep(0.01)
+    assert in_flight()[0]["command"] == "-s emulator-5554 push /sdcard/Test"
+    assert cancel(device="emulator-5554") == 1
+    thread.join(5)
+    assert "cancelled" in results[0]["message"]
+    assert in_flight() == []
+
+
+def test_walk_files_filters_and_indexes(tmp_path):
+    files = {
+        "/sdcard/DCIM/Camera/a.jpg": (b"a", 0o644, 100),
+        "/sdcard/DCIM/Camera/b.MP4": (b"bb", 0o644, 200),
+        "/sdcard/DCIM/Camera/old/c.jpg": (b"c", 0o644, 50),
+        "/sdcard/DCIM/.thumbnails/t.jpg": (b"t", 0o644, 300),
+        "/sdcard/DCIM/Screenshots/s.png": (b"s", 0o644, 400),
+    }
+    with FakeADBServer() as server:
+        server.files.update(files)
+        manager = MediaManager(
+            transport=SocketTransport(port=server.port), index_dir=str(tmp_path)
+        )
+        found = manager.walk_files(
+            "/sdcard/DCIM", extensions=["jpg", "mp4"], exclude=[".thumbnails"]
+        )
+        assert [(f.path, f.size) for f in found] == [
+            ("/sdcard/DCIM/Camera/a.jpg", 1),
+            ("/sdcard/DCIM/Camera/b.MP4", 2),
+            ("/sdcard/DCIM/Camera/old/c.jpg", 1),
+        ]
+        result = manager.list_media_files(
+            "/sdcard/DCIM", recursive=True, pattern="Camera/*", newer_than=100
+        )
+        assert [f["path"] for f in result["files"]] == [
+            "/sdcard/DCIM/Camera/a.jpg",
+            "/sdcard/DCIM/Camera/b.MP4",
+        ]
+
+        def scan():
+            paths = sorted(
+                f.path for f in manager.walk_files("/sdcard/DCIM", incremental=True)
+            )
+            return paths, manager.remote_index().listed
+
+        paths, listed = scan()
+        assert len(paths) == 5 and listed == 5
+        server.sync_requests.clear()
+        assert scan() == (paths, 0)
+        assert not [kind for kind, _ in server.sync_requests if kind == "LIST"]
+
+        # A new file changes its directory's mtime: only that directory is listed.
+        server.files["/sdcard/DCIM/Screenshots/new.png"] = (b"n", 0o644, 500)
+        paths, listed = scan()
+        assert "/sdcard/DCIM/Screenshots/new.png" in paths and listed == 1
+
+    # The index was saved, so a new manager starts from it.
+    reloaded = MediaManager(transport=False, index_dir=str(tmp_path)).remote_index()
+    assert "/sdcard/DCIM/Screenshots" in reloaded.directories
+
+
+def test_walk_files_without_a_transport_uses_find(tmp_path):
+    # An "adb" running `adb shell <script>` in the local shell.
+    adb = tmp_path / "adb"
+    adb.write_text('#!/bin/sh\nshift\nexec sh -c "$*"\n')
+    adb.chmod(0o755)
+    root = tmp_path / "my dcim"
+    for path in ("Camera/a.jpg", "Camera/old/c.jpg", ".thumbnails/t.jpg", "b.png"):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).write_bytes(b"x" * len(path))
+
+    manager = MediaManager(adb_path=str(adb), transport=False)
+    found = manager.walk_files(str(root), extensions=["jpg"], exclude=[".thumbnails"])
+    assert [(f.path[len(str(root)) :], f.size) for f in found] == [
+        ("/Camera/a.jpg", 12),
+        ("/Camera/old/c.jpg", 16),
+    ]
+    shallow = manager.walk_files(str(root), max_depth=0, include_dirs=True)
+    assert sorted(f.name for f in shallow) == [".thumbnails", "Camera", "b.png"]
+    with pytest.raises(FileNotFoundError):
+        list(manager.walk_files(str(tmp_path / "missing")))
+
+
+def test_scans_of_one_index_are_serialized(adb_server):
+    adb_server.files["/sdcard/DCIM/a.jpg"] = (b"a", 0o644, 100)
+    manager = MediaManager(transport=SocketTransport(port=adb_server.port))
+    first = manager.walk_files("/sdcard/DCIM", incremental=True)
+    assert next(first).path == "/sdcard/DCIM/a.jpg"
+    second = []
+    thread = threading.Thread(
+        target=lambda: second.extend(
+            manager.walk_files("/sdcard/DCIM", incremental=True)
+        )
+    )
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()
+    first.close()
+    thread.join(5)
+    assert [f.path for f in second] == ["/sdcard/DCIM/a.jpg"]
@@ -0,0 +1,214 @@
+import socket
+import threading
+import time
+
+import pytest
+from adb_control.core.base import ADBBase
+from adb_control.core.commands import (
+    CommandCancelled,
+    CommandTimeout,
+    cancel,
+    deadline,
+    in_flight,
+)
+from adb_control.core.device_manager import DeviceManager
+from adb_control.core.input_manager import InputManager
+from adb_control.core.transport import SESSION_TIMEOUT, SocketTransport
+from tests.fake_adb import FakeADBServer
+
+
+@pytest.fixture
+def adb_server():
+    devices = {"emulator-5554": "device", "R58M": "offline"}
+    with FakeADBServer(devices=devices) as server:
+        yield server
+
+
+def test_shell_command_uses_socket(adb_server):
+    adb_server.responses["input tap 10 20"] = b""
+    transport = SocketTransport(port=adb_server.port)
+    manager = InputManager(adb_path="missing-adb", transport=transport)
+    result = manager.run_command("-s emulator-5554 shell input tap 10 20")
+    assert result.returncode == 0
+    assert ("emulator-5554", "shell,v2,raw:input tap 10 20") in adb_server.requests
+
+
+@pytest.mark.parametrize("features", ["shell_v2,cmd", ""])
+def test_failing_shell_command_returns_its_exit_code(adb_server, features):
+    adb_server.features = features
+    adb_server.responses["ls /missing"] = (b"", b"ls: /missing: No such file\n", 1)
+    adb_server.responses["getprop ro.serialno"] = b"ABC123\n"
+    manager = ADBBase(transport=SocketTransport(port=adb_server.port))
+    failed = manager.run_command("-s emulator-5554 shell ls /missing")
+    assert failed.returncode == 1
+    assert b"No such file" in (failed.stderr if features else failed.stdout)
+    result = manager.run_command("-s emulator-5554 exec-out getprop ro.serialno")
+    assert (result.returncode, result.stdout) == (0, b"ABC123\n")
+
+
+def test_input_commands_share_one_shell_session(adb_server):
+    adb_server.responses["getprop ro.serialno"] = b"ABC123\n"
+    transport = SocketTransport(port=adb_server.port)
+    manager = InputManager(adb_path="missing-adb", transport=transport)
+    manager.tap(1, 2, device="emulator-5554")
+    with manager.batch(device="emulator-5554") as batch:
+        for i in range(200):
+            batch.tap(i, i)
+        batch.keyevent(66)
+    session = transport.shell_session("emulator-5554")
+    assert session.run("getprop ro.serialno").stdout == b"ABC123\n"
+    assert len(batch.results) == 201
+    assert all(result.returncode == 0 for result in batch.results)
+    assert len(adb_server.session_commands) == 203
+    assert [service for _, service in adb_server.requests].count("shell:sh") == 1
+
+
+def test_exec_out_is_binary_safe(adb_server):
+    adb_server.responses["screencap"] = bytes(range(256))
+    manager = DeviceManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.run_command("exec-out screencap")
+    assert result.stdout == bytes(range(256))
+
+
+def test_list_devices_over_socket(adb_server):
+    manager = DeviceManager(transport=SocketTransport(port=adb_server.port))
+    assert manager.list_devices() == ["emulator-5554"]
+
+
+def test_unknown_device_reports_error(adb_server):
+    manager = DeviceManager(transport=SocketTransport(port=adb_server.port))
+    result = manager.run_command("-s nope shell ls")
+    assert result.returncode == 1
+    assert b"not found" in result.stderr
+
+
+def test_host_shell_features_are_not_sent_to_socket(adb_server):
+    transport = SocketTransport(port=adb_server.port)
+    assert transport.parse_command("exec-out screencap -p > out.png") is None
+    assert transport.parse_command("install app.apk") is None
+    assert transport.parse_command("-s abc shell 'input text hi'") == (
+        "abc",
+        "shell",
+        "input text hi",
+    )
+
+
+def test_falls_back_to_executable_when_server_is_down():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    transport = SocketTransport(port=port)
+    manager = DeviceManager(adb_path="missing-adb", transport=transport)
+    result = manager.run_command("devices")
+    assert result.returncode != 0
+
+
+def test_executable_fallback_gets_arguments_without_a_host_shell(tmp_path):
+    # An "adb" printing its arguments, one per line.
+    adb = tmp_path / "adb"
+    adb.write_text("#!/bin/sh\nprintf '%s\\n' \"$@\"\n")
+    adb.chmod(0o755)
+    manager = ADBBase(adb_path=str(adb), transport=False)
+    result = manager.run_command("shell 'echo \"a  b\"' *")
+    assert result.stdout.decode().splitlines() == ["shell", 'echo "a  b"', "*"]
+    piped = manager.run_command("shell ls | tr a-z A-Z")
+    assert piped.stdout.decode().splitlines() == ["SHELL", "LS"]
+
+
+def test_timeout_kills_process():
+    # `sleep` stands in for an adb executable that hangs.
+    manager = ADBBase(adb_path="sleep", transport=False, timeout=0.2)
+    start = time.monotonic()
+    with pytest.raises(CommandTimeout):
+        manager.run_command("5")
+    assert time.monotonic() - start < 2
+    assert in_flight() == []
+
+
+def test_deadline_bounds_socket_commands(adb_server):
+    adb_server.responses["slow"] = lambda device, command: time.sleep(2) or b""
+    manager = ADBBase(transport=SocketTransport(port=adb_server.port))
+    start = time.monotonic()
+    with deadline(0.2), pytest.raises(CommandTimeout):
+        manager.run_command("-s emulator-5554 shell slow", timeout=10)
+    assert time.monotonic() - start < 1.5
+
+
+def test_cancel_in_flight_command():
+    manager = ADBBase(adb_path="sleep", transport=False)
+    errors = []
+
+    def run():
+        try:
+            manager.run_command("5")
+        except CommandCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    while not in_flight():
+        time.sleep(0.01)
+    assert in_flight()[0]["command"] == "5"
+    assert cancel() == 1
+    thread.join(2)
+    assert len(errors) == 1 and in_flight() == []
+
+    process = manager.open_command("0.1")
+    assert [entry["command"] for entry in in_flight()] == ["0.1"]
+    process.wait()
+    assert in_flight() == []
+
+
+def test_shell_session_survives_a_broken_command():
+    with FakeADBServer(responses={"echo ok": b"ok\n"}) as server:
+        transport = SocketTransport(port=server.port)
+        session = transport.shell_session()
+        assert session._timeout == SESSION_TIMEOUT
+        results = session.run_many(["echo 'unbalanced", "echo ok"])
+        assert results[1].stdout == b"ok\n"
+    # Each command reaches the shell as one quoted word.
+    assert server.session_commands[0][1] == "echo 'unbalanced"
+
+
+def test_shell_session_read_times_out_and_is_replaced():
+    def hang(device, command):
+        time.sleep(0.5)
+        return b""
+
+    with FakeADBServer(responses={"hang": hang, "echo ok": b"ok\n"}) as server:
+        transport = SocketTransport(port=server.port)
+        session = transport.shell_session()
+        with pytest.raises(TimeoutError):
+            session.run_many(["hang"], timeout=0.1)
+        assert session.closed
+        assert transport.shell_session().run("echo ok").stdout == b"ok\n"
+
+
+def test_session_commands_are_bounded_and_cancellable():
+    def hang(device, command):
+        time.sleep(1)
+        return b""
+
+    with FakeADBServer(responses={"input tap 1 2": hang}) as server:
+        transport = SocketTransport(port=server.port)
+        manager = InputManager(transport=transport, timeout=0.2)
+        with pytest.raises(CommandTimeout):
+            manager._run_input("input tap 1 2", device="emulator-5554")
+
+        manager.timeout = None
+        errors = []
+
+        def run():
+            try:
+                manager._run_input("input tap 1 2", device="emulator-5554")
+            except CommandCancelled as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        while not in_flight():
+            time.sleep(0.01)
+        assert in_flight()[0]["device"] == "emulator-5554"
+        assert cancel(device="emulator-5554") == 1
+        thread.join(2)
+    assert len(errors) == 1 and in_flight() == []
@@ -0,0 +1,158 @@
+import threading
+import time
+
+from adb_control.core.commands import deadline
+from adb_control.core.transport import SocketTransport
+from adb_control.core.uiautomator_manager import UIExtractor, UIHierarchyParser
+from tests.fake_adb import FakeADBServer
+
+DUMP = (
+    b"<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>"
+    b'<hierarchy rotation="0"><node index="0" text="" resource-id="" '
+    b'class="android.widget.FrameLayout" package="com.example" content-desc="" '
+    b'bounds="[0,0][1080,2340]"><node index="0" text="OK" '
+    b'resource-id="com.example:id/ok" class="android.widget.Button" '
+    b'package="com.example" content-desc="" bounds="[40,100][300,180]" />'
+    b"</node></hierarchy>"
+    b"UI hierchary dumped to: /dev/tty\n"
+)
+
+
+def test_parser_accepts_byte_by_byte_input():
+    parser = UIHierarchyParser()
+    for i in range(len(DUMP)):
+        parser.feed(DUMP[i : i + 1])
+    elements = parser.close()["elements"]
+    assert [element["text"] for element in elements] == ["", "OK"]
+
+
+def test_uiautomator_streams_dump_per_device():
+    devices = {"emulator-5554": "device", "emulator-5556": "device"}
+    responses = {
+        "uiautomator dump /dev/tty": lambda device, command: DUMP.replace(
+            b"com.example:id/ok", f"id/{device}".encode()
+        )
+    }
+    with FakeADBServer(devices=devices, responses=responses) as server:
+        extractor = UIExtractor(transport=SocketTransport(port=server.port))
+        results = {}
+
+        def query(serial):
+            results[serial] = extractor.find_element(f"id/{serial}", device=serial)
+
+        threads = [threading.Thread(target=query, args=(d,)) for d in devices]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for serial in devices:
+        assert results[serial]["status"] == "success"
+        assert results[serial]["element"]["bounds"] == "[40,100][300,180]"
+
+
+TREE_XML = b"""<?xml version='1.0' ?><hierarchy rotation="0">
+<node class="android.widget.FrameLayout" resource-id="" text="" bounds="[0,0][1080,2340]">
+  <node class="android.widget.LinearLayout" resource-id="app:id/toolbar" text="" bounds="[0,0][1080,200]">
+    <node class="android.widget.Button" resource-id="app:id/delete" text="Delete" enabled="true" bounds="[900,40][1060,160]" />
+  </node>
+  <node class="androidx.recyclerview.widget.RecyclerView" resource-id="app:id/list" text="" bounds="[0,200][1080,2340]">
+    <node class="android.widget.TextView" resource-id="app:id/title" text="Item 1" bounds="[0,200][1080,400]" />
+    <node class="android.widget.TextView" resource-id="app:id/title" text="Item 2" bounds="[0,400][1080,600]" />
+    <node class="android.widget.Button" resource-id="" text="Delete" enabled="false" bounds="[0,600][200,700]" />
+  </node>
+</node></hierarchy>"""
+
+
+def test_selectors_against_snapshot():
+    tree = UIHierarchyParser()
+    tree.feed(TREE_XML)
+    tree = tree.close()["tree"]
+
+    items = tree.select('//*[@resource-id="app:id/list"]//TextView')
+    assert [node.text for node in items] == ["Item 1", "Item 2"]
+    assert items[1].bounds == (0, 400, 1080, 600)
+    assert items[1].center == (540, 500)
+    assert items[0].parent.resource_id == "app:id/list"
+
+    toolbar = '//Button[@text="Delete"][ancestor::*[@resource-id="app:id/toolbar"]]'
+    assert tree.select_one(toolbar).resource_id == "app:id/delete"
+    disabled = tree.select('//Button[@text="Delete" and not(@enabled="true")]')
+    assert [node.bounds for node in disabled] == [(0, 600, 200, 700)]
+    assert tree.select('//*[matches(@text, "^Item \\d$")][2]')[0].text == "Item 2"
+    assert len(tree.select('/hierarchy/node/node[.//*[contains(@text, "Item")]]')) == 1
+    # Empty values are not indexed: nodes without the attribute match too.
+    assert len(tree.select('//*[@text=""]')) == 4
+    assert len(tree.select('//*[@resource-id=""][@text="Delete"]')) == 1
+    assert tree.select('//*[starts-with(@resource-id, "app:id/") or @text="x"]')
+    assert tree.by_class["android.widget.TextView"] == items
+
+
+def test_find_element_takes_selectors_only_with_a_prefix():
+    parser = UIHierarchyParser()
+    parser.feed(TREE_XML.replace(b'text="Item 2"', b'text="/sdcard/DCIM"'))
+    tree = parser.close()["tree"]
+    extractor = UIExtractor(transport=False)
+
+    path = extractor.find_element("/sdcard/DCIM", tree=tree)
+    assert path["element"]["bounds"] == "[0,400][1080,600]"
+    button = extractor.find_element('xpath://Button[@enabled="false"]', tree=tree)
+    assert button["element"]["bounds"] == "[0,600][200,700]"
+    assert extractor.find_element("//Button", tree=tree)["status"] == "error"
+
+
+def test_wait_for_first_of_several_selectors_then_idle():
+    loading = DUMP.replace(b'text="OK" resource-id="com.example:id/ok"', b"")
+    screens = [loading] * 3 + [DUMP]
+    served = []
+
+    def dump(device, command):
+        served.append(device)
+        return screens[min(len(served), len(screens)) - 1]
+
+    responses = {"uiautomator dump /dev/tty": dump}
+    with FakeADBServer(responses=responses) as server:
+        extractor = UIExtractor(transport=SocketTransport(port=server.port))
+        result = extractor.wait_for(
+            ["xpath://Button[@text='Retry']", "com.example:id/ok"],
+            timeout=5,
+            interval=0.01,
+            max_interval=0.02,
+        )
+        assert result["status"] == "success"
+        assert result["selector"] == "com.example:id/ok"
+        assert result["element"]["text"] == "OK"
+        assert result["dumps"] == 4
+
+        idle = extractor.wait_for_idle(timeout=5, interval=0.01, stable_dumps=3)
+        assert idle["status"] == "success" and idle["dumps"] == 3
+
+        gone = extractor.wait_until_gone("OK", timeout=0.05, interval=0.01)
+        assert gone["status"] == "error"
+
+
+def test_idle_ignores_the_dump_trailer():
+    trailers = iter([b"", b"UI hierchary dumped to: /dev/tty\n", b"\r\n"] * 3)
+
+    def dump(device, command):
+        return DUMP.split(b"UI hier")[0] + next(trailers)
+
+    with FakeADBServer(responses={"uiautomator dump /dev/tty": dump}) as server:
+        extractor = UIExtractor(transport=SocketTransport(port=server.port))
+        idle = extractor.wait_for_idle(timeout=5, interval=0.01, stable_dumps=3)
+    assert idle["status"] == "success" and idle["dumps"] == 3
+
+
+def test_waits_stop_at_their_timeout_and_the_enclosing_deadline():
+    def slow_dump(device, command):
+        time.sleep(1)
+        return DUMP
+
+    with FakeADBServer(responses={"uiautomator dump /dev/tty": slow_dump}) as server:
+        extractor = UIExtractor(transport=SocketTransport(port=server.port))
+        started = time.monotonic()
+        result = extractor.wait_for("OK", timeout=0.2)
+        assert result["status"] == "error" and "Timed out" in result["message"]
+        with deadline(0.2):
+            idle = extractor.wait_for_idle(timeout=10)
+        assert idle["status"] == "error"
+        assert time.monotonic() - started < 0.9